@@ -9,7 +9,9 @@ from src.routes.avatar_routes import avatar_bp
 from src.routes.project_routes import project_bp
 from src.routes.auth_routes import auth_bp
 from src.routes.prompt_routes import prompt_bp
+from src.routes.media_routes import media_bp
 from src.utils.auth_manager import auth_manager
+from src.services.storage.storage_janitor import storage_janitor
 from config import config
 import os
 
@@ -39,7 +41,8 @@ def create_app(config_name=None):
     CORS(app, 
          origins=all_origins,
          supports_credentials=True,
-         allow_headers=['Content-Type', 'Authorization'],
+         allow_headers=['Content-Type', 'Authorization', 'Range', 'If-None-Match', 'If-Modified-Since', 'If-Range'],
+         expose_headers=['Accept-Ranges', 'Content-Range', 'Content-Length', 'ETag', 'Last-Modified'],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
     
     # Inicializar banco de dados
@@ -54,6 +57,11 @@ def create_app(config_name=None):
     app.register_blueprint(settings_bp, url_prefix='/api/settings')
     app.register_blueprint(avatar_bp, url_prefix='/api/avatars')
     app.register_blueprint(project_bp, url_prefix='/api/projects')
+    app.register_blueprint(media_bp, url_prefix='/api/media')
+    
+    # Limpeza periódica do storage, só no processo com STORAGE_JANITOR=true
+    if app.config.get('STORAGE_JANITOR') and not app.testing:
+        storage_janitor.start(app)
     
     # Middleware para logging de requests
     @app.before_request
@@ -141,6 +149,7 @@ def create_app(config_name=None):
                 'avatars': '/api/avatars',
                 'chat': '/api/chat',
                 'projects': '/api/projects',
+                'media': '/api/media',
                 'settings': '/api/settings',
                 'health': '/api/health'
             }
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+CineAI - Limpeza do storage
+Remove temporários vencidos, arquivos sem referência no banco e blobs órfãos
+"""
+
+import sys
+from app import create_app
+from src.database.config import db
+from src.services.storage.file_manager import file_manager
+from src.services.storage.storage_janitor import storage_janitor
+
+def main():
+    dry_run = '--dry-run' in sys.argv
+    app = create_app()
+    storage_janitor.stop()
+
+    with app.app_context():
+        db.create_all()
+
+        print(f"🧹 Limpando storage{' (simulação)' if dry_run else ''}...")
+        result = storage_janitor.run(dry_run=dry_run)
+
+        if not result['success']:
+            print(f"❌ Erro: {result['error']}")
+            return 1
+
+        temp, orphans = result['temp'], result['orphans']
+        print(f"🗑️ Temporários: {temp['deleted']} de {temp['scanned']} ({file_manager.format_size(temp['freed_bytes'])})")
+        print(f"👻 Órfãos: {orphans['deleted']} de {orphans['scanned']} ({file_manager.format_size(orphans['freed_bytes'])})")
+        if result['blobs']:
+            print(f"📦 Blobs: {result['blobs']['deleted']} ({file_manager.format_size(result['blobs']['freed_bytes'])})")
+        print(f"⏱️ Uploads expirados: {result['upload_sessions_expired']}")
+        for path in temp['errors'] + orphans['errors']:
+            print(f"   ⚠️ Falha ao remover {path}")
+
+        print(f"✅ {file_manager.format_size(result['freed_bytes'])} "
+              f"{'seriam liberados' if dry_run else 'liberados'} em {result['duration']}s")
+        return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
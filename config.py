@@ -17,6 +17,13 @@ class Config:
     ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY', '')
     ELEVENLABS_VOICE_ID = os.getenv('ELEVENLABS_VOICE_ID', '')
     
+    # Configurações de entrega de mídia
+    MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', 3600))
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'  # Delegar envio ao nginx/apache
+    
+    # Limpeza periódica do storage: ligar só no processo agendador, não em cada worker do gunicorn
+    STORAGE_JANITOR = os.getenv('STORAGE_JANITOR', 'false').lower() == 'true'
+    
     # Configurações de upload
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB
     
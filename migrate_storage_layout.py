@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+CineAI - Migração para o layout de assets em subdiretórios
+Move arquivos da raiz de videos/, avatars/, audio/... para subdiretórios por hash e reescreve os caminhos no banco
+Pode rodar com a aplicação no ar e ser interrompida e retomada
+"""
+
+import sys
+from app import create_app
+from src.database.config import db
+from src.services.storage.file_manager import file_manager
+from src.services.storage.layout_migration import layout_migration
+
+def main():
+    dry_run = '--dry-run' in sys.argv
+    batch_size = int(sys.argv[sys.argv.index('--batch-size') + 1]) if '--batch-size' in sys.argv else 200
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+
+        print(f"📂 Migrando layout do storage{' (simulação)' if dry_run else ''}...")
+        result = layout_migration.migrate(dry_run=dry_run, batch_size=batch_size)
+
+        if not result['success']:
+            print(f"❌ Erro: {result['error']}")
+            return 1
+
+        print(f"📄 Arquivos na raiz dos diretórios: {result['pending']}")
+        print(f"🚚 {'Seriam movidos' if dry_run else 'Movidos'}: {result['moved']} "
+              f"({file_manager.format_size(result['bytes'])})")
+        if not dry_run:
+            print(f"🗄️ Linhas atualizadas no banco: {result['rows_updated']}")
+        for error in result['errors']:
+            print(f"   ⚠️ {error['path']}: {error['error']}")
+
+        print("✅ Simulação concluída" if dry_run else "✅ Migração concluída")
+        return 0 if not result['errors'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+CineAI - Reconciliação do índice de uso de armazenamento
+Compara o índice com os arquivos em disco e recalcula os totais por usuário, projeto e categoria
+"""
+
+import sys
+import json
+from app import create_app
+from src.database.config import db
+from src.services.storage.storage_usage import storage_usage
+
+def main():
+    dry_run = '--dry-run' in sys.argv
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+
+        print(f"🔎 Reconciliando uso de armazenamento{' (simulação)' if dry_run else ''}...")
+        result = storage_usage.reconcile(dry_run=dry_run)
+
+        if not result['success']:
+            print(f"❌ Erro: {result['error']}")
+            return 1
+
+        print(f"📁 Arquivos indexados ausentes no disco: {result['missing_files']}")
+        print(f"📏 Arquivos com tamanho divergente: {result['resized_files']}")
+        print(f"➕ Arquivos fora do índice: {result['untracked_files']}")
+        print(f"⚖️ Totais divergentes: {len(result['drift'])}")
+        for entry in result['drift']:
+            print(f"   {entry['key']}: {json.dumps(entry['indexed'])} -> {json.dumps(entry['actual'])}")
+
+        print("✅ Simulação concluída" if dry_run else "✅ Índice corrigido")
+        return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
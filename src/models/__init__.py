@@ -1,7 +1,13 @@
+from .user import User
 from .video import Video
 from .message import Message
 from .session import Session
 from .avatar import Avatar, AvatarPhoto
 from .scene import Scene, Project
+from .generation import VideoGeneration
+from .catalog import ProviderCatalog
+from .blob import Blob
+from .storage import StoredFile, StorageUsage, UploadSession, FileMetadata, MaintenanceLease
+from .render import Render
 
-__all__ = ['Video', 'Message', 'Session', 'Avatar', 'AvatarPhoto', 'Scene', 'Project']
\ No newline at end of file
+__all__ = ['User', 'Video', 'Message', 'Session', 'Avatar', 'AvatarPhoto', 'Scene', 'Project', 'VideoGeneration', 'ProviderCatalog', 'Blob', 'StoredFile', 'StorageUsage', 'UploadSession', 'FileMetadata', 'MaintenanceLease', 'Render']
\ No newline at end of file
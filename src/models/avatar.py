@@ -8,6 +8,7 @@ class Avatar(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)  # Dono do avatar
     
     # Configurações do avatar
     heygen_id = db.Column(db.String(100))  # ID do avatar no HeyGen
@@ -22,6 +23,10 @@ class Avatar(db.Model):
     
     # Status
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    status_message = db.Column(db.Text)  # Etapa atual ou motivo da falha
+    attempts = db.Column(db.Integer, default=0)  # Execuções do processamento
+    processing_started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -33,12 +38,33 @@ class Avatar(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
+            'user_id': self.user_id,
             'heygen_id': self.heygen_id,
             'voice_id': self.voice_id,
             'photos': [photo.to_dict() for photo in self.photos],
             'quality': self.quality,
             'voice_cloning': self.voice_cloning,
             'status': self.status,
+            'status_message': self.status_message,
+            'attempts': self.attempts,
+            'processing_started_at': self.processing_started_at.isoformat() if self.processing_started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def to_summary(self, photo_count: int = 0, cover_url: str = None):
+        """Resumo para listagens, sem carregar as fotos"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'heygen_id': self.heygen_id,
+            'quality': self.quality,
+            'status': self.status,
+            'status_message': self.status_message,
+            'photo_count': photo_count,
+            'cover_url': cover_url,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -55,10 +81,21 @@ class AvatarPhoto(db.Model):
     
     # Informações do arquivo
     filename = db.Column(db.String(255), nullable=False)
-    file_path = db.Column(db.String(500), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False, index=True)  # Pode ser compartilhado por fotos duplicadas
     file_size = db.Column(db.Integer)
     mime_type = db.Column(db.String(100))
     
+    # Hash perceptual (dHash de 64 bits) e suas oito faixas de 8 bits para busca indexada
+    phash = db.Column(db.String(16), index=True)
+    phash_band0 = db.Column(db.SmallInteger, index=True)
+    phash_band1 = db.Column(db.SmallInteger, index=True)
+    phash_band2 = db.Column(db.SmallInteger, index=True)
+    phash_band3 = db.Column(db.SmallInteger, index=True)
+    phash_band4 = db.Column(db.SmallInteger, index=True)
+    phash_band5 = db.Column(db.SmallInteger, index=True)
+    phash_band6 = db.Column(db.SmallInteger, index=True)
+    phash_band7 = db.Column(db.SmallInteger, index=True)
+    
     # Validação
     is_valid = db.Column(db.Boolean, default=False)
     validation_message = db.Column(db.Text)
@@ -75,6 +112,7 @@ class AvatarPhoto(db.Model):
             'file_path': self.file_path,
             'file_size': self.file_size,
             'mime_type': self.mime_type,
+            'phash': self.phash,
             'is_valid': self.is_valid,
             'validation_message': self.validation_message,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -0,0 +1,35 @@
+from src.database.config import db
+from datetime import datetime
+
+class Blob(db.Model):
+    """Arquivo armazenado uma única vez pelo hash do conteúdo, com contagem de referências"""
+    __tablename__ = 'blobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    path = db.Column(db.String(500), unique=True, nullable=False, index=True)
+    size = db.Column(db.BigInteger, default=0)
+    mime_type = db.Column(db.String(100))
+
+    # Linhas de Scene, Project, Video e AvatarPhoto que apontam para o arquivo
+    ref_count = db.Column(db.Integer, default=0, nullable=False, index=True)
+    orphaned_at = db.Column(db.DateTime, index=True)  # Quando a última referência sumiu
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'id': self.id,
+            'sha256': self.sha256,
+            'path': self.path,
+            'size': self.size,
+            'mime_type': self.mime_type,
+            'ref_count': self.ref_count,
+            'orphaned_at': self.orphaned_at.isoformat() if self.orphaned_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<Blob {self.sha256[:12]} refs={self.ref_count}>'
@@ -0,0 +1,47 @@
+from src.database.config import db
+from datetime import datetime
+import json
+
+class ProviderCatalog(db.Model):
+    """Catálogo de provedor (vozes, modelos, avatares) em cache compartilhado entre workers"""
+    __tablename__ = 'provider_catalogs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(200), unique=True, nullable=False, index=True)  # ex.: elevenlabs:voices
+    provider = db.Column(db.String(50))
+
+    # Conteúdo
+    payload = db.Column(db.Text)  # JSON
+    etag = db.Column(db.String(200))
+
+    # Validade e atualização
+    fetched_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    refreshing_since = db.Column(db.DateTime)  # Reserva do worker que está atualizando
+    error = db.Column(db.Text)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_payload(self):
+        """Obter conteúdo decodificado"""
+        return json.loads(self.payload) if self.payload else None
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'id': self.id,
+            'key': self.key,
+            'provider': self.provider,
+            'etag': self.etag,
+            'fetched_at': self.fetched_at.isoformat() if self.fetched_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'refreshing_since': self.refreshing_since.isoformat() if self.refreshing_since else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<ProviderCatalog {self.key}>'
@@ -0,0 +1,51 @@
+from src.database.config import db
+from datetime import datetime
+
+class VideoGeneration(db.Model):
+    """Geração de vídeo no provedor, indexada pelo hash da requisição normalizada"""
+    __tablename__ = 'video_generations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    request_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    generation_id = db.Column(db.String(100), index=True)  # ID da geração no provedor
+
+    # Parâmetros normalizados da requisição
+    provider = db.Column(db.String(50), default='runway')
+    prompt = db.Column(db.Text)
+    model = db.Column(db.String(50))
+    duration = db.Column(db.Integer)
+    resolution = db.Column(db.String(20))
+    quality = db.Column(db.String(20))
+
+    # Status
+    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    file_path = db.Column(db.String(500))  # Clipe armazenado
+    error = db.Column(db.Text)
+    hit_count = db.Column(db.Integer, default=0)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'id': self.id,
+            'request_hash': self.request_hash,
+            'generation_id': self.generation_id,
+            'provider': self.provider,
+            'prompt': self.prompt,
+            'model': self.model,
+            'duration': self.duration,
+            'resolution': self.resolution,
+            'quality': self.quality,
+            'status': self.status,
+            'file_path': self.file_path,
+            'error': self.error,
+            'hit_count': self.hit_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<VideoGeneration {self.id}: {self.status}>'
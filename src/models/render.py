@@ -0,0 +1,54 @@
+from src.database.config import db
+from datetime import datetime
+import json
+
+class Render(db.Model):
+    """Renderização de projeto, consultável e reexecutável a partir de qualquer worker"""
+    __tablename__ = 'renders'
+
+    id = db.Column(db.String(64), primary_key=True)  # Nome do pipeline, usado na URL
+    project_id = db.Column(db.Integer, nullable=False, index=True)
+
+    # Entrada do grafo
+    scenes = db.Column(db.Text)  # JSON com o snapshot das cenas
+    project_hash = db.Column(db.String(64))
+    force = db.Column(db.Boolean, default=False)
+
+    # Status
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, running, completed, failed
+    attempts = db.Column(db.Integer, default=0)
+    report = db.Column(db.Text)  # JSON com o último relatório por nó
+    error = db.Column(db.Text)
+
+    # Timestamps
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_scenes(self):
+        """Obter snapshot das cenas decodificado"""
+        return json.loads(self.scenes) if self.scenes else []
+
+    def get_report(self):
+        """Obter relatório decodificado"""
+        return json.loads(self.report) if self.report else None
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'project_hash': self.project_hash,
+            'force': self.force,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<Render {self.id}: {self.status}>'
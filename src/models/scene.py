@@ -34,6 +34,7 @@ class Scene(db.Model):
     # Status
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
     file_path = db.Column(db.String(500))  # Path do vídeo gerado
+    render_hash = db.Column(db.String(64))  # Hash do conteúdo que gerou o vídeo
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -59,6 +60,7 @@ class Scene(db.Model):
             'ai_model': self.ai_model,
             'status': self.status,
             'file_path': self.file_path,
+            'render_hash': self.render_hash,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -86,6 +88,7 @@ class Project(db.Model):
     # Status
     status = db.Column(db.String(20), default='draft')  # draft, processing, completed, failed
     final_video_path = db.Column(db.String(500))  # Path do vídeo final
+    render_hash = db.Column(db.String(64))  # Hash dos segmentos do vídeo final
     
     # Métricas
     total_duration = db.Column(db.Float, default=0.0)
@@ -108,6 +111,7 @@ class Project(db.Model):
             'scenes': [scene.to_dict() for scene in self.scenes],
             'status': self.status,
             'final_video_path': self.final_video_path,
+            'render_hash': self.render_hash,
             'total_duration': self.total_duration,
             'scene_count': self.scene_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -0,0 +1,194 @@
+from src.database.config import db
+from datetime import datetime
+
+class StoredFile(db.Model):
+    """Arquivo gravado pelo FileManager, com dono e categoria para a contabilidade de uso"""
+    __tablename__ = 'stored_files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), unique=True, nullable=False, index=True)
+    size = db.Column(db.BigInteger, default=0, nullable=False)
+    category = db.Column(db.String(50), nullable=False, index=True)  # Diretório de primeiro nível em assets
+
+    # Dono do arquivo; sem chave estrangeira porque o arquivo pode sobreviver à linha do dono
+    user_id = db.Column(db.Integer, index=True)
+    project_id = db.Column(db.Integer, index=True)
+    # Enviado pelo usuário: nenhuma outra coluna aponta para ele, então a limpeza não o trata como órfão
+    uploaded = db.Column(db.Boolean, default=False, nullable=False, index=True)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'id': self.id,
+            'path': self.path,
+            'size': self.size,
+            'category': self.category,
+            'user_id': self.user_id,
+            'project_id': self.project_id,
+            'uploaded': self.uploaded,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<StoredFile {self.path}>'
+
+class StorageUsage(db.Model):
+    """Totais de bytes e arquivos por escopo (total, usuário, projeto) e categoria"""
+    __tablename__ = 'storage_usage'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_id', 'category', name='uq_storage_usage_scope_category'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)  # total, user, project
+    scope_id = db.Column(db.Integer, nullable=False, default=0)  # 0 para o escopo total
+    category = db.Column(db.String(50), nullable=False)  # 'all' soma todas as categorias
+
+    bytes = db.Column(db.BigInteger, default=0, nullable=False)
+    files = db.Column(db.Integer, default=0, nullable=False)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'scope': self.scope,
+            'scope_id': self.scope_id,
+            'category': self.category,
+            'bytes': self.bytes,
+            'files': self.files,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<StorageUsage {self.scope}:{self.scope_id}:{self.category} {self.bytes}>'
+
+class UploadSession(db.Model):
+    """Upload retomável em partes: bytes recebidos vão para um temporário até a finalização"""
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid hex, usado na URL
+    user_id = db.Column(db.Integer, index=True)
+
+    # Arquivo esperado
+    filename = db.Column(db.String(255), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+
+    # Progresso
+    received_bytes = db.Column(db.BigInteger, default=0, nullable=False)  # Offset para a próxima parte
+    temp_path = db.Column(db.String(500), nullable=False)
+    validated = db.Column(db.Boolean, default=False)  # Cabeçalho do arquivo conferido
+    writing_since = db.Column(db.DateTime)  # Reserva da requisição que está gravando uma parte
+
+    # Resultado
+    status = db.Column(db.String(20), default='uploading', index=True)  # uploading, completed, aborted, failed, expired
+    file_path = db.Column(db.String(500))
+    checksum = db.Column(db.String(64))
+    error = db.Column(db.Text)
+
+    # Timestamps
+    expires_at = db.Column(db.DateTime, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'category': self.category,
+            'size': self.size,
+            'offset': self.received_bytes,
+            'status': self.status,
+            'file_path': self.file_path,
+            'checksum': self.checksum,
+            'error': self.error,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received_bytes}/{self.size}>'
+
+class FileMetadata(db.Model):
+    """Metadados extraídos de um arquivo, válidos enquanto tamanho e mtime não mudarem"""
+    __tablename__ = 'file_metadata'
+
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), unique=True, nullable=False, index=True)
+
+    # Chave de validade: o arquivo mudou se algum dos dois mudou
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+
+    mime_type = db.Column(db.String(100))
+    checksum = db.Column(db.String(64))  # SHA-256
+
+    # Imagens
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    format = db.Column(db.String(20))
+    mode = db.Column(db.String(10))
+
+    # Áudio e vídeo
+    duration = db.Column(db.Float)  # Segundos
+    codec = db.Column(db.String(50))
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Converter para dicionário no formato de FileManager.get_file_info"""
+        info = {
+            'exists': True,
+            'size': self.size,
+            'modified': self.mtime_ns / 1e9,
+            'mime_type': self.mime_type or 'application/octet-stream',
+            'checksum': self.checksum
+        }
+        if self.width is not None and self.height is not None:
+            info['dimensions'] = {'width': self.width, 'height': self.height}
+        if self.format:
+            info['format'] = self.format
+        if self.mode:
+            info['mode'] = self.mode
+        if self.duration is not None:
+            info['duration'] = self.duration
+        if self.codec:
+            info['codec'] = self.codec
+        return info
+
+    def __repr__(self):
+        return f'<FileMetadata {self.path}>'
+
+class MaintenanceLease(db.Model):
+    """Reserva de uma tarefa de manutenção entre processos: só o dono de uma reserva vigente a executa"""
+    __tablename__ = 'maintenance_leases'
+
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(64), nullable=False)  # host:pid:uuid do processo
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Converter para dicionário"""
+        return {
+            'name': self.name,
+            'owner': self.owner,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<MaintenanceLease {self.name}: {self.owner}>'
@@ -3,14 +3,47 @@ from src.services.video.avatar_processor import avatar_processor
 from src.services.storage.file_manager import file_manager
 from src.models.avatar import Avatar, AvatarPhoto
 from src.database.config import db
+from src.utils.auth_manager import auth_manager
+import os
 
 avatar_bp = Blueprint('avatar', __name__)
 
 @avatar_bp.route('/', methods=['GET'])
 def get_avatars():
-    """Listar todos os avatares"""
+    """Listar avatares (paginado por cursor)"""
     try:
-        result = avatar_processor.list_avatars()
+        result = avatar_processor.list_avatars(
+            status=request.args.get('status'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 20, type=int),
+            detail=request.args.get('detail', 'false').lower() == 'true'
+        )
+        
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'data': result['avatars'],
+                'next_cursor': result['next_cursor']
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400 if result.get('invalid_request') else 500
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@avatar_bp.route('/heygen', methods=['GET'])
+def get_heygen_avatars():
+    """Listar avatares da conta HeyGen"""
+    try:
+        result = avatar_processor.list_heygen_avatars()
+        # Gravar o catálogo buscado ou a reserva de atualização
+        db.session.commit()
         
         if result['success']:
             return jsonify({
@@ -81,22 +114,33 @@ def create_avatar():
                 'error': 'Nome é obrigatório'
             }), 400
         
+        # Fotos quase idênticas às já enviadas: keep (padrão), skip ou link
+        duplicates = request.form.get('duplicates', 'keep')
+        user_id = auth_manager.get_request_user()
+        
         # Criar avatar
-        result = avatar_processor.create_avatar_from_photos(photos, name, description)
+        result = avatar_processor.create_avatar_from_photos(
+            photos, name, description,
+            user_id=int(user_id) if user_id is not None else None,
+            duplicates=duplicates
+        )
         
         if result['success']:
             return jsonify({
                 'success': True,
                 'message': result['message'],
                 'data': {
-                    'avatar_id': result['avatar_id']
+                    'avatar_id': result['avatar_id'],
+                    'status': result['status'],
+                    'duplicates': result['duplicates']
                 }
-            }), 201
+            }), 202
         else:
             return jsonify({
                 'success': False,
                 'error': result['error'],
-                'details': result.get('details', [])
+                'details': result.get('details', []),
+                'duplicates': result.get('duplicates', [])
             }), 400
             
     except Exception as e:
@@ -181,12 +225,16 @@ def get_avatar_status(avatar_id):
                 'error': 'Avatar não encontrado'
             }), 404
         
+        avatar_processor.check_stalled(avatar)
+        
         return jsonify({
             'success': True,
             'data': {
                 'id': avatar.id,
                 'name': avatar.name,
                 'status': avatar.status,
+                'status_message': avatar.status_message,
+                'attempts': avatar.attempts,
                 'heygen_id': avatar.heygen_id,
                 'quality': avatar.quality,
                 'created_at': avatar.created_at.isoformat() if avatar.created_at else None,
@@ -200,6 +248,70 @@ def get_avatar_status(avatar_id):
             'error': str(e)
         }), 500
 
+@avatar_bp.route('/<int:avatar_id>/photos/process', methods=['POST'])
+def process_avatar_photos(avatar_id):
+    """Redimensionar e recomprimir todas as fotos do avatar de uma vez"""
+    try:
+        avatar = Avatar.query.get(avatar_id)
+        if not avatar:
+            return jsonify({
+                'success': False,
+                'error': 'Avatar não encontrado'
+            }), 404
+        
+        try:
+            operations = file_manager.image_operations(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        file_paths = [photo.file_path for photo in avatar.photos if os.path.isfile(photo.file_path)]
+        result = file_manager.process_images(
+            file_paths,
+            operations,
+            output_dir=f"{file_manager.base_path}/processed/avatars/{avatar_id}"
+        )
+        
+        return jsonify({
+            'success': result['success'],
+            'data': result
+        }), 200 if result['success'] else 422
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@avatar_bp.route('/<int:avatar_id>/retry', methods=['POST'])
+def retry_avatar(avatar_id):
+    """Reprocessar avatar que falhou"""
+    try:
+        result = avatar_processor.retry_avatar(avatar_id)
+        
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'message': result['message'],
+                'data': {
+                    'avatar_id': result['avatar_id'],
+                    'status': result['status']
+                }
+            }), 202
+        else:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @avatar_bp.route('/upload', methods=['POST'])
 def upload_photo():
     """Upload de foto individual"""
@@ -218,9 +330,11 @@ def upload_photo():
             }), 400
         
         # Salvar arquivo
-        result = file_manager.save_file(photo, 'avatars')
+        user_id = auth_manager.get_request_user()
+        result = file_manager.save_file(photo, 'avatars', user_id=int(user_id) if user_id is not None else None)
         
         if result['success']:
+            db.session.commit()
             return jsonify({
                 'success': True,
                 'message': 'Foto enviada com sucesso',
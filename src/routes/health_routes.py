@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify
 from src.database.config import db
+from src.services.storage.download_manager import download_manager
 
 health_bp = Blueprint('health', __name__)
 
@@ -28,4 +29,12 @@ def ready_check():
             'status': 'not_ready',
             'message': 'Application is not ready',
             'error': str(e)
-        }), 503
\ No newline at end of file
+        }), 503
+
+@health_bp.route('/downloads')
+def download_metrics():
+    """Métricas de throughput dos downloads de mídia"""
+    return jsonify({
+        'status': 'ok',
+        'downloads': download_manager.get_metrics()
+    })
@@ -0,0 +1,541 @@
+import os
+import re
+import uuid
+import mimetypes
+from flask import Blueprint, request, jsonify, Response, stream_with_context, redirect
+from werkzeug.utils import secure_filename
+from src.services.storage.file_manager import file_manager
+from src.services.storage.image_derivatives import image_derivatives
+from src.services.storage.storage_usage import storage_usage
+from src.services.storage.resumable_uploads import resumable_uploads
+from src.services.video.elevenlabs_service import elevenlabs_service
+from src.utils.media_delivery import send_media, resolve_media_path
+from src.utils.auth_manager import auth_manager
+from src.database.config import db
+
+media_bp = Blueprint('media', __name__)
+
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp'}
+UPLOAD_CATEGORIES = {'uploads', 'avatars', 'videos', 'scenes'}
+# Chaves geradas em create_direct_upload: categoria/[ab/cd/]uuid.extensão
+UPLOAD_KEY_PATTERN = re.compile(r'^(?P<category>[a-z]+)/(?:[0-9a-f]{2}/)*[0-9a-f]{32}\.(?P<extension>[a-z0-9]+)$')
+
+@media_bp.route('/audio/<path:filename>', methods=['GET'])
+def get_audio(filename):
+    """Entregar áudio com suporte a Range e cache"""
+    try:
+        file_path = resolve_media_path(f"{file_manager.base_path}/audio", filename, remote=True)
+        if not file_path:
+            return jsonify({
+                'success': False,
+                'error': 'Áudio não encontrado'
+            }), 404
+
+        return send_media(file_path)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/images/<path:filename>', methods=['GET'])
+def get_image(filename):
+    """Entregar miniatura de uma imagem em assets, gerada sob demanda"""
+    try:
+        file_path = resolve_media_path(file_manager.base_path, filename)
+        extension = os.path.splitext(filename)[1].lower().lstrip('.')
+        if not file_path or extension not in IMAGE_EXTENSIONS:
+            return jsonify({
+                'success': False,
+                'error': 'Imagem não encontrada'
+            }), 404
+
+        size = request.args.get('w', 256, type=int)
+        fmt = request.args.get('format', 'webp')
+
+        result = image_derivatives.get(file_path, size, fmt)
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400
+
+        # Com a versão na URL o conteúdo não muda; sem ela, revalidar pelo ETag
+        if request.args.get('v'):
+            return send_media(result['path'], max_age=31536000, immutable=True)
+        return send_media(result['path'])
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/files/<path:key>', methods=['GET'])
+def get_file(key):
+    """Entregar arquivo do storage; com backend remoto, redirecionar para o bucket"""
+    try:
+        backend = file_manager.backend
+        download_name = os.path.basename(key) if request.args.get('download') else None
+
+        if backend.remote:
+            if not backend.exists(key):
+                return jsonify({
+                    'success': False,
+                    'error': 'Arquivo não encontrado'
+                }), 404
+            return redirect(backend.url(key, download_name=download_name), code=302)
+
+        file_path = resolve_media_path(file_manager.base_path, key)
+        if not file_path:
+            return jsonify({
+                'success': False,
+                'error': 'Arquivo não encontrado'
+            }), 404
+
+        return send_media(file_path, as_attachment=bool(download_name), download_name=download_name)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/uploads', methods=['POST'])
+def create_direct_upload():
+    """Assinar upload direto ao storage; arquivos grandes são enviados em partes"""
+    try:
+        data = request.get_json() or {}
+        backend = file_manager.backend
+
+        if not backend.supports_presigned:
+            return jsonify({
+                'success': False,
+                'error': 'Provedor de storage não suporta upload direto; use o envio pelo servidor'
+            }), 400
+
+        filename = secure_filename(data.get('filename', ''))
+        extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        if extension not in file_manager.allowed_extensions:
+            return jsonify({
+                'success': False,
+                'error': f'Tipo de arquivo não suportado: {extension}'
+            }), 400
+
+        size = data.get('size')
+        if not isinstance(size, int) or size <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'Tamanho do arquivo é obrigatório'
+            }), 400
+        if size > file_manager.max_file_size:
+            return jsonify({
+                'success': False,
+                'error': f'Arquivo muito grande: mais de {file_manager.format_size(file_manager.max_file_size)}'
+            }), 400
+
+        category = data.get('category', 'uploads')
+        if category not in UPLOAD_CATEGORIES:
+            return jsonify({
+                'success': False,
+                'error': f'Categoria inválida: {category}'
+            }), 400
+
+        # Recusar já na assinatura o que não caberia na cota; a conclusão confere de novo
+        if not storage_usage.check_quota(_request_user_id(), size)['allowed']:
+            return jsonify({
+                'success': False,
+                'error': 'Cota de armazenamento excedida'
+            }), 413
+
+        key = file_manager.storage_key(
+            file_manager.shard_path(f"{file_manager.base_path}/{category}", f"{uuid.uuid4().hex}.{extension}")
+        )
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if size > backend.multipart_threshold:
+            result = backend.create_multipart_upload(key, content_type, size)
+        else:
+            result = backend.presigned_upload(key, content_type)
+
+        if not result.pop('success'):
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 502
+
+        result['multipart'] = 'upload_id' in result
+        return jsonify({
+            'success': True,
+            'data': result
+        }), 201
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/uploads/complete', methods=['POST'])
+def complete_direct_upload():
+    """Confirmar upload direto, concluindo as partes quando houver"""
+    try:
+        data = request.get_json() or {}
+        backend = file_manager.backend
+        key = data.get('key', '')
+        match = UPLOAD_KEY_PATTERN.match(key)
+
+        if not backend.supports_presigned or not match:
+            return jsonify({
+                'success': False,
+                'error': 'Upload inválido'
+            }), 400
+
+        if data.get('upload_id'):
+            result = backend.complete_multipart_upload(key, data['upload_id'], data.get('parts') or [])
+            if not result['success']:
+                return jsonify({
+                    'success': False,
+                    'error': result['error']
+                }), 400
+
+        info = backend.head(key)
+        if not info:
+            return jsonify({
+                'success': False,
+                'error': 'Upload não encontrado'
+            }), 404
+
+        # A URL assinada não limita o tamanho; conferir o que de fato chegou
+        if info['size'] > file_manager.max_file_size:
+            backend.delete(key)
+            return jsonify({
+                'success': False,
+                'error': f'Arquivo muito grande: mais de {file_manager.format_size(file_manager.max_file_size)}'
+            }), 400
+
+        # Nem o conteúdo: conferir o cabeçalho com uma leitura parcial, como nos uploads pelo servidor
+        header = backend.read_range(key, 0, resumable_uploads.header_bytes) or b''
+        inspection = file_manager.inspect_header(header, match.group('extension'))
+        if not inspection['valid']:
+            backend.delete(key)
+            return jsonify({
+                'success': False,
+                'error': inspection['error']
+            }), 415
+
+        user_id = _request_user_id()
+        quota = storage_usage.check_quota(user_id, info['size'])
+        if not quota['allowed']:
+            backend.delete(key)
+            return jsonify({
+                'success': False,
+                'error': 'Cota de armazenamento excedida'
+            }), 413
+
+        storage_usage.record_file(
+            f"{file_manager.base_path}/{key}",
+            user_id=user_id,
+            category=match.group('category'),
+            size=info['size'],
+            uploaded=True
+        )
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'key': key,
+                'size': info['size'],
+                'content_type': info['content_type'],
+                'url': backend.url(key)
+            }
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/uploads/abort', methods=['POST'])
+def abort_direct_upload():
+    """Cancelar upload em partes"""
+    try:
+        data = request.get_json() or {}
+        key = data.get('key', '')
+
+        if not UPLOAD_KEY_PATTERN.match(key) or not data.get('upload_id'):
+            return jsonify({
+                'success': False,
+                'error': 'Upload inválido'
+            }), 400
+
+        result = file_manager.backend.abort_multipart_upload(key, data['upload_id'])
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400
+
+        return jsonify({
+            'success': True
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/uploads/resumable', methods=['POST'])
+def create_resumable_upload():
+    """Abrir upload retomável; as partes são enviadas com PATCH a partir do offset retornado"""
+    try:
+        data = request.get_json() or {}
+
+        if not data.get('filename') or not isinstance(data.get('size'), int):
+            return jsonify({
+                'success': False,
+                'error': 'filename e size são obrigatórios'
+            }), 400
+
+        result = resumable_uploads.create(
+            data['filename'],
+            data['size'],
+            data.get('category', 'uploads'),
+            user_id=_request_user_id()
+        )
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'data': result['upload']
+        }), 201
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _resumable_response(result: dict, success_code: int = 200):
+    """Resposta de uma operação de upload retomável, com o offset atual no header"""
+    if not result['success']:
+        response = jsonify({
+            'success': False,
+            'error': result['error'],
+            'offset': result.get('offset')
+        })
+        response.status_code = result.get('status_code', 400)
+    else:
+        data = result.get('upload', result)
+        response = jsonify({
+            'success': True,
+            'data': {key: value for key, value in data.items() if key != 'success'}
+        })
+        response.status_code = success_code
+
+    if result.get('offset') is not None:
+        response.headers['Upload-Offset'] = str(result['offset'])
+    elif result.get('upload'):
+        response.headers['Upload-Offset'] = str(result['upload']['offset'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def _request_user_id():
+    """Id numérico do usuário autenticado; o token guarda o id como texto"""
+    user_id = auth_manager.get_request_user()
+    return int(user_id) if user_id is not None else None
+
+def _owns_upload(upload_id: str) -> bool:
+    """Sessões abertas por um usuário só aceitam requisições dele"""
+    upload = resumable_uploads.get(upload_id)
+    if not upload:
+        return False
+    return not upload.user_id or upload.user_id == _request_user_id()
+
+@media_bp.route('/uploads/resumable/<upload_id>', methods=['GET', 'HEAD'])
+def get_resumable_upload(upload_id):
+    """Offset atual do upload, para o cliente retomar após uma queda"""
+    try:
+        if not _owns_upload(upload_id):
+            return jsonify({
+                'success': False,
+                'error': 'Upload não encontrado'
+            }), 404
+
+        return _resumable_response({
+            'success': True,
+            'upload': resumable_uploads.get(upload_id).to_dict()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/uploads/resumable/<upload_id>', methods=['PATCH'])
+def append_resumable_upload(upload_id):
+    """Receber uma parte no offset do header Upload-Offset, gravando o corpo em streaming"""
+    try:
+        if not _owns_upload(upload_id):
+            return jsonify({
+                'success': False,
+                'error': 'Upload não encontrado'
+            }), 404
+
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None or offset < 0:
+            return jsonify({
+                'success': False,
+                'error': 'Header Upload-Offset é obrigatório'
+            }), 400
+
+        result = resumable_uploads.append(upload_id, offset, request.stream, request.content_length)
+        return _resumable_response(result)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/uploads/resumable/<upload_id>/finalize', methods=['POST'])
+def finalize_resumable_upload(upload_id):
+    """Concluir upload retomável e registrar o arquivo"""
+    try:
+        if not _owns_upload(upload_id):
+            return jsonify({
+                'success': False,
+                'error': 'Upload não encontrado'
+            }), 404
+
+        return _resumable_response(resumable_uploads.finalize(upload_id), 201)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/uploads/resumable/<upload_id>', methods=['DELETE'])
+def abort_resumable_upload(upload_id):
+    """Cancelar upload retomável"""
+    try:
+        if not _owns_upload(upload_id):
+            return jsonify({
+                'success': False,
+                'error': 'Upload não encontrado'
+            }), 404
+
+        return _resumable_response(resumable_uploads.abort(upload_id))
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/info', methods=['GET'])
+def get_media_info():
+    """Metadados de arquivos de mídia (?key=categoria/arquivo, repetível), servidos do cache sem abrir os arquivos"""
+    try:
+        keys = request.args.getlist('key')
+        if not keys or len(keys) > 200:
+            return jsonify({
+                'success': False,
+                'error': 'Informe de 1 a 200 chaves'
+            }), 400
+
+        # Caminho na mesma forma usada na gravação, para coincidir com o cache
+        paths = {
+            key: f"{file_manager.base_path}/{key}"
+            for key in keys if resolve_media_path(file_manager.base_path, key)
+        }
+        infos = file_manager.get_files_info(list(paths.values()))
+
+        return jsonify({
+            'success': True,
+            'data': {
+                key: infos[paths[key]] if key in paths else {'exists': False}
+                for key in keys
+            }
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/usage', methods=['GET'])
+def get_storage_usage():
+    """Uso de armazenamento do usuário atual ou de um projeto, por categoria"""
+    try:
+        project_id = request.args.get('project_id', type=int)
+        if project_id:
+            usage = storage_usage.get_usage('project', project_id)
+        else:
+            user_id = _request_user_id()
+            if not user_id:
+                return jsonify({
+                    'success': False,
+                    'error': 'Usuário não autenticado'
+                }), 401
+            usage = storage_usage.get_usage('user', user_id)
+            usage['quota'] = storage_usage.user_quota or None
+
+        return jsonify({
+            'success': True,
+            'data': usage
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@media_bp.route('/tts/stream', methods=['POST'])
+def stream_tts():
+    """Sintetizar texto e enviar o áudio enquanto é gerado"""
+    try:
+        data = request.get_json()
+
+        if not data or not data.get('text', '').strip():
+            return jsonify({
+                'success': False,
+                'error': 'Texto é obrigatório'
+            }), 400
+
+        result = elevenlabs_service.stream_text_to_speech(
+            data['text'],
+            data.get('voice_id'),
+            model_id=data.get('model_id'),
+            voice_settings=data.get('voice_settings')
+        )
+
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400
+
+        return Response(
+            stream_with_context(result['chunks']),
+            mimetype='audio/mpeg',
+            headers={'X-Audio-Cache': 'hit' if result['cached'] else 'miss'}
+        )
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -1,10 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from src.services.workflow.project_manager import project_manager
 from src.services.video.avatar_processor import avatar_processor
 from src.services.video.elevenlabs_service import elevenlabs_service
+from src.services.storage.file_manager import file_manager
 from src.models.scene import Project, Scene
 from src.models.avatar import Avatar
 from src.database.config import db
+from src.utils.media_delivery import send_media, media_exists
+import os
+import json
 
 project_bp = Blueprint('project', __name__)
 
@@ -331,7 +335,7 @@ def generate_scene(scene_id):
             return jsonify({
                 'success': False,
                 'error': result['error']
-            }), 400
+            }), 409 if result.get('status') == 'pending' else 400
             
     except Exception as e:
         return jsonify({
@@ -362,11 +366,78 @@ def get_scene_status(scene_id):
             'error': str(e)
         }), 500
 
+@project_bp.route('/scenes/<int:scene_id>/narration', methods=['GET'])
+def stream_scene_narration(scene_id):
+    """Prévia da narração da cena por streaming"""
+    try:
+        scene = Scene.query.get(scene_id)
+        if not scene:
+            return jsonify({
+                'success': False,
+                'error': 'Cena não encontrada'
+            }), 404
+        
+        if not scene.script:
+            return jsonify({
+                'success': False,
+                'error': 'Cena não possui roteiro'
+            }), 400
+        
+        voice_settings = json.loads(scene.voice_settings) if scene.voice_settings else None
+        result = elevenlabs_service.stream_text_to_speech(
+            scene.script,
+            scene.voice_id,
+            voice_settings=voice_settings or None
+        )
+        
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400
+        
+        return Response(
+            stream_with_context(result['chunks']),
+            mimetype='audio/mpeg',
+            headers={'X-Audio-Cache': 'hit' if result['cached'] else 'miss'}
+        )
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@project_bp.route('/<int:project_id>/narration', methods=['POST'])
+def generate_project_narration(project_id):
+    """Gerar narração do projeto em lotes por voz"""
+    try:
+        result = project_manager.generate_narration(project_id)
+        
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'data': result
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'error': result['error'],
+                'data': result
+            }), 400
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @project_bp.route('/<int:project_id>/generate', methods=['POST'])
 def generate_project_video(project_id):
     """Gerar vídeo final do projeto"""
     try:
-        result = project_manager.generate_project_video(project_id)
+        data = request.get_json(silent=True) or {}
+        result = project_manager.generate_project_video(project_id, force=bool(data.get('force', False)))
         
         if result['success']:
             return jsonify({
@@ -386,24 +457,176 @@ def generate_project_video(project_id):
             'error': str(e)
         }), 500
 
+@project_bp.route('/renders/<render_id>', methods=['GET'])
+def get_render(render_id):
+    """Obter andamento e tempos por etapa de uma renderização"""
+    try:
+        result = project_manager.get_render(render_id)
+        
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'data': result['render']
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 404
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@project_bp.route('/renders/<render_id>/retry', methods=['POST'])
+def retry_render(render_id):
+    """Reexecutar etapas que falharam em uma renderização"""
+    try:
+        result = project_manager.retry_render(render_id)
+        
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'message': 'Renderização reiniciada',
+                'data': result
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 400
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@project_bp.route('/<int:project_id>/images/process', methods=['POST'])
+def process_project_images(project_id):
+    """Redimensionar e recomprimir as imagens de fundo das cenas do projeto de uma vez"""
+    try:
+        project = Project.query.get(project_id)
+        if not project:
+            return jsonify({
+                'success': False,
+                'error': 'Projeto não encontrado'
+            }), 404
+        
+        try:
+            operations = file_manager.image_operations(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        file_paths = []
+        for scene in project.scenes:
+            background = scene.background or ''
+            # Fundos podem estar gravados como URL local (/static/assets/...)
+            if background.startswith('/static/assets/'):
+                background = f"{file_manager.base_path}/{background[len('/static/assets/'):]}"
+            extension = os.path.splitext(background)[1].lower()
+            if extension in ('.jpg', '.jpeg', '.png', '.webp') and os.path.isfile(background):
+                file_paths.append(background)
+        
+        result = file_manager.process_images(
+            file_paths,
+            operations,
+            output_dir=f"{file_manager.base_path}/processed/projects/{project_id}"
+        )
+        
+        return jsonify({
+            'success': result['success'],
+            'data': result
+        }), 200 if result['success'] else 422
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@project_bp.route('/<int:project_id>/media', methods=['GET'])
+def get_project_media(project_id):
+    """Entregar vídeo final do projeto com suporte a Range e cache"""
+    try:
+        project = Project.query.get(project_id)
+        if not project:
+            return jsonify({
+                'success': False,
+                'error': 'Projeto não encontrado'
+            }), 404
+        
+        if not media_exists(project.final_video_path):
+            return jsonify({
+                'success': False,
+                'error': 'Vídeo do projeto não encontrado'
+            }), 404
+        
+        as_attachment = request.args.get('download', 'false').lower() == 'true'
+        return send_media(
+            project.final_video_path,
+            as_attachment=as_attachment,
+            download_name=f'project_{project_id}.{project.format or "mp4"}'
+        )
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@project_bp.route('/scenes/<int:scene_id>/media', methods=['GET'])
+def get_scene_media(scene_id):
+    """Entregar clipe da cena com suporte a Range e cache"""
+    try:
+        scene = Scene.query.get(scene_id)
+        if not scene:
+            return jsonify({
+                'success': False,
+                'error': 'Cena não encontrada'
+            }), 404
+        
+        if scene.status != 'completed' or not media_exists(scene.file_path):
+            return jsonify({
+                'success': False,
+                'error': 'Clipe da cena não encontrado'
+            }), 404
+        
+        return send_media(scene.file_path)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @project_bp.route('/resources/avatars', methods=['GET'])
 def get_available_avatars():
     """Obter avatares disponíveis"""
     try:
-        result = avatar_processor.list_avatars()
+        # Apenas avatares prontos, filtrados no banco
+        result = avatar_processor.list_avatars(
+            status='completed',
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 20, type=int)
+        )
         
         if result['success']:
-            # Filtrar apenas avatares prontos
-            ready_avatars = [avatar for avatar in result['avatars'] if avatar['status'] == 'completed']
             return jsonify({
                 'success': True,
-                'data': ready_avatars
+                'data': result['avatars'],
+                'next_cursor': result['next_cursor']
             }), 200
         else:
             return jsonify({
                 'success': False,
                 'error': result['error']
-            }), 500
+            }), 400 if result.get('invalid_request') else 500
             
     except Exception as e:
         return jsonify({
@@ -416,6 +639,8 @@ def get_available_voices():
     """Obter vozes disponíveis"""
     try:
         result = elevenlabs_service.get_voices()
+        # Gravar o catálogo buscado ou a reserva de atualização
+        db.session.commit()
         
         if result['success']:
             return jsonify({
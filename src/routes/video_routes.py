@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify
 from src.models.video import Video
 from src.services.video_service import VideoService
 from src.database.config import db
+from src.utils.media_delivery import send_media, media_exists
+from src.services.storage.blob_store import blob_store
 import os
 import threading
 import time
@@ -126,7 +128,7 @@ def generate_video(video_id):
                     video_record = Video.query.get(video_id)
                     if video_record:
                         video_record.status = 'completed'
-                        video_record.file_path = output_path
+                        video_record.file_path = blob_store.put(output_path, move=True)
                         video_record.duration = 10.0
                         db.session.commit()
                         
@@ -188,16 +190,17 @@ def download_video(video_id):
                 'error': 'Video not found'
             }), 404
         
-        if not video.file_path or not os.path.exists(video.file_path):
+        if not media_exists(video.file_path):
             return jsonify({
                 'success': False,
                 'error': 'Video file not found'
             }), 404
         
-        return send_file(
+        extension = os.path.splitext(video.file_path)[1]
+        return send_media(
             video.file_path,
             as_attachment=True,
-            download_name=f'video_{video_id}.txt'
+            download_name=f'video_{video_id}{extension}'
         )
     except Exception as e:
         return jsonify({
@@ -205,6 +208,30 @@ def download_video(video_id):
             'error': str(e)
         }), 500
 
+@video_bp.route('/<int:video_id>/stream', methods=['GET'])
+def stream_video(video_id):
+    """Reprodução do vídeo com suporte a Range e cache"""
+    try:
+        video = Video.query.get(video_id)
+        if not video:
+            return jsonify({
+                'success': False,
+                'error': 'Video not found'
+            }), 404
+        
+        if not media_exists(video.file_path):
+            return jsonify({
+                'success': False,
+                'error': 'Video file not found'
+            }), 404
+        
+        return send_media(video.file_path)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @video_bp.route('/<int:video_id>', methods=['DELETE'])
 def delete_video(video_id):
     """Deletar vídeo"""
@@ -216,9 +243,8 @@ def delete_video(video_id):
                 'error': 'Video not found'
             }), 404
         
-        # Remover arquivo se existir
-        if video.file_path and os.path.exists(video.file_path):
-            os.remove(video.file_path)
+        # Arquivo avulso sai agora; blob é coletado quando perde a última referência
+        blob_store.discard(video.file_path)
         
         db.session.delete(video)
         db.session.commit()
@@ -0,0 +1,254 @@
+import os
+import time
+import hashlib
+import logging
+import mimetypes
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import event, update, case
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.exc import IntegrityError
+from src.database.config import db
+from src.models.blob import Blob
+from src.models.scene import Scene, Project
+from src.models.video import Video
+from src.models.avatar import AvatarPhoto
+from src.utils.config_manager import config_manager
+from src.services.storage.file_manager import file_manager
+from src.services.storage.storage_usage import storage_usage
+from src.services.workflow.job_runner import job_runner
+
+logger = logging.getLogger(__name__)
+
+# Colunas que referenciam arquivos; cada linha conta uma referência ao blob do caminho
+REFERENCES = {
+    Scene: 'file_path',
+    Project: 'final_video_path',
+    Video: 'file_path',
+    AvatarPhoto: 'file_path'
+}
+
+class BlobStore:
+    """Arquivos endereçados pelo hash do conteúdo, apagados quando a última referência some"""
+
+    def __init__(self):
+        self.blobs_dir = f"{file_manager.base_path}/blobs"
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+        # Blob sem referências continua no disco por este tempo: cobre quem acabou de obtê-lo em put()
+        self.grace_period = config_manager.get('storage.blob_grace_period', 3600)
+        self.batch_size = config_manager.get('storage.blob_gc_batch_size', 100)
+        self.gc_interval = config_manager.get('storage.blob_gc_interval', 300)
+        self.chunk_size = 1024 * 1024
+
+        self._gc_lock = threading.Lock()
+        self._gc_running = False
+        self._last_gc = 0.0
+
+        self._track_references()
+
+    def is_blob(self, path: Optional[str]) -> bool:
+        """Verificar se o caminho pertence ao blob store"""
+        if not path:
+            return False
+        return os.path.abspath(path).startswith(os.path.abspath(self.blobs_dir) + os.sep)
+
+    def blob_path(self, sha256: str, extension: str = '') -> str:
+        """Caminho do blob, em subdiretórios pelo início do hash"""
+        return f"{self.blobs_dir}/{sha256[:2]}/{sha256}{extension}"
+
+    def hash_file(self, path: str) -> str:
+        """Hash SHA-256 do conteúdo"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def put(self, source_path: str, move: bool = False, user_id: int = None, project_id: int = None) -> str:
+        """Guardar arquivo pelo conteúdo e retornar o caminho do blob; conteúdo repetido reaproveita o existente
+
+        O registro entra na transação atual e a referência é contada quando a linha que
+        aponta para o caminho é gravada. move=True remove o arquivo de origem. O uso de um
+        blob novo é atribuído ao dono informado ou, na falta dele, ao dono da origem.
+        """
+        if self.is_blob(source_path):
+            return source_path
+
+        sha256 = self.hash_file(source_path)
+        now = datetime.utcnow()
+
+        # Renovar a carência de um blob órfão antes de reaproveitá-lo, para a coleta não apagá-lo
+        db.session.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256, Blob.ref_count <= 0)
+            .values(orphaned_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        blob = Blob.query.filter_by(sha256=sha256).first()
+        # O uso continua contado na categoria de origem (avatars, videos...), não em "blobs"
+        owner = {'user_id': user_id, 'project_id': project_id, 'category': storage_usage.category_of(source_path)}
+
+        if blob:
+            path = blob.path
+            if not os.path.exists(path):
+                file_manager.link_file(source_path, path, **owner)
+                file_manager.publish(path, blob.mime_type)
+        else:
+            path = self.blob_path(sha256, os.path.splitext(source_path)[1].lower())
+            mime_type = mimetypes.guess_type(path)[0]
+            file_manager.link_file(source_path, path, **owner)
+            file_manager.publish(path, mime_type)
+            try:
+                with db.session.begin_nested():
+                    db.session.add(Blob(
+                        sha256=sha256,
+                        path=path,
+                        size=os.path.getsize(path),
+                        mime_type=mime_type,
+                        ref_count=0,
+                        orphaned_at=now
+                    ))
+            except IntegrityError:
+                # Outro worker registrou o mesmo conteúdo; o arquivo é idêntico
+                pass
+
+        if move and os.path.abspath(source_path) != os.path.abspath(path):
+            file_manager.delete_file(source_path)
+        return path
+
+    def discard(self, path: Optional[str]) -> bool:
+        """Remover arquivo avulso, anterior ao blob store; blobs ficam para a coleta"""
+        if not path or self.is_blob(path):
+            return False
+        return file_manager.delete_file(path)
+
+    def collect(self, limit: int = None) -> Dict[str, Any]:
+        """Apagar um lote de blobs sem referências há mais que o período de carência"""
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.grace_period)
+            limit = limit or self.batch_size
+            candidates = db.session.query(Blob.id, Blob.path, Blob.size).filter(
+                Blob.ref_count <= 0,
+                Blob.orphaned_at < cutoff
+            ).order_by(Blob.orphaned_at).limit(limit).all()
+
+            deleted = 0
+            freed = 0
+            for blob_id, path, size in candidates:
+                # Reconferir ao remover: o blob pode ter ganhado uma referência desde a consulta
+                removed = Blob.query.filter(
+                    Blob.id == blob_id,
+                    Blob.ref_count <= 0,
+                    Blob.orphaned_at < cutoff
+                ).delete(synchronize_session=False)
+                if removed:
+                    file_manager.delete_file(path)
+                    deleted += 1
+                    freed += size or 0
+                db.session.commit()
+
+            return {
+                'success': True,
+                'deleted': deleted,
+                'freed_bytes': freed,
+                'has_more': len(candidates) == limit
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def schedule_collection(self) -> bool:
+        """Agendar coleta em background, no máximo uma rodada por intervalo neste processo"""
+        with self._gc_lock:
+            if self._gc_running or time.time() - self._last_gc < self.gc_interval:
+                return False
+            self._gc_running = True
+            self._last_gc = time.time()
+
+        try:
+            job_runner.submit(self._run_collection)
+            return True
+        except RuntimeError:
+            # Fora do contexto da aplicação: fica para a próxima liberação
+            self._gc_running = False
+            return False
+
+    def _run_collection(self):
+        """Coletar em lotes curtos até esgotar os blobs vencidos"""
+        try:
+            while True:
+                result = self.collect()
+                if not result['success'] or not result['has_more']:
+                    return result
+        finally:
+            self._gc_running = False
+
+    def _track_references(self):
+        """Contar referências a cada flush, no mesmo commit da linha que aponta para o blob"""
+        for model, column in REFERENCES.items():
+            # active_history: guardar o caminho anterior mesmo se o objeto estava expirado
+            event.listen(getattr(model, column), 'set', lambda *args: None, active_history=True)
+
+        event.listen(Session, 'before_flush', self._count_references)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', lambda session: session.info.pop('blobs_released', None))
+
+    def _count_references(self, session, flush_context, instances):
+        deltas = Counter()
+
+        for obj in session.new:
+            column = REFERENCES.get(type(obj))
+            if column and getattr(obj, column):
+                deltas[getattr(obj, column)] += 1
+
+        for obj in session.dirty:
+            column = REFERENCES.get(type(obj))
+            if not column:
+                continue
+            history = attributes.get_history(obj, column)
+            for path in history.added:
+                if path:
+                    deltas[path] += 1
+            for path in history.deleted:
+                if path:
+                    deltas[path] -= 1
+
+        for obj in session.deleted:
+            column = REFERENCES.get(type(obj))
+            if not column:
+                continue
+            # Valor gravado no banco, ignorando alteração pendente no objeto removido
+            for path in attributes.get_history(obj, column).non_added():
+                if path:
+                    deltas[path] -= 1
+
+        now = datetime.utcnow()
+        for path, delta in deltas.items():
+            if not delta or not self.is_blob(path):
+                continue
+            # orphaned_at primeiro: alguns bancos avaliam o SET já com o ref_count novo
+            session.execute(
+                update(Blob)
+                .where(Blob.path == path)
+                .ordered_values(
+                    (Blob.orphaned_at, case((Blob.ref_count + delta <= 0, now), else_=None)),
+                    (Blob.ref_count, Blob.ref_count + delta)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if delta < 0:
+                session.info['blobs_released'] = True
+
+    def _after_commit(self, session):
+        if session.info.pop('blobs_released', None):
+            self.schedule_collection()
+
+# Instância global
+blob_store = BlobStore()
@@ -0,0 +1,126 @@
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: o total fica restrito ao processo
+    fcntl = None
+
+class DiskCacheLimit:
+    """Limite de tamanho de um diretório de cache com despejo LRU pelo mtime, compartilhado entre workers
+
+    O total fica em um arquivo .usage atualizado sob flock; o diretório só é varrido quando o total passa do limite.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int, suffixes: Tuple[str, ...],
+                 min_age: int = 300, evict_target: float = 0.9):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.suffixes = suffixes
+        # Arquivo lido ou gravado há menos que isto não é despejado: quem o obteve ainda vai usá-lo
+        self.min_age = min_age
+        # Ao estourar o limite, despejar até esta fração dele, para não varrer o diretório a cada gravação
+        self.evict_target = evict_target
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.usage_path = f"{cache_dir}/.usage"
+        self.lock_path = f"{cache_dir}/.lock"
+        self._lock = threading.Lock()
+
+    def touch(self, path: str) -> bool:
+        """Marcar arquivo como usado recentemente; False se não existir"""
+        try:
+            os.utime(path, None)
+            return True
+        except OSError:
+            return False
+
+    def add(self, source_path: str, path: str):
+        """Mover arquivo já escrito para o cache, somando-o ao total e despejando se passar do limite"""
+        size = os.path.getsize(source_path)
+
+        with self._usage_lock():
+            total = self._read_total()
+            try:
+                total -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(source_path, path)
+            total += size
+
+            if total > self.max_size:
+                total = self._evict(keep=path)
+            self._write_total(total)
+
+    def scan(self) -> List[Tuple[float, str, int]]:
+        """Arquivos do cache como (mtime, caminho, tamanho), do menos para o mais recente"""
+        entries = []
+        stack = [self.cache_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.name.endswith(self.suffixes) and entry.is_file(follow_symlinks=False):
+                                stat = entry.stat(follow_symlinks=False)
+                                entries.append((stat.st_mtime, entry.path, stat.st_size))
+                        except OSError:
+                            # Removido durante a varredura
+                            continue
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        return entries
+
+    @contextmanager
+    def _usage_lock(self):
+        """Lock do processo e, onde houver flock, entre workers"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_total(self) -> int:
+        try:
+            with open(self.usage_path) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            # Primeiro uso ou arquivo perdido: recontar
+            return sum(size for _, _, size in self.scan())
+
+    def _write_total(self, total: int):
+        temp_path = f"{self.usage_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(str(max(total, 0)))
+        os.replace(temp_path, self.usage_path)
+
+    def _evict(self, keep: str = None) -> int:
+        """Remover os arquivos menos usados até abaixo da meta; retorna o total recontado"""
+        entries = self.scan()
+        total = sum(size for _, _, size in entries)
+        target = self.max_size * self.evict_target
+        protected_since = time.time() - self.min_age
+        for mtime, path, size in entries:
+            if total <= target or mtime >= protected_since:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        return total
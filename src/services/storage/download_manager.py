@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from src.utils.config_manager import config_manager
+
+class DownloadError(Exception):
+    """Erro de download que não deve ser repetido"""
+    pass
+
+class DownloadManager:
+    """Gerenciador de downloads de mídia gerada pelos provedores"""
+
+    def __init__(self):
+        self.buffer_size = config_manager.get('storage.download.buffer_size', 1024 * 1024)  # 1MB
+        self.parallel_threshold = config_manager.get('storage.download.parallel_threshold', 32 * 1024 * 1024)  # 32MB
+        self.part_size = config_manager.get('storage.download.part_size', 8 * 1024 * 1024)  # 8MB
+        self.max_workers = config_manager.get('storage.download.max_workers', 4)
+        self.max_retries = config_manager.get('storage.download.max_retries', 3)
+        self.timeout = config_manager.get('storage.download.timeout', 60)
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'downloads': 0,
+            'failures': 0,
+            'bytes': 0,
+            'resumed_bytes': 0,
+            'seconds': 0.0
+        }
+
+    def download(self, url: str, dest_path: str, headers: Dict[str, str] = None,
+                 expected_size: int = None, checksum: str = None,
+                 checksum_algorithm: str = 'sha256') -> Dict[str, Any]:
+        """Baixar arquivo para dest_path com escrita atômica, retomada e verificação"""
+        headers = headers or {}
+        temp_path = f"{dest_path}.part"
+        state_path = f"{dest_path}.part.json"
+        start_time = time.time()
+
+        try:
+            os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+
+            remote = self._probe(url, headers)
+            total_size = remote['size'] or expected_size
+            state = self._load_state(state_path, remote)
+
+            if total_size and remote['accept_ranges'] and total_size >= self.parallel_threshold:
+                stats = self._download_parallel(url, headers, temp_path, state_path, state, total_size)
+            else:
+                stats = self._download_sequential(url, headers, temp_path, state_path, state, remote)
+
+            actual_size = os.path.getsize(temp_path)
+            if total_size and actual_size != total_size:
+                raise DownloadError(f'Tamanho inválido: {actual_size} bytes (esperado: {total_size})')
+
+            digest = None
+            if checksum:
+                digest = self._file_digest(temp_path, checksum_algorithm)
+                if digest.lower() != checksum.lower():
+                    raise DownloadError(f'Checksum inválido: {digest}')
+
+            os.replace(temp_path, dest_path)
+            self._remove(state_path)
+
+            elapsed = time.time() - start_time
+            self._record(stats['downloaded'], stats['resumed'], elapsed, success=True)
+
+            return {
+                'success': True,
+                'local_path': dest_path,
+                'size': actual_size,
+                'checksum': digest,
+                'metrics': {
+                    'downloaded_bytes': stats['downloaded'],
+                    'resumed_bytes': stats['resumed'],
+                    'parts': stats['parts'],
+                    'seconds': round(elapsed, 3),
+                    'throughput_mbps': self._throughput(stats['downloaded'], elapsed)
+                }
+            }
+
+        except DownloadError as e:
+            # Arquivo parcial corrompido: descartar para não retomar de um estado inválido
+            self._remove(temp_path)
+            self._remove(state_path)
+            self._record(0, 0, time.time() - start_time, success=False)
+            return {
+                'success': False,
+                'error': str(e)
+            }
+        except Exception as e:
+            # Mantém o arquivo parcial para retomada na próxima tentativa
+            self._record(0, 0, time.time() - start_time, success=False)
+            return {
+                'success': False,
+                'error': str(e),
+                'resumable': os.path.exists(temp_path)
+            }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Obter métricas agregadas de throughput"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+
+        metrics['seconds'] = round(metrics['seconds'], 3)
+        metrics['throughput_mbps'] = self._throughput(metrics['bytes'], metrics['seconds'])
+        return metrics
+
+    def _probe(self, url: str, headers: Dict[str, str]) -> Dict[str, Any]:
+        """Descobrir tamanho e suporte a ranges do arquivo remoto"""
+        info = {'size': None, 'accept_ranges': False, 'etag': None, 'last_modified': None}
+        try:
+            response = requests.head(url, headers=headers, allow_redirects=True, timeout=self.timeout)
+            if response.status_code == 200:
+                length = response.headers.get('Content-Length')
+                info['size'] = int(length) if length and length.isdigit() else None
+                info['accept_ranges'] = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                info['etag'] = response.headers.get('ETag')
+                info['last_modified'] = response.headers.get('Last-Modified')
+        except requests.RequestException:
+            # URLs assinadas às vezes recusam HEAD; seguimos sem ranges
+            pass
+        return info
+
+    def _download_sequential(self, url: str, headers: Dict[str, str], temp_path: str,
+                             state_path: str, state: Dict[str, Any], remote: Dict[str, Any]) -> Dict[str, int]:
+        """Download em stream único com buffer grande, retomando de onde parou"""
+        validator = self._if_range(remote)
+        if not remote['accept_ranges'] or not validator or not self._saved_state(state_path, remote):
+            # Sem ranges, ou sem validadores que provem ser o mesmo arquivo remoto, o parcial não é confiável
+            self._remove(temp_path)
+        self._save_state(state_path, state)
+
+        resumed = os.path.getsize(temp_path) if os.path.exists(temp_path) else 0
+        attempt = 0
+
+        while True:
+            offset = os.path.getsize(temp_path) if os.path.exists(temp_path) else 0
+            request_headers = dict(headers)
+            if offset:
+                request_headers['Range'] = f'bytes={offset}-'
+                # Se o arquivo mudou desde o parcial, o servidor responde 200 com o conteúdo inteiro
+                request_headers['If-Range'] = validator
+
+            try:
+                with requests.get(url, headers=request_headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 416:
+                        # Arquivo parcial já está completo
+                        break
+                    if response.status_code not in (200, 206):
+                        raise DownloadError(f'Erro no download: {response.status_code}')
+
+                    # Servidor ignorou o Range: recomeçar do zero
+                    mode = 'ab' if offset and response.status_code == 206 else 'wb'
+                    if mode == 'wb':
+                        resumed = 0
+
+                    with open(temp_path, mode) as f:
+                        for chunk in response.iter_content(chunk_size=self.buffer_size):
+                            if chunk:
+                                f.write(chunk)
+                break
+
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+
+        # Só os bytes do arquivo final: os de tentativas descartadas com 'wb' não contam
+        downloaded = os.path.getsize(temp_path) - resumed if os.path.exists(temp_path) else 0
+        return {'downloaded': downloaded, 'resumed': resumed, 'parts': 1}
+
+    def _download_parallel(self, url: str, headers: Dict[str, str], temp_path: str,
+                           state_path: str, state: Dict[str, Any], total_size: int) -> Dict[str, int]:
+        """Download em partes paralelas via HTTP Range"""
+        if not os.path.exists(temp_path) or os.path.getsize(temp_path) != total_size:
+            # Pré-alocar arquivo para que cada parte escreva no seu offset
+            with open(temp_path, 'wb') as f:
+                f.truncate(total_size)
+            state['completed'] = []
+
+        ranges = self._split_ranges(total_size)
+        completed = set(state.get('completed', []))
+        pending = [index for index in range(len(ranges)) if index not in completed]
+        resumed = sum(ranges[index][1] - ranges[index][0] + 1 for index in completed)
+        state_lock = threading.Lock()
+
+        def fetch(index: int) -> int:
+            start, end = ranges[index]
+            written = self._fetch_range(url, headers, temp_path, start, end)
+            with state_lock:
+                completed.add(index)
+                state['completed'] = sorted(completed)
+                self._save_state(state_path, state)
+            return written
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            downloaded = sum(executor.map(fetch, pending))
+
+        return {'downloaded': downloaded, 'resumed': resumed, 'parts': len(ranges)}
+
+    def _fetch_range(self, url: str, headers: Dict[str, str], temp_path: str,
+                     start: int, end: int) -> int:
+        """Baixar uma parte e escrevê-la no offset correspondente"""
+        attempt = 0
+        while True:
+            request_headers = dict(headers, Range=f'bytes={start}-{end}')
+            try:
+                with requests.get(url, headers=request_headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code != 206:
+                        raise DownloadError(f'Servidor não respeitou o range: {response.status_code}')
+
+                    written = 0
+                    with open(temp_path, 'r+b') as f:
+                        f.seek(start)
+                        for chunk in response.iter_content(chunk_size=self.buffer_size):
+                            if chunk:
+                                f.write(chunk)
+                                written += len(chunk)
+
+                    if written != end - start + 1:
+                        raise requests.exceptions.ChunkedEncodingError('Parte incompleta')
+                    return written
+
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+
+    def _split_ranges(self, total_size: int) -> List[tuple]:
+        return [
+            (start, min(start + self.part_size, total_size) - 1)
+            for start in range(0, total_size, self.part_size)
+        ]
+
+    def _load_state(self, state_path: str, remote: Dict[str, Any]) -> Dict[str, Any]:
+        """Carregar estado da retomada, descartando-o se o arquivo remoto mudou"""
+        state = {
+            'size': remote['size'],
+            'etag': remote['etag'],
+            'last_modified': remote['last_modified'],
+            'completed': []
+        }
+        saved = self._saved_state(state_path, remote)
+        if saved:
+            state['completed'] = saved.get('completed', [])
+        return state
+
+    def _saved_state(self, state_path: str, remote: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Estado gravado na tentativa anterior, se os validadores ainda conferem com o remoto"""
+        try:
+            with open(state_path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if all(saved.get(key) == remote[key] for key in ('size', 'etag', 'last_modified')):
+            return saved
+        return None
+
+    def _if_range(self, remote: Dict[str, Any]) -> Optional[str]:
+        """Validador para If-Range: ETag forte ou, na falta dele, Last-Modified"""
+        etag = remote['etag']
+        if etag and not etag.startswith('W/'):
+            return etag
+        return remote['last_modified']
+
+    def _save_state(self, state_path: str, state: Dict[str, Any]):
+        temp_state = f"{state_path}.tmp"
+        with open(temp_state, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_state, state_path)
+
+    def _file_digest(self, file_path: str, algorithm: str) -> str:
+        digest = hashlib.new(algorithm)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.buffer_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _record(self, downloaded: int, resumed: int, seconds: float, success: bool):
+        with self._metrics_lock:
+            if success:
+                self._metrics['downloads'] += 1
+            else:
+                self._metrics['failures'] += 1
+            self._metrics['bytes'] += downloaded
+            self._metrics['resumed_bytes'] += resumed
+            self._metrics['seconds'] += seconds
+
+    def _throughput(self, size: int, seconds: float) -> float:
+        """Throughput em megabits por segundo"""
+        if not seconds:
+            return 0.0
+        return round((size * 8) / (seconds * 1000 * 1000), 2)
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# Instância global
+download_manager = DownloadManager()
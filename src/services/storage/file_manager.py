@@ -1,20 +1,40 @@
 import os
 import uuid
 import shutil
+import time
 from typing import List, Dict, Any, Optional
 from werkzeug.utils import secure_filename
-from PIL import Image
-import cv2
+import hashlib
+import mimetypes
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image, ImageFile
 from src.utils.config_manager import config_manager
+from src.utils.image_utils import preprocess_face_photo, process_image_file
+from src.services.storage.storage_backend import storage_backend
+from src.services.storage.storage_usage import storage_usage
+from src.services.storage.file_metadata import file_metadata
 import math
 
 class FileManager:
     """Gerenciador de arquivos e uploads"""
     
+    # Padrão: caber em 1024x1024 mantendo a proporção
+    DEFAULT_IMAGE_OPERATIONS = {
+        'resize': {'width': 1024, 'height': 1024, 'fit': 'contain'},
+        'quality': 85,
+        'format': 'JPEG'
+    }
+    
     def __init__(self):
         self.base_path = config_manager.get('storage.local_path', 'src/static/assets')
         self.max_file_size = config_manager.get('storage.max_file_size', 100 * 1024 * 1024)
         self.allowed_extensions = config_manager.get('storage.allowed_extensions', ['jpg', 'jpeg', 'png', 'mp4', 'mov', 'avi'])
+        self.ingest_chunk_size = 256 * 1024
+        self.max_ingest_workers = 4
+        # Níveis de subdiretórios por hash do nome (ab/cd/arquivo); 0 grava direto no diretório
+        self.shard_levels = config_manager.get('storage.shard_levels', 2)
+        # Com backend remoto o disco local funciona como área de trabalho; o bucket é a origem
+        self.backend = storage_backend
         
         # Criar diretórios necessários
         self.ensure_directories()
@@ -75,45 +95,165 @@ class FileManager:
             'filename': filename
         }
     
-    def save_file(self, file, category: str = 'uploads', custom_name: str = None) -> Dict[str, Any]:
+    def inspect_header(self, data: bytes, extension: str) -> Dict[str, Any]:
+        """Conferir pelo cabeçalho se o conteúdo corresponde à extensão, sem ler o arquivo inteiro"""
+        if extension in ['jpg', 'jpeg', 'png']:
+            parser = ImageFile.Parser()
+            try:
+                parser.feed(data)
+            except Exception:
+                pass
+            if parser.image is None:
+                return {'valid': False, 'error': 'Imagem com formato não reconhecido'}
+            return {
+                'valid': True,
+                'dimensions': {'width': parser.image.width, 'height': parser.image.height},
+                'format': parser.image.format
+            }
+        
+        if extension in ['mp4', 'mov']:
+            # Caixas ISO BMFF: tamanho (4 bytes) seguido do tipo
+            if data[4:8] not in (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip'):
+                return {'valid': False, 'error': 'Vídeo com formato não reconhecido'}
+        elif extension == 'avi':
+            if data[:4] != b'RIFF' or data[8:12] != b'AVI ':
+                return {'valid': False, 'error': 'Vídeo com formato não reconhecido'}
+        
+        return {'valid': True}
+    
+    def save_file(self, file, category: str = 'uploads', custom_name: str = None,
+                  user_id: int = None, project_id: int = None) -> Dict[str, Any]:
         """Salvar arquivo"""
+        result = self.ingest_upload(file, category, custom_name)
+        if not result['success']:
+            return result
+        
+        quota_error = self._check_quota(user_id, result['size'], [result['file_path']])
+        if quota_error:
+            return quota_error
+        
+        storage_usage.record_file(result['file_path'], user_id=user_id, project_id=project_id, uploaded=True)
+        self._record_metadata(result)
+        return result
+    
+    def _record_metadata(self, result: Dict[str, Any]):
+        """Guardar os metadados calculados na ingestão, para get_file_info não reler o arquivo"""
+        file_metadata.record(
+            result['file_path'],
+            mime_type=result.get('mime_type'),
+            checksum=result.get('checksum'),
+            dimensions=result.get('dimensions'),
+            format=result.get('format')
+        )
+    
+    def _check_quota(self, user_id: Optional[int], size: int, file_paths: List[str]) -> Optional[Dict[str, Any]]:
+        """Descartar arquivos recém-gravados que passariam da cota do usuário"""
+        quota = storage_usage.check_quota(user_id, size)
+        if quota['allowed']:
+            return None
+        
+        for file_path in file_paths:
+            self.delete_file(file_path)
+        return {
+            'success': False,
+            'errors': [f"Cota de armazenamento excedida: {self.format_size(quota['used'])} "
+                       f"de {self.format_size(quota['quota'])} em uso"]
+        }
+    
+    def ingest_upload(self, file, category: str = 'uploads', custom_name: str = None) -> Dict[str, Any]:
+        """Gravar upload em uma única leitura, calculando tamanho, checksum e cabeçalho da imagem"""
+        temp_path = None
         try:
-            # Validar arquivo
-            validation = self.validate_file(file)
-            if not validation['valid']:
+            filename = secure_filename(file.filename or '')
+            extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+            if extension not in self.allowed_extensions:
                 return {
                     'success': False,
-                    'errors': validation['errors']
+                    'errors': [f"Tipo de arquivo não suportado: {extension}"]
                 }
             
+            is_image = extension in ['jpg', 'jpeg', 'png']
+            parser = ImageFile.Parser() if is_image else None
+            checksum = hashlib.sha256()
+            size = 0
+            
+            # Temporário no mesmo disco do destino para a troca atômica
+            temp_path = f"{self.base_path}/temp/{uuid.uuid4().hex}.upload"
+            with open(temp_path, 'wb') as output:
+                for chunk in iter(lambda: file.stream.read(self.ingest_chunk_size), b''):
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        return {
+                            'success': False,
+                            'errors': [f"Arquivo muito grande: mais de {self.format_size(self.max_file_size)}"]
+                        }
+                    
+                    checksum.update(chunk)
+                    output.write(chunk)
+                    
+                    # O parser só precisa do cabeçalho para dimensões e formato
+                    if parser and parser.image is None:
+                        try:
+                            parser.feed(chunk)
+                        except Exception:
+                            parser = None
+            
+            warnings = []
+            image_info = {}
+            if is_image:
+                image = parser.image if parser else None
+                if image is None:
+                    return {
+                        'success': False,
+                        'errors': [f"Erro ao processar imagem: formato não reconhecido ({file.filename})"]
+                    }
+                
+                image_info = {
+                    'dimensions': {'width': image.width, 'height': image.height},
+                    'format': image.format
+                }
+                if image.width < 100 or image.height < 100:
+                    warnings.append("Imagem muito pequena (mínimo 100x100px)")
+                if image.width > 4096 or image.height > 4096:
+                    warnings.append("Imagem muito grande (máximo 4096x4096px)")
+                if image.format not in ['JPEG', 'PNG']:
+                    warnings.append(f"Formato de imagem não otimizado: {image.format}")
+            
             # Gerar nome único
             if custom_name:
                 filename = secure_filename(custom_name)
             else:
-                unique_id = str(uuid.uuid4())
-                filename = f"{unique_id}.{validation['extension']}"
+                filename = f"{uuid.uuid4()}.{extension}"
             
-            # Criar diretório da categoria
-            category_path = f"{self.base_path}/{category}"
-            os.makedirs(category_path, exist_ok=True)
+            file_path = self.shard_path(f"{self.base_path}/{category}", filename)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
-            # Caminho completo do arquivo
-            file_path = f"{category_path}/{filename}"
+            os.replace(temp_path, file_path)
+            temp_path = None
             
-            # Salvar arquivo
-            file.save(file_path)
+            if image_info:
+                mime_type = Image.MIME.get(image_info['format'], 'application/octet-stream')
+            else:
+                mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
             
-            # Obter informações do arquivo
-            file_info = self.get_file_info(file_path)
+            published = self.publish(file_path, mime_type)
+            if not published['success']:
+                os.remove(file_path)
+                return {
+                    'success': False,
+                    'errors': [f"Erro ao enviar ao storage: {published['error']}"]
+                }
             
             return {
                 'success': True,
                 'file_path': file_path,
                 'filename': filename,
-                'url': f"/static/assets/{category}/{filename}",
-                'size': file_info['size'],
-                'mime_type': file_info['mime_type'],
-                'warnings': validation['warnings']
+                'url': self.get_url(file_path),
+                'size': size,
+                'mime_type': mime_type,
+                'checksum': checksum.hexdigest(),
+                'warnings': warnings,
+                **image_info
             }
             
         except Exception as e:
@@ -121,33 +261,48 @@ class FileManager:
                 'success': False,
                 'errors': [str(e)]
             }
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
     
-    def save_avatar_photos(self, files: List, avatar_id: str) -> Dict[str, Any]:
-        """Salvar fotos para avatar"""
+    def save_avatar_photos(self, files: List, avatar_id: str, user_id: int = None) -> Dict[str, Any]:
+        """Salvar fotos para avatar, processando os uploads em paralelo"""
         try:
             saved_files = []
             errors = []
             
-            for file in files:
-                # Validar arquivo
-                validation = self.validate_file(file)
-                if not validation['valid']:
-                    errors.extend(validation['errors'])
-                    continue
-                
-                # Verificar se é imagem
-                if validation['extension'] not in ['jpg', 'jpeg', 'png']:
-                    errors.append(f"Arquivo deve ser uma imagem: {file.filename}")
-                    continue
-                
-                # Salvar arquivo
-                result = self.save_file(file, 'avatars', f"avatar_{avatar_id}_{len(saved_files)}")
-                
+            def ingest(indexed_file):
+                index, file = indexed_file
+                extension = secure_filename(file.filename or '').rsplit('.', 1)[-1].lower()
+                if extension not in ['jpg', 'jpeg', 'png']:
+                    return {
+                        'success': False,
+                        'errors': [f"Arquivo deve ser uma imagem: {file.filename}"]
+                    }
+                return self.ingest_upload(file, 'avatars', f"avatar_{avatar_id}_{index}.{extension}")
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(len(files), self.max_ingest_workers))) as executor:
+                results = list(executor.map(ingest, enumerate(files)))
+            
+            for result in results:
                 if result['success']:
                     saved_files.append(result)
                 else:
                     errors.extend(result['errors'])
             
+            # Registrar uso aqui: as threads de ingestão não têm contexto da aplicação
+            saved_paths = [result['file_path'] for result in saved_files]
+            quota_error = self._check_quota(user_id, sum(result['size'] for result in saved_files), saved_paths)
+            if quota_error:
+                return {
+                    'success': False,
+                    'files': [],
+                    'errors': errors + quota_error['errors']
+                }
+            for result in saved_files:
+                storage_usage.record_file(result['file_path'], user_id=user_id, uploaded=True)
+                self._record_metadata(result)
+            
             return {
                 'success': len(errors) == 0,
                 'files': saved_files,
@@ -160,128 +315,243 @@ class FileManager:
                 'errors': [str(e)]
             }
     
-    def process_image(self, file_path: str, operations: Dict[str, Any] = None) -> Dict[str, Any]:
+    def preprocess_avatar_photos(self, file_paths: List[str], target_size: int = 1024,
+                                 min_face_ratio: float = 0.1) -> List[Dict[str, Any]]:
+        """Detectar rosto, recortar e reduzir fotos de avatar em paralelo (um processo por núcleo)"""
+        if not file_paths:
+            return []
+        
+        output_paths = [
+            self.shard_path(
+                f"{self.base_path}/avatars/processed",
+                f"{os.path.splitext(os.path.basename(path))[0]}.jpg"
+            )
+            for path in file_paths
+        ]
+        
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+        if max_workers == 1:
+            return [
+                preprocess_face_photo(path, output_path, target_size, min_face_ratio)
+                for path, output_path in zip(file_paths, output_paths)
+            ]
+        
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                preprocess_face_photo,
+                file_paths,
+                output_paths,
+                [target_size] * len(file_paths),
+                [min_face_ratio] * len(file_paths)
+            ))
+    
+    def process_image(self, file_path: str, operations: Dict[str, Any] = None,
+                      output_path: str = None) -> Dict[str, Any]:
         """Processar imagem (redimensionar, comprimir, etc.)"""
-        try:
-            if not operations:
-                operations = {
-                    'resize': {'width': 1024, 'height': 1024},
-                    'quality': 85,
-                    'format': 'JPEG'
-                }
-            
-            with Image.open(file_path) as img:
-                # Converter para RGB se necessário
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Redimensionar se especificado
-                if 'resize' in operations:
-                    resize_op = operations['resize']
-                    if 'width' in resize_op and 'height' in resize_op:
-                        img = img.resize((resize_op['width'], resize_op['height']), Image.Resampling.LANCZOS)
-                    elif 'width' in resize_op:
-                        ratio = resize_op['width'] / img.width
-                        img = img.resize((resize_op['width'], int(img.height * ratio)), Image.Resampling.LANCZOS)
-                    elif 'height' in resize_op:
-                        ratio = resize_op['height'] / img.height
-                        img = img.resize((int(img.width * ratio), resize_op['height']), Image.Resampling.LANCZOS)
-                
-                # Salvar com qualidade otimizada
-                quality = operations.get('quality', 85)
-                format = operations.get('format', 'JPEG')
-                
-                # Gerar novo nome
-                base_name = os.path.splitext(file_path)[0]
-                new_path = f"{base_name}_processed.{format.lower()}"
-                
-                img.save(new_path, format=format, quality=quality, optimize=True)
-                
-                return {
-                    'success': True,
-                    'original_path': file_path,
-                    'processed_path': new_path,
-                    'size_reduction': self.get_size_reduction(file_path, new_path)
-                }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        operations = operations or self.DEFAULT_IMAGE_OPERATIONS
+        new_path = output_path or self.processed_path(file_path, operations)
+        
+        result = process_image_file(file_path, new_path, operations)
+        if result['success']:
+            result['size_reduction'] = self.get_size_reduction(file_path, new_path)
+        return result
+    
+    def process_images(self, file_paths: List[str], operations: Dict[str, Any] = None,
+                       output_dir: str = None) -> Dict[str, Any]:
+        """Processar várias imagens em paralelo (um processo por núcleo), com tempo e economia por arquivo"""
+        started = time.perf_counter()
+        operations = operations or self.DEFAULT_IMAGE_OPERATIONS
+        file_paths = list(dict.fromkeys(file_paths))
+        output_paths = [self.processed_path(path, operations, output_dir) for path in file_paths]
+        
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+        if max_workers <= 1:
+            results = [
+                process_image_file(path, output_path, operations)
+                for path, output_path in zip(file_paths, output_paths)
+            ]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(
+                    process_image_file,
+                    file_paths,
+                    output_paths,
+                    [operations] * len(file_paths)
+                ))
+        
+        processed = [result for result in results if result['success']]
+        original_bytes = sum(result['original_size'] for result in processed)
+        processed_bytes = sum(result['processed_size'] for result in processed)
+        return {
+            'success': bool(processed) or not file_paths,
+            'files': results,
+            'processed': len(processed),
+            'failed': len(results) - len(processed),
+            'original_bytes': original_bytes,
+            'processed_bytes': processed_bytes,
+            'saved_bytes': original_bytes - processed_bytes,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
     
-    def get_file_info(self, file_path: str) -> Dict[str, Any]:
-        """Obter informações do arquivo"""
+    def image_operations(self, options: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Validar opções de processamento recebidas na API, completando com o padrão"""
+        options = options or {}
+        resize = dict(self.DEFAULT_IMAGE_OPERATIONS['resize'])
+        for key in ('width', 'height'):
+            if key in options:
+                if not isinstance(options[key], int) or not 16 <= options[key] <= 8192:
+                    raise ValueError(f'{key} deve ser um inteiro entre 16 e 8192')
+                resize[key] = options[key]
+        
+        fit = options.get('fit', resize['fit'])
+        if fit not in ('contain', 'cover', 'fill'):
+            raise ValueError('fit deve ser contain, cover ou fill')
+        resize['fit'] = fit
+        
+        quality = options.get('quality', self.DEFAULT_IMAGE_OPERATIONS['quality'])
+        if not isinstance(quality, int) or not 1 <= quality <= 95:
+            raise ValueError('quality deve ser um inteiro entre 1 e 95')
+        
+        image_format = str(options.get('format', self.DEFAULT_IMAGE_OPERATIONS['format'])).upper()
+        if image_format not in ('JPEG', 'WEBP', 'PNG'):
+            raise ValueError('format deve ser JPEG, WEBP ou PNG')
+        
+        return {
+            'resize': resize,
+            'quality': quality,
+            'format': image_format
+        }
+    
+    def processed_path(self, file_path: str, operations: Dict[str, Any], output_dir: str = None) -> str:
+        """Caminho padrão da versão processada de uma imagem"""
+        base_name = os.path.splitext(file_path)[0]
+        if output_dir:
+            base_name = os.path.join(output_dir, os.path.basename(base_name))
+        return f"{base_name}_processed.{operations.get('format', 'JPEG').lower()}"
+    
+    def get_file_info(self, file_path: str, compute: bool = True) -> Dict[str, Any]:
+        """Obter informações do arquivo, do cache de metadados enquanto o arquivo não mudar
+
+        Com compute=False, um arquivo ainda sem metadados retorna só os dados do stat
+        (pending=True) e a extração fica para o background.
+        """
         try:
-            if not os.path.exists(file_path):
-                return {'exists': False}
-            
             stat = os.stat(file_path)
-            
-            info = {
-                'exists': True,
-                'size': stat.st_size,
-                'modified': stat.st_mtime,
-                'created': stat.st_ctime
-            }
-            
-            # Detectar tipo MIME
-            import mimetypes
-            mime_type, _ = mimetypes.guess_type(file_path)
-            info['mime_type'] = mime_type or 'application/octet-stream'
-            
-            # Informações específicas para imagens
-            if mime_type and mime_type.startswith('image/'):
-                try:
-                    with Image.open(file_path) as img:
-                        info['dimensions'] = {
-                            'width': img.width,
-                            'height': img.height
-                        }
-                        info['format'] = img.format
-                        info['mode'] = img.mode
-                except Exception:
-                    pass
-            
-            return info
-            
-        except Exception as e:
+        except FileNotFoundError:
+            return {'exists': False}
+        except OSError as e:
             return {
                 'exists': False,
                 'error': str(e)
             }
+        
+        info = file_metadata.get(file_path, compute=compute) or self._stat_info(file_path, stat)
+        info['created'] = stat.st_ctime
+        return info
+    
+    def get_files_info(self, file_paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Informações de vários arquivos sem abri-los: uma consulta ao cache, pendentes extraídos em background"""
+        cached = file_metadata.get_many(file_paths)
+        result = {}
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                result[file_path] = {'exists': False}
+                continue
+            info = cached.get(file_path) or self._stat_info(file_path, stat)
+            info['created'] = stat.st_ctime
+            result[file_path] = info
+        return result
+    
+    def _stat_info(self, file_path: str, stat: os.stat_result) -> Dict[str, Any]:
+        return {
+            'exists': True,
+            'size': stat.st_size,
+            'modified': stat.st_mtime,
+            'mime_type': mimetypes.guess_type(file_path)[0] or 'application/octet-stream',
+            'pending': True
+        }
+    
+    def shard_path(self, directory: str, filename: str) -> str:
+        """Caminho do arquivo em subdiretórios pelo hash do nome, para nenhum diretório acumular milhares de entradas"""
+        if not self.shard_levels:
+            return f"{directory}/{filename}"
+        digest = hashlib.md5(filename.encode('utf-8')).hexdigest()
+        shards = '/'.join(digest[level * 2:level * 2 + 2] for level in range(self.shard_levels))
+        return f"{directory}/{shards}/{filename}"
+    
+    def storage_key(self, file_path: str) -> Optional[str]:
+        """Chave no backend de um arquivo dentro do diretório de assets"""
+        if not file_path:
+            return None
+        relative = os.path.relpath(file_path, self.base_path)
+        if relative.startswith('..'):
+            return None
+        return relative.replace(os.sep, '/')
+    
+    def publish(self, file_path: str, content_type: str = None) -> Dict[str, Any]:
+        """Enviar arquivo local ao backend remoto, para que todos os nós o enxerguem"""
+        if not self.backend.remote:
+            return {'success': True, 'key': self.storage_key(file_path)}
+        
+        key = self.storage_key(file_path)
+        if not key:
+            return {
+                'success': False,
+                'error': 'Arquivo fora do diretório de assets'
+            }
+        return self.backend.save(file_path, key, content_type or mimetypes.guess_type(file_path)[0])
+    
+    def get_url(self, file_path: str) -> Optional[str]:
+        """URL pública de um arquivo dentro do diretório de assets"""
+        key = self.storage_key(file_path)
+        if not key:
+            return None
+        return self.backend.url(key)
     
     def delete_file(self, file_path: str) -> bool:
         """Deletar arquivo"""
         try:
+            deleted = False
+            if self.backend.remote:
+                key = self.storage_key(file_path)
+                deleted = bool(key) and self.backend.delete(key)
             if os.path.exists(file_path):
                 os.remove(file_path)
-                return True
-            return False
+                deleted = True
+            if deleted:
+                storage_usage.forget_file(file_path)
+                file_metadata.forget(file_path)
+            return deleted
         except Exception:
             return False
     
+    def link_file(self, source_path: str, dest_path: str, user_id: int = None, project_id: int = None,
+                  category: str = None) -> str:
+        """Vincular arquivo ao destino (hard link, com cópia como fallback); sem dono informado, herda o da origem"""
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        temp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+
+        try:
+            os.link(source_path, temp_path)
+        except OSError:
+            shutil.copy2(source_path, temp_path)
+
+        # Troca atômica para nunca expor um arquivo parcial
+        os.replace(temp_path, dest_path)
+        
+        owner = {'user_id': user_id, 'project_id': project_id}
+        if user_id is None and project_id is None:
+            owner = storage_usage.owner_of(source_path)
+        storage_usage.record_file(dest_path, category=category, **owner)
+        file_metadata.copy(source_path, dest_path)
+        return dest_path
+
     def cleanup_temp_files(self, max_age_hours: int = 24) -> int:
         """Limpar arquivos temporários antigos"""
-        try:
-            import time
-            temp_dir = f"{self.base_path}/temp"
-            current_time = time.time()
-            max_age = max_age_hours * 3600
-            deleted_count = 0
-            
-            for filename in os.listdir(temp_dir):
-                file_path = os.path.join(temp_dir, filename)
-                if os.path.isfile(file_path):
-                    file_age = current_time - os.path.getmtime(file_path)
-                    if file_age > max_age:
-                        os.remove(file_path)
-                        deleted_count += 1
-            
-            return deleted_count
-            
-        except Exception:
-            return 0
+        from src.services.storage.storage_janitor import storage_janitor
+        return storage_janitor.sweep_temp(max_age=max_age_hours * 3600)['deleted']
     
     def format_size(self, bytes: int) -> str:
         """Formatar tamanho de arquivo"""
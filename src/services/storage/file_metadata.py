@@ -0,0 +1,284 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import mimetypes
+import subprocess
+import threading
+from typing import Dict, Any, List, Optional
+from flask import has_app_context
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
+from src.database.config import db
+from src.models.storage import FileMetadata
+from src.utils.audio_utils import mp3_duration
+from src.services.workflow.job_runner import job_runner
+
+logger = logging.getLogger(__name__)
+
+class FileMetadataCache:
+    """Metadados de arquivos guardados por caminho, tamanho e mtime; só são extraídos de novo quando o arquivo muda"""
+
+    def __init__(self):
+        self.chunk_size = 1024 * 1024
+        self.probe_timeout = 30
+
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def normalize(self, path: str) -> str:
+        """Caminho na forma gravada na tabela"""
+        return os.path.normpath(path)
+
+    def get(self, file_path: str, compute: bool = True) -> Optional[Dict[str, Any]]:
+        """Metadados atuais do arquivo; sem entrada válida, extrai agora ou (compute=False) agenda a extração"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        if not has_app_context():
+            return self.extract(file_path, stat) if compute else None
+
+        row = FileMetadata.query.filter_by(path=self.normalize(file_path)).first()
+        if row and self._is_current(row, stat):
+            return row.to_dict()
+        if compute:
+            return self.refresh(file_path)
+        self.schedule(file_path)
+        return None
+
+    def get_many(self, file_paths: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Metadados de vários arquivos em uma consulta; os ausentes ou desatualizados são extraídos em background"""
+        stats = {}
+        for file_path in file_paths:
+            try:
+                stats[file_path] = os.stat(file_path)
+            except OSError:
+                pass
+
+        rows = {
+            row.path: row for row in FileMetadata.query.filter(
+                FileMetadata.path.in_([self.normalize(path) for path in stats])
+            )
+        } if stats else {}
+
+        result = {}
+        for file_path in file_paths:
+            stat = stats.get(file_path)
+            row = rows.get(self.normalize(file_path))
+            if stat and row and self._is_current(row, stat):
+                result[file_path] = row.to_dict()
+            else:
+                result[file_path] = None
+                if stat:
+                    self.schedule(file_path)
+        return result
+
+    def record(self, file_path: str, **known) -> bool:
+        """Registrar metadados já conhecidos por quem gravou o arquivo, sem reler o conteúdo
+
+        Campos aceitos: mime_type, checksum, dimensions, format, mode, duration, codec. Áudio
+        e vídeo sem duração informada têm a extração completa agendada em background.
+        """
+        if not has_app_context():
+            return False
+
+        try:
+            stat = os.stat(file_path)
+            values = {
+                'mime_type': known.get('mime_type') or mimetypes.guess_type(file_path)[0],
+                'checksum': known.get('checksum'),
+                'format': known.get('format'),
+                'mode': known.get('mode'),
+                'duration': known.get('duration'),
+                'codec': known.get('codec')
+            }
+            if known.get('dimensions'):
+                values['width'] = known['dimensions']['width']
+                values['height'] = known['dimensions']['height']
+
+            self._store(file_path, stat, values)
+
+            mime_type = values['mime_type'] or ''
+            if values['duration'] is None and mime_type.startswith(('video/', 'audio/')):
+                self.schedule(file_path)
+            return True
+
+        except Exception as e:
+            logger.warning("Falha ao registrar metadados de %s: %s", file_path, e)
+            return False
+
+    def copy(self, source_path: str, dest_path: str) -> bool:
+        """Reaproveitar os metadados da origem para uma cópia ou link do mesmo conteúdo"""
+        if not has_app_context():
+            return False
+
+        row = FileMetadata.query.filter_by(path=self.normalize(source_path)).first()
+        if not row:
+            return False
+        try:
+            source_stat = os.stat(source_path)
+            if not self._is_current(row, source_stat):
+                return False
+            self._store(dest_path, os.stat(dest_path), {
+                column: getattr(row, column)
+                for column in ('mime_type', 'checksum', 'width', 'height', 'format', 'mode', 'duration', 'codec')
+            })
+            return True
+        except Exception as e:
+            logger.warning("Falha ao copiar metadados para %s: %s", dest_path, e)
+            return False
+
+    def refresh(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Extrair metadados do arquivo e gravar na tabela"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        info = self.extract(file_path, stat)
+        try:
+            values = {key: info.get(key) for key in ('mime_type', 'checksum', 'format', 'mode', 'duration', 'codec')}
+            if info.get('dimensions'):
+                values['width'] = info['dimensions']['width']
+                values['height'] = info['dimensions']['height']
+            self._store(file_path, stat, values)
+        except Exception as e:
+            logger.warning("Falha ao gravar metadados de %s: %s", file_path, e)
+        return info
+
+    def forget(self, file_path: str) -> bool:
+        """Remover metadados de um arquivo apagado"""
+        if not has_app_context():
+            return False
+        try:
+            with db.session.begin_nested():
+                removed = FileMetadata.query.filter_by(
+                    path=self.normalize(file_path)
+                ).delete(synchronize_session=False)
+            return bool(removed)
+        except Exception as e:
+            logger.warning("Falha ao remover metadados de %s: %s", file_path, e)
+            return False
+
+    def schedule(self, file_path: str) -> bool:
+        """Agendar extração em background, uma por arquivo por vez"""
+        path = self.normalize(file_path)
+        with self._lock:
+            if path in self._pending:
+                return False
+            self._pending.add(path)
+
+        try:
+            job_runner.submit(self._refresh_job, path)
+            return True
+        except RuntimeError:
+            # Fora do contexto da aplicação: a próxima leitura agenda de novo
+            with self._lock:
+                self._pending.discard(path)
+            return False
+
+    def extract(self, file_path: str, stat: os.stat_result = None) -> Dict[str, Any]:
+        """Ler metadados do arquivo: tipo, checksum, dimensões de imagens e duração e codec de mídia"""
+        stat = stat or os.stat(file_path)
+        mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        info = {
+            'exists': True,
+            'size': stat.st_size,
+            'modified': stat.st_mtime,
+            'mime_type': mime_type,
+            'checksum': self._checksum(file_path)
+        }
+
+        if mime_type.startswith('image/'):
+            try:
+                # Apenas o cabeçalho: Image.open não decodifica os pixels
+                with Image.open(file_path) as img:
+                    info['dimensions'] = {'width': img.width, 'height': img.height}
+                    info['format'] = img.format
+                    info['mode'] = img.mode
+            except Exception:
+                pass
+        elif mime_type.startswith(('video/', 'audio/')):
+            info.update(self._probe(file_path, mime_type))
+        return info
+
+    def _refresh_job(self, path: str):
+        # Tarefa em background: a transação é dela
+        try:
+            self.refresh(path)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def _store(self, file_path: str, stat: os.stat_result, values: Dict[str, Any]):
+        """Gravar a entrada do arquivo em um savepoint da transação atual; o commit fica com quem chama"""
+        path = self.normalize(file_path)
+        values = dict(values, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+        try:
+            with db.session.begin_nested():
+                row = FileMetadata.query.filter_by(path=path).first()
+                if row:
+                    for key in ('width', 'height'):
+                        values.setdefault(key, None)
+                    for key, value in values.items():
+                        setattr(row, key, value)
+                else:
+                    db.session.add(FileMetadata(path=path, **values))
+        except IntegrityError:
+            # Outro worker gravou a mesma entrada ao mesmo tempo; a dele também é válida
+            pass
+
+    def _is_current(self, row: FileMetadata, stat: os.stat_result) -> bool:
+        return row.size == stat.st_size and row.mtime_ns == stat.st_mtime_ns
+
+    def _checksum(self, file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _probe(self, file_path: str, mime_type: str) -> Dict[str, Any]:
+        """Duração, codec e dimensões com ffprobe; sem ele, apenas a duração de MP3"""
+        ffprobe = shutil.which('ffprobe')
+        if not ffprobe:
+            if mime_type == 'audio/mpeg':
+                with open(file_path, 'rb') as f:
+                    return {'duration': round(mp3_duration(f.read()), 3), 'codec': 'mp3'}
+            return {}
+
+        try:
+            result = subprocess.run(
+                [ffprobe, '-v', 'error', '-show_entries',
+                 'format=duration:stream=codec_type,codec_name,width,height', '-of', 'json', file_path],
+                capture_output=True, timeout=self.probe_timeout, check=True
+            )
+            probe = json.loads(result.stdout or b'{}')
+        except (subprocess.SubprocessError, ValueError) as e:
+            logger.warning("ffprobe falhou em %s: %s", file_path, e)
+            return {}
+
+        info = {}
+        duration = (probe.get('format') or {}).get('duration')
+        if duration:
+            info['duration'] = round(float(duration), 3)
+
+        streams = probe.get('streams') or []
+        main = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+        main = main or next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+        if main:
+            info['codec'] = main.get('codec_name')
+            if main.get('width') and main.get('height'):
+                info['dimensions'] = {'width': main['width'], 'height': main['height']}
+        return info
+
+# Instância global
+file_metadata = FileMetadataCache()
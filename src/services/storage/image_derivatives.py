@@ -0,0 +1,153 @@
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from src.utils.config_manager import config_manager
+from src.services.storage.file_manager import file_manager
+from src.services.storage.disk_cache_limit import DiskCacheLimit
+
+class ImageDerivatives:
+    """Miniaturas geradas sob demanda e guardadas em disco pelo hash da imagem de origem"""
+
+    FORMATS = {
+        'webp': ('WEBP', 'image/webp'),
+        'jpeg': ('JPEG', 'image/jpeg')
+    }
+
+    def __init__(self):
+        self.cache_dir = f"{file_manager.base_path}/derivatives"
+        # Derivados de fotos removidas ou substituídas deixam de ser pedidos e saem pelo LRU
+        self.limit = DiskCacheLimit(
+            self.cache_dir,
+            config_manager.get('storage.derivative_cache_max_size', 512 * 1024 * 1024),  # 512MB
+            tuple(f'.{fmt}' for fmt in self.FORMATS)
+        )
+
+        # Tamanhos permitidos: evita gerar uma variante por largura arbitrária
+        self.sizes = config_manager.get('storage.derivative_sizes', [64, 128, 256, 512, 1024])
+        self.quality = 80
+
+        # Hash do conteúdo memorizado por (caminho, tamanho, mtime)
+        self._source_hashes = OrderedDict()
+        self._max_source_hashes = 4096
+        self._hash_lock = threading.Lock()
+
+        # Uma renderização por derivado neste processo; entre workers vale a troca atômica
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def normalize_size(self, size: int) -> int:
+        """Menor tamanho permitido que comporta o pedido"""
+        for allowed in sorted(self.sizes):
+            if size <= allowed:
+                return allowed
+        return max(self.sizes)
+
+    def source_hash(self, source_path: str) -> str:
+        """Hash do conteúdo da imagem de origem"""
+        stat = os.stat(source_path)
+        key = (os.path.abspath(source_path), stat.st_size, stat.st_mtime_ns)
+
+        with self._hash_lock:
+            if key in self._source_hashes:
+                self._source_hashes.move_to_end(key)
+                return self._source_hashes[key]
+
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        with self._hash_lock:
+            self._source_hashes[key] = content_hash
+            while len(self._source_hashes) > self._max_source_hashes:
+                self._source_hashes.popitem(last=False)
+        return content_hash
+
+    def version(self, source_path: str) -> str:
+        """Versão barata da origem para URLs cacheáveis por longo prazo"""
+        stat = os.stat(source_path)
+        return f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+
+    def url_for(self, file_path: str, size: int = 256, fmt: str = 'webp') -> Optional[str]:
+        """URL versionada da miniatura de um arquivo em assets"""
+        if not file_path or not os.path.exists(file_path):
+            return None
+        relative = os.path.relpath(file_path, file_manager.base_path)
+        if relative.startswith('..'):
+            return None
+        return (f"/api/media/images/{relative.replace(os.sep, '/')}"
+                f"?w={self.normalize_size(size)}&format={fmt}&v={self.version(file_path)}")
+
+    def derivative_path(self, content_hash: str, size: int, fmt: str) -> str:
+        """Caminho do derivado no cache"""
+        return f"{self.cache_dir}/{content_hash[:2]}/{content_hash}_{size}.{fmt}"
+
+    def get(self, source_path: str, size: int, fmt: str = 'webp') -> Dict[str, Any]:
+        """Obter miniatura, gerando-a uma única vez no primeiro pedido"""
+        try:
+            if fmt not in self.FORMATS:
+                return {
+                    'success': False,
+                    'error': f'Formato não suportado: {fmt}'
+                }
+
+            size = self.normalize_size(size)
+            content_hash = self.source_hash(source_path)
+            path = self.derivative_path(content_hash, size, fmt)
+            mime_type = self.FORMATS[fmt][1]
+
+            # Tocar o mtime marca o uso para o LRU e protege o derivado do despejo enquanto é entregue
+            if self.limit.touch(path):
+                return {
+                    'success': True,
+                    'path': path,
+                    'mime_type': mime_type,
+                    'generated': False
+                }
+
+            with self._locks[int(content_hash[:8], 16) % len(self._locks)]:
+                # Outro pedido pode ter gerado enquanto esperávamos
+                if os.path.exists(path):
+                    return {
+                        'success': True,
+                        'path': path,
+                        'mime_type': mime_type,
+                        'generated': False
+                    }
+
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                result = file_manager.process_image(
+                    source_path,
+                    {
+                        'resize': {'width': size, 'height': size, 'fit': 'contain'},
+                        'quality': self.quality,
+                        'format': self.FORMATS[fmt][0]
+                    },
+                    output_path=temp_path
+                )
+                if not result['success']:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    return result
+
+                self.limit.add(temp_path, path)
+
+            return {
+                'success': True,
+                'path': path,
+                'mime_type': mime_type,
+                'generated': True
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+# Instância global
+image_derivatives = ImageDerivatives()
@@ -0,0 +1,178 @@
+import os
+import uuid
+import shutil
+import logging
+from typing import Dict, Any, List, Tuple
+from sqlalchemy import case
+from src.database.config import db
+from src.models.scene import Scene, Project
+from src.models.video import Video
+from src.models.avatar import AvatarPhoto
+from src.models.generation import VideoGeneration
+from src.models.storage import StoredFile, UploadSession, FileMetadata
+from src.services.storage.file_manager import file_manager
+
+logger = logging.getLogger(__name__)
+
+# Diretórios que recebiam arquivos direto na raiz antes do layout em subdiretórios
+FLAT_DIRECTORIES = ['videos', 'avatars', 'avatars/processed', 'audio', 'scenes', 'uploads']
+
+# Colunas com caminhos de arquivo, reescritas junto com a mudança de lugar
+PATH_COLUMNS = [
+    (Scene, 'file_path'),
+    (Scene, 'background'),
+    (Project, 'final_video_path'),
+    (Video, 'file_path'),
+    (AvatarPhoto, 'file_path'),
+    (VideoGeneration, 'file_path'),
+    (UploadSession, 'file_path'),
+    (StoredFile, 'path'),
+    (FileMetadata, 'path')
+]
+
+class LayoutMigration:
+    """Mover arquivos da raiz dos diretórios de assets para os subdiretórios por hash, com a aplicação no ar"""
+
+    def __init__(self):
+        self.base_path = file_manager.base_path
+
+    def pending(self) -> List[Tuple[str, str]]:
+        """Arquivos ainda na raiz de um diretório migrável, com o caminho de destino"""
+        moves = []
+        for directory in FLAT_DIRECTORIES:
+            path = f"{self.base_path}/{directory}"
+            try:
+                with os.scandir(path) as iterator:
+                    for entry in iterator:
+                        # Ocultos (.gitkeep) e temporários de gravações em andamento ficam onde estão
+                        if entry.name.startswith('.') or entry.name.endswith('.tmp'):
+                            continue
+                        if entry.is_file(follow_symlinks=False):
+                            moves.append((f"{path}/{entry.name}", file_manager.shard_path(path, entry.name)))
+            except FileNotFoundError:
+                continue
+        return moves
+
+    def migrate(self, dry_run: bool = False, batch_size: int = 200, limit: int = None) -> Dict[str, Any]:
+        """Migrar em lotes: vincular no destino, reescrever os caminhos no banco e só então remover a origem
+
+        Cada lote é um commit; até ele, leitores continuam achando o arquivo no caminho antigo.
+        Pode ser interrompida e executada de novo.
+        """
+        try:
+            if not file_manager.shard_levels:
+                return {
+                    'success': False,
+                    'error': 'storage.shard_levels é 0; não há layout de destino'
+                }
+
+            moves = self.pending()
+            if limit:
+                moves = moves[:limit]
+
+            report = {
+                'success': True,
+                'dry_run': dry_run,
+                'pending': len(moves),
+                'moved': 0,
+                'bytes': 0,
+                'rows_updated': 0,
+                'errors': []
+            }
+
+            for start in range(0, len(moves), batch_size):
+                batch = moves[start:start + batch_size]
+                if dry_run:
+                    report['moved'] += len(batch)
+                    report['bytes'] += sum(os.path.getsize(source) for source, _ in batch if os.path.exists(source))
+                    continue
+                self._migrate_batch(batch, report)
+
+            return report
+
+        except Exception as e:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _migrate_batch(self, batch: List[Tuple[str, str]], report: Dict[str, Any]):
+        linked = []
+        for source, dest in batch:
+            try:
+                self._link(source, dest)
+                linked.append((source, dest))
+            except OSError as e:
+                report['errors'].append({'path': source, 'error': str(e)})
+                logger.warning("Falha ao mover %s: %s", source, e)
+
+        if not linked:
+            return
+
+        try:
+            report['rows_updated'] += self._rewrite_paths(linked)
+            db.session.commit()
+        except Exception as e:
+            # Banco inalterado: os destinos são descartados e a origem continua valendo
+            db.session.rollback()
+            for source, dest in linked:
+                self._remove(dest)
+                report['errors'].append({'path': source, 'error': str(e)})
+            return
+
+        for source, dest in linked:
+            size = os.path.getsize(dest)
+            if file_manager.backend.remote:
+                key = file_manager.storage_key(source)
+                if key:
+                    file_manager.backend.delete(key)
+            self._remove(source)
+            report['moved'] += 1
+            report['bytes'] += size
+
+    def _link(self, source: str, dest: str):
+        """Criar o destino com o mesmo conteúdo (hard link, com cópia como fallback) e publicá-lo"""
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        temp_path = f"{dest}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copy2(source, temp_path)
+        os.replace(temp_path, dest)
+
+        if file_manager.backend.remote:
+            published = file_manager.publish(dest)
+            if not published['success']:
+                self._remove(dest)
+                raise OSError(published['error'])
+
+    def _rewrite_paths(self, moves: List[Tuple[str, str]]) -> int:
+        """Trocar os caminhos antigos pelos novos em todas as colunas, em todas as formas gravadas"""
+        mapping = {}
+        for source, dest in moves:
+            mapping[source] = dest
+            mapping[os.path.normpath(source)] = os.path.normpath(dest)
+            mapping[os.path.abspath(source)] = os.path.abspath(dest)
+            # Fundos de cena podem estar gravados como URL local
+            source_url, dest_url = file_manager.get_url(source), file_manager.get_url(dest)
+            if source_url and dest_url and not file_manager.backend.remote:
+                mapping[source_url] = dest_url
+
+        updated = 0
+        for model, column in PATH_COLUMNS:
+            attribute = getattr(model, column)
+            updated += db.session.query(model).filter(attribute.in_(list(mapping))).update(
+                {attribute: case(mapping, value=attribute)},
+                synchronize_session=False
+            )
+        return updated
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# Instância global
+layout_migration = LayoutMigration()
@@ -0,0 +1,94 @@
+from typing import Dict, Any, List, Optional
+from PIL import Image
+from sqlalchemy import or_
+from src.models.avatar import Avatar, AvatarPhoto
+from src.utils.config_manager import config_manager
+from src.utils.image_utils import dhash, hamming_distance
+
+class PhotoIndex:
+    """Índice de hashes perceptuais para detectar fotos quase duplicadas"""
+
+    BANDS = 8
+    BAND_BITS = 8
+
+    def __init__(self):
+        # Com 8 faixas, distâncias até 7 bits garantem ao menos uma faixa idêntica
+        self.threshold = min(config_manager.get('storage.duplicate_threshold', 6), self.BANDS - 1)
+
+    def hash_upload(self, file) -> Optional[str]:
+        """Calcular hash de um upload sem consumir o stream"""
+        try:
+            with Image.open(file.stream) as img:
+                return dhash(img)
+        except Exception:
+            return None
+        finally:
+            file.stream.seek(0)
+
+    def bands(self, phash: str) -> List[int]:
+        """Dividir o hash em faixas para a busca indexada"""
+        value = int(phash, 16)
+        mask = (1 << self.BAND_BITS) - 1
+        return [(value >> (self.BAND_BITS * index)) & mask for index in range(self.BANDS)]
+
+    def index_fields(self, phash: Optional[str]) -> Dict[str, Any]:
+        """Colunas de hash de uma AvatarPhoto"""
+        if not phash:
+            return {}
+        fields = {'phash': phash}
+        for index, band in enumerate(self.bands(phash)):
+            fields[f'phash_band{index}'] = band
+        return fields
+
+    def find_similar(self, phash: str, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Fotos do usuário a até threshold bits de distância, da mais parecida para a menos"""
+        # Uploads anônimos não têm dono em comum: nunca reaproveitar fotos entre eles
+        if user_id is None:
+            return []
+
+        bands = self.bands(phash)
+        candidates = AvatarPhoto.query.join(Avatar).filter(
+            Avatar.user_id == user_id,
+            or_(*[getattr(AvatarPhoto, f'phash_band{index}') == band for index, band in enumerate(bands)])
+        ).all()
+
+        matches = []
+        for photo in candidates:
+            distance = hamming_distance(phash, photo.phash)
+            if distance <= self.threshold:
+                matches.append({'photo': photo, 'distance': distance})
+        return sorted(matches, key=lambda match: match['distance'])
+
+    def classify_batch(self, hashes: List[Optional[str]], user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Identificar, para cada foto do lote, se repete uma foto anterior do lote ou já existente"""
+        results = []
+        for position, phash in enumerate(hashes):
+            result = {'phash': phash, 'batch_duplicate_of': None, 'duplicate_of': None, 'distance': None}
+            results.append(result)
+            if not phash:
+                continue
+
+            for previous in range(position):
+                previous_hash = hashes[previous]
+                if previous_hash and hamming_distance(phash, previous_hash) <= self.threshold:
+                    result['batch_duplicate_of'] = previous
+                    result['distance'] = hamming_distance(phash, previous_hash)
+                    break
+            if result['batch_duplicate_of'] is not None:
+                continue
+
+            matches = self.find_similar(phash, user_id)
+            if matches:
+                result['duplicate_of'] = matches[0]['photo']
+                result['distance'] = matches[0]['distance']
+        return results
+
+    def is_shared(self, file_path: str, exclude_photo_ids: List[int] = None) -> bool:
+        """Verificar se outra foto ainda usa o arquivo"""
+        query = AvatarPhoto.query.filter(AvatarPhoto.file_path == file_path)
+        if exclude_photo_ids:
+            query = query.filter(~AvatarPhoto.id.in_(exclude_photo_ids))
+        return query.first() is not None
+
+# Instância global
+photo_index = PhotoIndex()
@@ -0,0 +1,356 @@
+import os
+import uuid
+import hashlib
+import mimetypes
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from PIL import Image
+from sqlalchemy import or_
+from werkzeug.utils import secure_filename
+from src.database.config import db
+from src.models.storage import UploadSession
+from src.utils.config_manager import config_manager
+from src.services.storage.file_manager import file_manager
+from src.services.storage.storage_usage import storage_usage
+from src.services.storage.file_metadata import file_metadata
+
+class ResumableUploads:
+    """Uploads em partes com offset: cada parte é gravada direto no temporário e a conexão pode cair sem perder o já enviado"""
+
+    CATEGORIES = {'uploads', 'avatars', 'videos', 'scenes'}
+
+    def __init__(self):
+        self.temp_dir = f"{file_manager.base_path}/temp"
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+        self.max_size = config_manager.get('storage.max_resumable_size', 2 * 1024 * 1024 * 1024)
+        self.session_ttl = config_manager.get('storage.upload_session_ttl', 86400)
+        # Bytes iniciais conferidos antes de aceitar o restante
+        self.header_bytes = 64 * 1024
+        # Reserva de uma parte em gravação; depois disso outra requisição pode retomar
+        self.write_timeout = 600
+        self.chunk_size = 256 * 1024
+
+    def create(self, filename: str, size: int, category: str = 'uploads',
+               user_id: int = None) -> Dict[str, Any]:
+        """Abrir sessão de upload e retornar o id e o offset inicial"""
+        try:
+            filename = secure_filename(filename or '')
+            extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+            if extension not in file_manager.allowed_extensions:
+                return {
+                    'success': False,
+                    'error': f'Tipo de arquivo não suportado: {extension}'
+                }
+            if category not in self.CATEGORIES:
+                return {
+                    'success': False,
+                    'error': f'Categoria inválida: {category}'
+                }
+            if not isinstance(size, int) or size <= 0:
+                return {
+                    'success': False,
+                    'error': 'Tamanho do arquivo é obrigatório'
+                }
+            if size > self.max_size:
+                return {
+                    'success': False,
+                    'error': f'Arquivo muito grande: mais de {file_manager.format_size(self.max_size)}'
+                }
+
+            # Recusar já na abertura o que não caberia na cota
+            quota = storage_usage.check_quota(user_id, size)
+            if not quota['allowed']:
+                return {
+                    'success': False,
+                    'error': 'Cota de armazenamento excedida'
+                }
+
+            self.expire_sessions()
+
+            session_id = uuid.uuid4().hex
+            temp_path = f"{self.temp_dir}/{session_id}.part"
+            open(temp_path, 'wb').close()
+
+            upload = UploadSession(
+                id=session_id,
+                user_id=user_id,
+                filename=filename,
+                category=category,
+                size=size,
+                received_bytes=0,
+                temp_path=temp_path,
+                status='uploading',
+                expires_at=datetime.utcnow() + timedelta(seconds=self.session_ttl)
+            )
+            db.session.add(upload)
+            db.session.commit()
+
+            return {
+                'success': True,
+                'upload': upload.to_dict()
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def get(self, session_id: str) -> Optional[UploadSession]:
+        """Obter sessão de upload"""
+        return UploadSession.query.filter_by(id=session_id).populate_existing().first()
+
+    def append(self, session_id: str, offset: int, stream, length: Optional[int] = None) -> Dict[str, Any]:
+        """Gravar uma parte a partir do offset; bytes já recebidos contam mesmo se a conexão cair"""
+        upload = self.get(session_id)
+        if not upload or upload.status != 'uploading':
+            return {
+                'success': False,
+                'error': 'Upload não encontrado ou já encerrado',
+                'status_code': 404
+            }
+
+        if offset != upload.received_bytes or not self._claim_write(session_id, offset):
+            # Cliente fora de sincronia ou outra parte em gravação: informar o offset atual
+            return {
+                'success': False,
+                'error': 'Offset não confere com o recebido',
+                'offset': upload.received_bytes,
+                'status_code': 409
+            }
+
+        received = offset
+        error = None
+        try:
+            with open(upload.temp_path, 'r+b') as output:
+                output.seek(offset)
+                remaining = length
+                while remaining is None or remaining > 0:
+                    chunk = stream.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    if received + len(chunk) > upload.size:
+                        error = 'Parte ultrapassa o tamanho declarado do arquivo'
+                        break
+                    output.write(chunk)
+                    received += len(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                output.flush()
+                os.fsync(output.fileno())
+        except Exception as e:
+            # Conexão interrompida: guardar o que chegou para o cliente retomar daí
+            error = f'Parte incompleta: {e}'
+
+        upload = self.get(session_id)
+        upload.received_bytes = received
+        upload.writing_since = None
+
+        if not upload.validated and received >= min(upload.size, self.header_bytes):
+            header = self._read_header(upload.temp_path)
+            inspection = file_manager.inspect_header(header, self._extension(upload))
+            if not inspection['valid']:
+                self._fail(upload, inspection['error'])
+                return {
+                    'success': False,
+                    'error': inspection['error'],
+                    'status_code': 415
+                }
+            upload.validated = True
+
+        db.session.commit()
+
+        if error:
+            return {
+                'success': False,
+                'error': error,
+                'offset': received,
+                'status_code': 400
+            }
+        return {
+            'success': True,
+            'upload': upload.to_dict()
+        }
+
+    def finalize(self, session_id: str) -> Dict[str, Any]:
+        """Conferir o arquivo completo e movê-lo atomicamente para a categoria"""
+        upload = self.get(session_id)
+        if not upload or upload.status != 'uploading':
+            return {
+                'success': False,
+                'error': 'Upload não encontrado ou já encerrado',
+                'status_code': 404
+            }
+        if upload.received_bytes != upload.size:
+            return {
+                'success': False,
+                'error': f'Upload incompleto: {upload.received_bytes} de {upload.size} bytes',
+                'offset': upload.received_bytes,
+                'status_code': 409
+            }
+        if not self._claim_write(session_id, upload.received_bytes):
+            return {
+                'success': False,
+                'error': 'Upload em gravação',
+                'status_code': 409
+            }
+
+        try:
+            upload = self.get(session_id)
+            extension = self._extension(upload)
+            inspection = file_manager.inspect_header(self._read_header(upload.temp_path), extension)
+            if not inspection['valid']:
+                self._fail(upload, inspection['error'])
+                db.session.commit()
+                return {
+                    'success': False,
+                    'error': inspection['error'],
+                    'status_code': 415
+                }
+
+            # Descartar bytes de uma parte interrompida além do tamanho declarado
+            checksum = hashlib.sha256()
+            with open(upload.temp_path, 'r+b') as f:
+                f.truncate(upload.size)
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    checksum.update(chunk)
+
+            filename = f"{uuid.uuid4()}.{extension}"
+            file_path = file_manager.shard_path(f"{file_manager.base_path}/{upload.category}", filename)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(upload.temp_path, file_path)
+
+            if inspection.get('format'):
+                mime_type = Image.MIME.get(inspection['format'], 'application/octet-stream')
+            else:
+                mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+            published = file_manager.publish(file_path, mime_type)
+            if not published['success']:
+                os.replace(file_path, upload.temp_path)
+                upload.writing_since = None
+                db.session.commit()
+                return {
+                    'success': False,
+                    'error': f"Erro ao enviar ao storage: {published['error']}",
+                    'status_code': 502
+                }
+
+            # A cota pode ter sido consumida por outros uploads desde a abertura da sessão
+            quota_error = file_manager._check_quota(upload.user_id, upload.size, [file_path])
+            if quota_error:
+                upload.status = 'failed'
+                upload.error = quota_error['errors'][0]
+                upload.writing_since = None
+                db.session.commit()
+                return {
+                    'success': False,
+                    'error': upload.error,
+                    'status_code': 413
+                }
+
+            upload.status = 'completed'
+            upload.file_path = file_path
+            upload.checksum = checksum.hexdigest()
+            upload.writing_since = None
+            # Registro de uso e metadados no mesmo commit que conclui a sessão
+            storage_usage.record_file(file_path, user_id=upload.user_id, uploaded=True)
+            file_metadata.record(
+                file_path,
+                mime_type=mime_type,
+                checksum=upload.checksum,
+                dimensions=inspection.get('dimensions'),
+                format=inspection.get('format')
+            )
+            db.session.commit()
+
+            return {
+                'success': True,
+                'file_path': file_path,
+                'filename': filename,
+                'url': file_manager.get_url(file_path),
+                'size': upload.size,
+                'mime_type': mime_type,
+                'checksum': upload.checksum,
+                **{key: inspection[key] for key in ('dimensions', 'format') if key in inspection}
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            upload = self.get(session_id)
+            if upload:
+                upload.writing_since = None
+                db.session.commit()
+            return {
+                'success': False,
+                'error': str(e),
+                'status_code': 500
+            }
+
+    def abort(self, session_id: str) -> Dict[str, Any]:
+        """Cancelar upload e apagar os bytes recebidos"""
+        upload = self.get(session_id)
+        if not upload or upload.status != 'uploading':
+            return {
+                'success': False,
+                'error': 'Upload não encontrado ou já encerrado',
+                'status_code': 404
+            }
+
+        upload.status = 'aborted'
+        self._remove_temp(upload)
+        db.session.commit()
+        return {
+            'success': True,
+            'upload': upload.to_dict()
+        }
+
+    def expire_sessions(self, limit: int = 50) -> int:
+        """Encerrar sessões vencidas e liberar seus temporários"""
+        expired = UploadSession.query.filter(
+            UploadSession.status == 'uploading',
+            UploadSession.expires_at < datetime.utcnow()
+        ).limit(limit).all()
+
+        for upload in expired:
+            upload.status = 'expired'
+            self._remove_temp(upload)
+        if expired:
+            db.session.commit()
+        return len(expired)
+
+    def _claim_write(self, session_id: str, offset: int) -> bool:
+        """Reservar a sessão para uma única gravação por vez, no offset esperado"""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.write_timeout)
+        claimed = UploadSession.query.filter(
+            UploadSession.id == session_id,
+            UploadSession.status == 'uploading',
+            UploadSession.received_bytes == offset,
+            or_(UploadSession.writing_since.is_(None), UploadSession.writing_since < cutoff)
+        ).update({'writing_since': now}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _fail(self, upload: UploadSession, error: str):
+        upload.status = 'failed'
+        upload.error = error
+        upload.writing_since = None
+        self._remove_temp(upload)
+        db.session.commit()
+
+    def _remove_temp(self, upload: UploadSession):
+        if upload.temp_path and os.path.exists(upload.temp_path):
+            os.remove(upload.temp_path)
+
+    def _read_header(self, path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read(self.header_bytes)
+
+    def _extension(self, upload: UploadSession) -> str:
+        return upload.filename.rsplit('.', 1)[1].lower()
+
+# Instância global
+resumable_uploads = ResumableUploads()
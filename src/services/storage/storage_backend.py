@@ -0,0 +1,385 @@
+import os
+import math
+import mimetypes
+import shutil
+import uuid
+from typing import Dict, Any, List, Optional
+from src.utils.config_manager import config_manager
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # Dependência opcional, necessária apenas com storage.provider = 's3'
+    boto3 = None
+
+class StorageBackend:
+    """Interface dos backends de armazenamento; chaves são caminhos relativos com '/'"""
+
+    # Backends remotos recebem uploads e entregam downloads sem passar pelo Flask
+    remote = False
+    supports_presigned = False
+
+    def save(self, local_path: str, key: str, content_type: str = None) -> Dict[str, Any]:
+        """Gravar arquivo local na chave"""
+        raise NotImplementedError
+
+    def download(self, key: str, local_path: str) -> Dict[str, Any]:
+        """Copiar conteúdo da chave para um arquivo local"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        """Remover chave"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        """Verificar se a chave existe"""
+        raise NotImplementedError
+
+    def head(self, key: str) -> Optional[Dict[str, Any]]:
+        """Tamanho e tipo da chave, ou None se não existir"""
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int, length: int) -> Optional[bytes]:
+        """Ler length bytes da chave a partir de start, ou None se não existir"""
+        raise NotImplementedError
+
+    def url(self, key: str, expires_in: int = None, download_name: str = None) -> Optional[str]:
+        """URL de leitura da chave"""
+        raise NotImplementedError
+
+    def presigned_upload(self, key: str, content_type: str, expires_in: int = None) -> Dict[str, Any]:
+        """URL assinada para o cliente enviar o arquivo direto ao storage"""
+        return self._unsupported()
+
+    def create_multipart_upload(self, key: str, content_type: str, size: int,
+                                expires_in: int = None) -> Dict[str, Any]:
+        """Iniciar upload em partes e assinar a URL de cada parte"""
+        return self._unsupported()
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Concluir upload em partes"""
+        return self._unsupported()
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> Dict[str, Any]:
+        """Cancelar upload em partes, liberando as partes já enviadas"""
+        return self._unsupported()
+
+    def _unsupported(self) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': 'Provedor de storage não suporta upload direto'
+        }
+
+class LocalStorageBackend(StorageBackend):
+    """Arquivos no disco local, servidos em /static/assets"""
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+
+    def path(self, key: str) -> str:
+        """Caminho local da chave"""
+        return os.path.join(self.base_path, *key.split('/'))
+
+    def save(self, local_path: str, key: str, content_type: str = None) -> Dict[str, Any]:
+        try:
+            path = self.path(key)
+            if os.path.abspath(local_path) != os.path.abspath(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                shutil.copyfile(local_path, temp_path)
+                os.replace(temp_path, path)
+            return {
+                'success': True,
+                'key': key,
+                'size': os.path.getsize(path)
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def download(self, key: str, local_path: str) -> Dict[str, Any]:
+        try:
+            if os.path.abspath(local_path) != os.path.abspath(self.path(key)):
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                shutil.copyfile(self.path(key), local_path)
+            return {
+                'success': True,
+                'path': local_path
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self.path(key))
+            return True
+        except OSError:
+            return False
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def head(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            size = os.path.getsize(self.path(key))
+        except OSError:
+            return None
+        content_type, _ = mimetypes.guess_type(key)
+        return {
+            'size': size,
+            'content_type': content_type,
+            'etag': None
+        }
+
+    def read_range(self, key: str, start: int, length: int) -> Optional[bytes]:
+        try:
+            with open(self.path(key), 'rb') as f:
+                f.seek(start)
+                return f.read(length)
+        except OSError:
+            return None
+
+    def url(self, key: str, expires_in: int = None, download_name: str = None) -> Optional[str]:
+        return f"/static/assets/{key}"
+
+class S3StorageBackend(StorageBackend):
+    """Bucket S3 ou compatível (MinIO, R2); leituras e escritas grandes vão direto ao bucket"""
+
+    remote = True
+    supports_presigned = True
+
+    # Limites do protocolo S3 para upload em partes
+    MIN_PART_SIZE = 5 * 1024 * 1024
+    MAX_PARTS = 10000
+
+    def __init__(self, settings: Dict[str, Any], secret_key: Optional[str] = None):
+        if boto3 is None:
+            raise RuntimeError('boto3 não instalado; necessário para storage.provider = s3')
+        if not settings.get('bucket'):
+            raise RuntimeError('storage.s3.bucket não configurado')
+
+        self.bucket = settings['bucket']
+        self.prefix = (settings.get('prefix') or '').strip('/')
+        self.public_url = (settings.get('public_url') or '').rstrip('/')
+        self.expires_in = settings.get('presign_expiration', 3600)
+        self.multipart_threshold = settings.get('multipart_threshold', 64 * 1024 * 1024)
+        self.part_size = max(settings.get('part_size', 16 * 1024 * 1024), self.MIN_PART_SIZE)
+
+        # Sem credenciais na configuração, o boto3 usa as variáveis de ambiente ou o perfil da instância
+        self.client = boto3.client(
+            's3',
+            endpoint_url=settings.get('endpoint_url') or None,
+            region_name=settings.get('region') or None,
+            aws_access_key_id=settings.get('access_key_id') or None,
+            aws_secret_access_key=secret_key or None,
+            config=BotoConfig(
+                signature_version='s3v4',
+                s3={'addressing_style': settings.get('addressing_style', 'auto')},
+                max_pool_connections=settings.get('max_connections', 16)
+            )
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.part_size
+        )
+
+    def object_key(self, key: str) -> str:
+        """Chave do objeto no bucket, com o prefixo configurado"""
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def save(self, local_path: str, key: str, content_type: str = None) -> Dict[str, Any]:
+        try:
+            extra_args = {'ContentType': content_type} if content_type else None
+            # upload_file divide arquivos grandes em partes enviadas em paralelo
+            self.client.upload_file(local_path, self.bucket, self.object_key(key),
+                                    ExtraArgs=extra_args, Config=self.transfer_config)
+            return {
+                'success': True,
+                'key': key,
+                'size': os.path.getsize(local_path)
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def download(self, key: str, local_path: str) -> Dict[str, Any]:
+        try:
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            temp_path = f"{local_path}.{uuid.uuid4().hex}.tmp"
+            self.client.download_file(self.bucket, self.object_key(key), temp_path,
+                                      Config=self.transfer_config)
+            os.replace(temp_path, local_path)
+            return {
+                'success': True,
+                'path': local_path
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def delete(self, key: str) -> bool:
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError:
+            return False
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError:
+            return False
+
+    def url(self, key: str, expires_in: int = None, download_name: str = None) -> Optional[str]:
+        # Bucket público ou CDN na frente: URL estável, cacheável pelo navegador
+        if self.public_url and not download_name:
+            return f"{self.public_url}/{self.object_key(key)}"
+
+        params = {'Bucket': self.bucket, 'Key': self.object_key(key)}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+        return self.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expires_in or self.expires_in
+        )
+
+    def presigned_upload(self, key: str, content_type: str, expires_in: int = None) -> Dict[str, Any]:
+        try:
+            url = self.client.generate_presigned_url(
+                'put_object',
+                Params={'Bucket': self.bucket, 'Key': self.object_key(key), 'ContentType': content_type},
+                ExpiresIn=expires_in or self.expires_in
+            )
+            return {
+                'success': True,
+                'key': key,
+                'method': 'PUT',
+                'url': url,
+                'headers': {'Content-Type': content_type}
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def create_multipart_upload(self, key: str, content_type: str, size: int,
+                                expires_in: int = None) -> Dict[str, Any]:
+        try:
+            # Aumentar a parte quando o arquivo passaria do limite de partes
+            part_size = max(self.part_size, math.ceil(size / self.MAX_PARTS))
+            part_count = max(1, math.ceil(size / part_size))
+
+            upload = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.object_key(key), ContentType=content_type
+            )
+            upload_id = upload['UploadId']
+
+            parts = []
+            for part_number in range(1, part_count + 1):
+                parts.append({
+                    'part_number': part_number,
+                    'url': self.client.generate_presigned_url(
+                        'upload_part',
+                        Params={
+                            'Bucket': self.bucket,
+                            'Key': self.object_key(key),
+                            'UploadId': upload_id,
+                            'PartNumber': part_number
+                        },
+                        ExpiresIn=expires_in or self.expires_in
+                    )
+                })
+
+            return {
+                'success': True,
+                'key': key,
+                'upload_id': upload_id,
+                'part_size': part_size,
+                'parts': parts
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.object_key(key),
+                UploadId=upload_id,
+                MultipartUpload={'Parts': [
+                    {'PartNumber': int(part['part_number']), 'ETag': part['etag']}
+                    for part in sorted(parts, key=lambda part: int(part['part_number']))
+                ]}
+            )
+            return {
+                'success': True,
+                'key': key
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> Dict[str, Any]:
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.object_key(key), UploadId=upload_id)
+            return {
+                'success': True,
+                'key': key
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def head(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return {
+                'size': response['ContentLength'],
+                'content_type': response.get('ContentType'),
+                'etag': response.get('ETag')
+            }
+        except ClientError:
+            return None
+
+    def read_range(self, key: str, start: int, length: int) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket,
+                Key=self.object_key(key),
+                Range=f'bytes={start}-{start + length - 1}'
+            )
+            return response['Body'].read()
+        except ClientError:
+            return None
+
+def create_storage_backend() -> StorageBackend:
+    """Criar o backend configurado em storage.provider"""
+    provider = config_manager.get('storage.provider', 'local')
+    if provider == 's3':
+        return S3StorageBackend(
+            config_manager.get('storage.s3', {}),
+            config_manager.get_api_key('storage', 's3')
+        )
+    return LocalStorageBackend(config_manager.get('storage.local_path', 'src/static/assets'))
+
+# Instância global
+storage_backend = create_storage_backend()
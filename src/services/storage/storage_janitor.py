@@ -0,0 +1,289 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Iterator, Set, Tuple
+from sqlalchemy.exc import IntegrityError
+from src.database.config import db
+from src.models.blob import Blob
+from src.models.scene import Scene, Project
+from src.models.video import Video
+from src.models.avatar import AvatarPhoto
+from src.models.generation import VideoGeneration
+from src.models.storage import UploadSession, StoredFile, MaintenanceLease
+from src.utils.config_manager import config_manager
+from src.services.storage.file_manager import file_manager
+from src.services.storage.blob_store import blob_store
+from src.services.storage.resumable_uploads import resumable_uploads
+
+logger = logging.getLogger(__name__)
+
+# Colunas que mantêm um arquivo vivo; arquivo sem nenhuma delas nem registro de envio (StoredFile.uploaded) é órfão
+REFERENCES = [
+    (Scene, 'file_path'),
+    (Scene, 'background'),
+    (Project, 'final_video_path'),
+    (Video, 'file_path'),
+    (AvatarPhoto, 'file_path'),
+    (VideoGeneration, 'file_path'),
+    (Blob, 'path'),
+    (UploadSession, 'file_path')
+]
+
+class StorageJanitor:
+    """Limpeza periódica do storage: temporários vencidos, arquivos sem referência no banco e blobs órfãos"""
+
+    def __init__(self):
+        self.base_path = file_manager.base_path
+        settings = config_manager.get('storage.janitor', {})
+
+        self.enabled = settings.get('enabled', True)
+        self.interval = settings.get('interval', 3600)
+        # Arquivo sem referência só é apagado após este tempo: cobre gravações ainda não commitadas
+        self.grace_period = settings.get('grace_period', 86400)
+        self.temp_max_age = settings.get('temp_max_age', 86400)
+        self.batch_size = settings.get('batch_size', 500)
+        self.directories = settings.get('directories', ['videos', 'scenes', 'audio', 'avatars'])
+        # Caches com despejo próprio ou regeneráveis
+        self.excluded = settings.get('excluded', ['audio/cache', 'scenes/segments'])
+        # Reserva no banco: vários processos com a limpeza ligada não varrem ao mesmo tempo
+        self.lease_timeout = settings.get('lease_timeout', 7200)
+        self.lease_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.last_report = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, app) -> bool:
+        """Iniciar a limpeza periódica em uma thread do processo"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return False
+
+        def loop():
+            # Primeira rodada após um intervalo, para não competir com a subida da aplicação
+            while not self._stop.wait(self.interval):
+                with app.app_context():
+                    try:
+                        self.run()
+                    except Exception:
+                        logger.exception("Erro na limpeza do storage")
+                        db.session.rollback()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='storage-janitor', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Interromper a limpeza periódica"""
+        self._stop.set()
+
+    def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Executar uma rodada completa e retornar o relatório"""
+        if not self._lock.acquire(blocking=False):
+            return {
+                'success': False,
+                'error': 'Limpeza já em execução'
+            }
+
+        if not self._acquire_lease():
+            self._lock.release()
+            return {
+                'success': False,
+                'error': 'Limpeza já em execução em outro processo'
+            }
+
+        try:
+            started = time.time()
+            report = {
+                'success': True,
+                'dry_run': dry_run,
+                'upload_sessions_expired': 0 if dry_run else resumable_uploads.expire_sessions(limit=self.batch_size),
+                'temp': self.sweep_temp(dry_run=dry_run),
+                'orphans': self.sweep_orphans(dry_run=dry_run),
+                'blobs': None
+            }
+            if not dry_run:
+                report['blobs'] = self.collect_blobs()
+
+            report['freed_bytes'] = (
+                report['temp']['freed_bytes']
+                + report['orphans']['freed_bytes']
+                + ((report['blobs'] or {}).get('freed_bytes') or 0)
+            )
+            report['duration'] = round(time.time() - started, 3)
+            self.last_report = report
+
+            logger.info(
+                "Limpeza do storage%s: %d temporários, %d órfãos, %s liberados em %.1fs",
+                ' (simulação)' if dry_run else '',
+                report['temp']['deleted'], report['orphans']['deleted'],
+                file_manager.format_size(report['freed_bytes']), report['duration']
+            )
+            return report
+
+        except Exception as e:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+        finally:
+            self._release_lease()
+            self._lock.release()
+
+    def _acquire_lease(self) -> bool:
+        """Reservar a limpeza no banco; só um processo consegue enquanto a reserva vigorar"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_timeout)
+
+        db.session.add(MaintenanceLease(name='storage_janitor', owner=self.lease_owner, expires_at=expires_at))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+
+        # Reserva vencida: o processo que a fez caiu no meio da rodada
+        taken = MaintenanceLease.query.filter(
+            MaintenanceLease.name == 'storage_janitor',
+            MaintenanceLease.expires_at < now
+        ).update({'owner': self.lease_owner, 'expires_at': expires_at}, synchronize_session=False)
+        db.session.commit()
+        return taken == 1
+
+    def _release_lease(self):
+        """Liberar a reserva deste processo"""
+        try:
+            db.session.rollback()
+            MaintenanceLease.query.filter_by(
+                name='storage_janitor', owner=self.lease_owner
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Falha ao liberar a reserva da limpeza: %s", e)
+
+    def collect_blobs(self) -> Dict[str, Any]:
+        """Coletar blobs sem referências, lote a lote"""
+        result = {'deleted': 0, 'freed_bytes': 0}
+        while True:
+            batch = blob_store.collect(self.batch_size)
+            if not batch['success']:
+                result['error'] = batch['error']
+                return result
+            result['deleted'] += batch['deleted']
+            result['freed_bytes'] += batch['freed_bytes']
+            if not batch['has_more']:
+                return result
+
+    def sweep_temp(self, max_age: int = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Apagar temporários sem modificação há mais de max_age segundos"""
+        cutoff = time.time() - (self.temp_max_age if max_age is None else max_age)
+        result = self._new_result()
+
+        for path, size, mtime in self._scan(f"{self.base_path}/temp"):
+            result['scanned'] += 1
+            if mtime >= cutoff:
+                continue
+            self._remove(path, size, result, dry_run)
+        # Gravar a baixa dos removidos no registro de uso
+        db.session.commit()
+        return result
+
+    def sweep_orphans(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Apagar arquivos sem referência no banco, conferidos em lotes"""
+        cutoff = time.time() - self.grace_period
+        result = self._new_result()
+        result['orphaned'] = 0
+
+        for directory in self.directories:
+            batch: List[Tuple[str, int]] = []
+            for path, size, mtime in self._scan(f"{self.base_path}/{directory}"):
+                result['scanned'] += 1
+                if mtime < cutoff:
+                    batch.append((path, size))
+                if len(batch) >= self.batch_size:
+                    self._sweep_batch(batch, result, dry_run)
+                    batch = []
+            if batch:
+                self._sweep_batch(batch, result, dry_run)
+        return result
+
+    def _sweep_batch(self, batch: List[Tuple[str, int]], result: Dict[str, Any], dry_run: bool):
+        referenced = self._referenced([path for path, _ in batch])
+        for path, size in batch:
+            if path in referenced:
+                continue
+            result['orphaned'] += 1
+            self._remove(path, size, result, dry_run)
+        # Encerrar a transação de leitura a cada lote
+        db.session.commit()
+
+    def _referenced(self, paths: List[str]) -> Set[str]:
+        """Caminhos do lote citados em alguma coluna de referência, em qualquer forma gravada"""
+        variants = {}
+        for path in paths:
+            for variant in (path, os.path.normpath(path), os.path.abspath(path), file_manager.get_url(path)):
+                if variant:
+                    variants[variant] = path
+
+        referenced = set()
+        for model, column in REFERENCES:
+            attribute = getattr(model, column)
+            rows = db.session.query(attribute).filter(attribute.in_(list(variants))).distinct()
+            referenced.update(variants[value] for value, in rows)
+
+        # Envios do usuário só constam no registro de uso
+        rows = db.session.query(StoredFile.path).filter(
+            StoredFile.path.in_(list(variants)),
+            StoredFile.uploaded.is_(True)
+        )
+        referenced.update(variants[value] for value, in rows)
+        return referenced
+
+    def _scan(self, root: str) -> Iterator[Tuple[str, int, float]]:
+        """Percorrer arquivos com os.scandir, sem listar diretórios inteiros em memória"""
+        excluded = {os.path.normpath(f"{self.base_path}/{path}") for path in self.excluded}
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            if os.path.normpath(directory) in excluded:
+                continue
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        # Arquivos ocultos (.gitkeep) mantêm a estrutura de diretórios
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                stat = entry.stat(follow_symlinks=False)
+                                yield entry.path, stat.st_size, stat.st_mtime
+                        except OSError as e:
+                            logger.warning("Falha ao inspecionar %s: %s", entry.path, e)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning("Falha ao percorrer %s: %s", directory, e)
+
+    def _remove(self, path: str, size: int, result: Dict[str, Any], dry_run: bool):
+        if not dry_run and not file_manager.delete_file(path):
+            if os.path.exists(path):
+                result['errors'].append(path)
+                logger.warning("Falha ao remover %s", path)
+            return
+        result['deleted'] += 1
+        result['freed_bytes'] += size
+
+    def _new_result(self) -> Dict[str, Any]:
+        return {'scanned': 0, 'deleted': 0, 'freed_bytes': 0, 'errors': []}
+
+# Instância global
+storage_janitor = StorageJanitor()
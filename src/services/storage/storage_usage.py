@@ -0,0 +1,286 @@
+import os
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from flask import has_app_context
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from src.database.config import db
+from src.models.storage import StoredFile, StorageUsage
+from src.utils.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+class StorageUsageIndex:
+    """Uso de armazenamento por usuário, projeto e categoria, mantido a cada gravação e remoção"""
+
+    ALL = 'all'
+    # Diretórios de trabalho que não contam como uso
+    UNTRACKED = {'temp'}
+
+    def __init__(self):
+        self.base_path = config_manager.get('storage.local_path', 'src/static/assets')
+        # Limite por usuário em bytes; 0 desativa
+        self.user_quota = config_manager.get('storage.user_quota', 0)
+
+    def normalize(self, path: str) -> str:
+        """Caminho na forma gravada no índice"""
+        return os.path.normpath(path)
+
+    def category_of(self, path: str) -> Optional[str]:
+        """Categoria do arquivo: diretório de primeiro nível dentro de assets"""
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(self.base_path))
+        if relative.startswith('..'):
+            return None
+        parts = relative.split(os.sep)
+        category = parts[0] if len(parts) > 1 else 'root'
+        return None if category in self.UNTRACKED else category
+
+    def owner_of(self, path: str) -> Dict[str, Optional[int]]:
+        """Dono registrado de um arquivo"""
+        if not has_app_context():
+            return {'user_id': None, 'project_id': None}
+        row = db.session.query(StoredFile.user_id, StoredFile.project_id).filter_by(
+            path=self.normalize(path)
+        ).first()
+        return {
+            'user_id': row.user_id if row else None,
+            'project_id': row.project_id if row else None
+        }
+
+    def record_file(self, path: str, user_id: int = None, project_id: int = None,
+                    category: str = None, size: int = None, uploaded: bool = False) -> bool:
+        """Registrar arquivo gravado e somar seu tamanho aos totais, na transação atual; quem chama faz o commit
+
+        size é obrigatório para arquivos que existem só no storage remoto (uploads diretos).
+        uploaded marca envios do usuário, que a limpeza de órfãos preserva.
+        """
+        category = category or self.category_of(path)
+        if not category or not has_app_context():
+            return False
+
+        path = self.normalize(path)
+        try:
+            # Savepoint: uma falha aqui não desfaz as alterações pendentes de quem chamou
+            with db.session.begin_nested():
+                size = os.path.getsize(path) if size is None else size
+                row = StoredFile.query.filter_by(path=path).first()
+
+                if row:
+                    # Arquivo sobrescrito: ajustar apenas a diferença
+                    delta = size - row.size
+                    row.size = size
+                    row.uploaded = row.uploaded or uploaded
+                    self._apply(row.category, row.user_id, row.project_id, delta, 0)
+                else:
+                    db.session.add(StoredFile(
+                        path=path,
+                        size=size,
+                        category=category,
+                        user_id=user_id,
+                        project_id=project_id,
+                        uploaded=uploaded
+                    ))
+                    self._apply(category, user_id, project_id, size, 1)
+
+            # Sem commit: o registro entra na transação de quem gravou o arquivo
+            return True
+
+        except Exception as e:
+            # A reconciliação corrige o que ficar para trás
+            logger.warning("Falha ao registrar uso de %s: %s", path, e)
+            return False
+
+    def forget_file(self, path: str) -> bool:
+        """Descontar arquivo removido dos totais, na transação atual; quem chama faz o commit"""
+        if not has_app_context():
+            return False
+
+        try:
+            with db.session.begin_nested():
+                row = StoredFile.query.filter_by(path=self.normalize(path)).first()
+                if not row:
+                    return False
+
+                self._apply(row.category, row.user_id, row.project_id, -row.size, -1)
+                db.session.delete(row)
+
+            return True
+
+        except Exception as e:
+            logger.warning("Falha ao descontar uso de %s: %s", path, e)
+            return False
+
+    def get_usage(self, scope: str = 'total', scope_id: int = 0) -> Dict[str, Any]:
+        """Uso de um escopo por categoria"""
+        rows = StorageUsage.query.filter_by(scope=scope, scope_id=scope_id or 0).all()
+        categories = {
+            row.category: {'bytes': row.bytes, 'files': row.files}
+            for row in rows if row.category != self.ALL
+        }
+        total = next((row for row in rows if row.category == self.ALL), None)
+        return {
+            'scope': scope,
+            'scope_id': scope_id or 0,
+            'bytes': total.bytes if total else 0,
+            'files': total.files if total else 0,
+            'categories': categories
+        }
+
+    def check_quota(self, user_id: Optional[int], incoming_bytes: int = 0) -> Dict[str, Any]:
+        """Verificar se o usuário comporta mais bytes, lendo uma única linha de totais"""
+        if not user_id or not self.user_quota:
+            return {'allowed': True, 'used': None, 'quota': None}
+
+        row = StorageUsage.query.filter_by(scope='user', scope_id=user_id, category=self.ALL).first()
+        used = row.bytes if row else 0
+        return {
+            'allowed': used + incoming_bytes <= self.user_quota,
+            'used': used,
+            'quota': self.user_quota
+        }
+
+    def reconcile(self, dry_run: bool = False, batch_size: int = 1000) -> Dict[str, Any]:
+        """Comparar índice com o disco e recalcular os totais, corrigindo divergências"""
+        try:
+            on_disk = {}
+            for root, directories, files in os.walk(self.base_path):
+                for name in files:
+                    path = self.normalize(os.path.join(root, name))
+                    if self.category_of(path):
+                        try:
+                            on_disk[path] = os.path.getsize(path)
+                        except OSError:
+                            pass
+
+            # Import local: file_manager depende deste módulo
+            from src.services.storage.file_manager import file_manager
+            backend = file_manager.backend
+
+            missing_ids, resized = [], {}
+            rows = db.session.query(StoredFile.id, StoredFile.path, StoredFile.size).yield_per(batch_size)
+            for row_id, path, indexed_size in rows:
+                size = on_disk.pop(path, None)
+                if size is None:
+                    # Uploads diretos existem só no storage remoto
+                    key = file_manager.storage_key(path) if backend.remote else None
+                    if key and backend.exists(key):
+                        continue
+                    missing_ids.append(row_id)
+                elif size != indexed_size:
+                    resized[row_id] = size
+
+            # Aplicar as correções também no modo de simulação, para medir a divergência; o rollback as desfaz
+            for start in range(0, len(missing_ids), batch_size):
+                StoredFile.query.filter(
+                    StoredFile.id.in_(missing_ids[start:start + batch_size])
+                ).delete(synchronize_session=False)
+            for row_id, size in resized.items():
+                StoredFile.query.filter_by(id=row_id).update({'size': size}, synchronize_session=False)
+
+            # Arquivos gravados fora do FileManager ficam sem dono
+            for path, size in on_disk.items():
+                db.session.add(StoredFile(path=path, size=size, category=self.category_of(path)))
+            db.session.flush()
+
+            before = self._snapshot()
+            after = self._computed_totals()
+            drift = [
+                {'key': ':'.join(str(part) for part in key), 'indexed': before.get(key, (0, 0)), 'actual': value}
+                for key, value in after.items() if before.get(key) != value
+            ] + [
+                {'key': ':'.join(str(part) for part in key), 'indexed': value, 'actual': (0, 0)}
+                for key, value in before.items() if key not in after and value != (0, 0)
+            ]
+
+            if dry_run:
+                db.session.rollback()
+            else:
+                StorageUsage.query.delete(synchronize_session=False)
+                for (scope, scope_id, category), (total_bytes, files) in after.items():
+                    db.session.add(StorageUsage(
+                        scope=scope, scope_id=scope_id, category=category, bytes=total_bytes, files=files
+                    ))
+                db.session.commit()
+
+            return {
+                'success': True,
+                'dry_run': dry_run,
+                'missing_files': len(missing_ids),
+                'resized_files': len(resized),
+                'untracked_files': len(on_disk),
+                'drift': drift
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _apply(self, category: str, user_id: Optional[int], project_id: Optional[int],
+               bytes_delta: int, files_delta: int):
+        """Somar deltas às linhas de totais afetadas, na transação atual"""
+        if not bytes_delta and not files_delta:
+            return
+
+        scopes = [('total', 0), ('user', user_id), ('project', project_id)]
+        for scope, scope_id in scopes:
+            if scope_id is None:
+                continue
+            for key_category in (category, self.ALL):
+                self._increment(scope, scope_id, key_category, bytes_delta, files_delta)
+
+    def _increment(self, scope: str, scope_id: int, category: str, bytes_delta: int, files_delta: int):
+        values = {
+            'bytes': StorageUsage.bytes + bytes_delta,
+            'files': StorageUsage.files + files_delta
+        }
+        query = StorageUsage.query.filter_by(scope=scope, scope_id=scope_id, category=category)
+        if query.update(values, synchronize_session=False):
+            return
+
+        try:
+            with db.session.begin_nested():
+                db.session.add(StorageUsage(
+                    scope=scope, scope_id=scope_id, category=category, bytes=bytes_delta, files=files_delta
+                ))
+        except IntegrityError:
+            # Outro worker criou a linha ao mesmo tempo
+            query.update(values, synchronize_session=False)
+
+    def _snapshot(self) -> Dict[Tuple[str, int, str], Tuple[int, int]]:
+        return {
+            (row.scope, row.scope_id, row.category): (row.bytes, row.files)
+            for row in StorageUsage.query.all()
+        }
+
+    def _computed_totals(self) -> Dict[Tuple[str, int, str], Tuple[int, int]]:
+        """Totais recalculados a partir do índice de arquivos"""
+        totals = {}
+
+        def add(key, total_bytes, files):
+            current = totals.get(key, (0, 0))
+            totals[key] = (current[0] + int(total_bytes or 0), current[1] + files)
+
+        groups: List[Tuple[str, Any]] = [
+            ('total', None),
+            ('user', StoredFile.user_id),
+            ('project', StoredFile.project_id)
+        ]
+        for scope, column in groups:
+            columns = [StoredFile.category, func.sum(StoredFile.size), func.count(StoredFile.id)]
+            query = db.session.query(*(columns + ([column] if column is not None else [])))
+            if column is not None:
+                query = query.filter(column.isnot(None)).group_by(StoredFile.category, column)
+            else:
+                query = query.group_by(StoredFile.category)
+
+            for row in query.all():
+                scope_id = row[3] if column is not None else 0
+                add((scope, scope_id, row[0]), row[1], row[2])
+                add((scope, scope_id, self.ALL), row[1], row[2])
+        return totals
+
+# Instância global
+storage_usage = StorageUsageIndex()
@@ -1,11 +1,22 @@
 import os
+import base64
 import requests
 import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, case, func
+from sqlalchemy.orm import selectinload
 from typing import Dict, Any, List, Optional
 from src.utils.config_manager import config_manager
 from src.services.storage.file_manager import file_manager
 from src.models.avatar import Avatar, AvatarPhoto
 from src.database.config import db
+from src.services.video.catalog_cache import catalog_cache
+from src.services.storage.photo_index import photo_index
+from src.services.storage.image_derivatives import image_derivatives
+from src.services.storage.blob_store import blob_store
+from src.services.workflow.job_runner import job_runner
+from src.services.workflow.pipeline import Pipeline
 
 class AvatarProcessor:
     """Processador de avatares com integração HeyGen"""
@@ -14,6 +25,12 @@ class AvatarProcessor:
         self.heygen_api_key = config_manager.get_api_key('video', 'heygen')
         self.heygen_base_url = "https://api.heygen.com/v1"
         self.quality = config_manager.get('video.heygen.avatar_quality', 'high')
+        self.max_retries = 3
+        self.max_page_size = 100
+        self.photo_size = config_manager.get('video.heygen.photo_size', 1024)
+        self.min_face_ratio = config_manager.get('video.heygen.min_face_ratio', 0.1)
+        # Processamento além deste tempo é considerado interrompido
+        self.processing_timeout = 1800
     
     def is_configured(self) -> bool:
         """Verificar se HeyGen está configurado"""
@@ -23,8 +40,10 @@ class AvatarProcessor:
         """Verificar se HeyGen está habilitado"""
         return config_manager.is_service_enabled('video', 'heygen')
     
-    def create_avatar_from_photos(self, photos: List, name: str, description: str = "") -> Dict[str, Any]:
-        """Criar avatar a partir de fotos"""
+    def create_avatar_from_photos(self, photos: List, name: str, description: str = "",
+                                  user_id: int = None, duplicates: str = 'keep') -> Dict[str, Any]:
+        """Criar avatar a partir de fotos; duplicates: keep, skip ou link para fotos quase idênticas"""
+        avatar_id = None
         try:
             if not self.is_configured() or not self.is_enabled():
                 return {
@@ -32,21 +51,46 @@ class AvatarProcessor:
                     'error': 'HeyGen não está configurado ou habilitado'
                 }
             
-            # Criar avatar no banco
+            if duplicates not in ('keep', 'skip', 'link'):
+                return {
+                    'success': False,
+                    'error': f'Modo de duplicatas inválido: {duplicates}'
+                }
+            
+            # Detectar quase duplicatas no lote e entre as fotos já enviadas pelo usuário
+            plan = photo_index.classify_batch([photo_index.hash_upload(photo) for photo in photos], user_id)
+            duplicate_report = self._duplicate_report(photos, plan, duplicates)
+            
+            to_save = [
+                photo for photo, entry in zip(photos, plan)
+                if duplicates == 'keep' or (entry['duplicate_of'] is None and entry['batch_duplicate_of'] is None)
+            ]
+            if not to_save and duplicates == 'skip':
+                return {
+                    'success': False,
+                    'error': 'Todas as fotos já foram enviadas anteriormente',
+                    'duplicates': duplicate_report
+                }
+            
+            # Criar avatar no banco; com o início marcado, check_stalled recupera uma criação interrompida
             avatar = Avatar(
                 name=name,
                 description=description,
+                user_id=user_id,
                 quality=self.quality,
-                status='processing'
+                status='processing',
+                processing_started_at=datetime.utcnow()
             )
             db.session.add(avatar)
             db.session.commit()
+            avatar_id = avatar.id
             
             # Salvar fotos
-            photo_results = file_manager.save_avatar_photos(photos, str(avatar.id))
+            photo_results = file_manager.save_avatar_photos(to_save, str(avatar.id), user_id=user_id)
             
             if not photo_results['success']:
                 avatar.status = 'failed'
+                avatar.status_message = 'Erro ao salvar fotos'
                 db.session.commit()
                 return {
                     'success': False,
@@ -54,86 +98,271 @@ class AvatarProcessor:
                     'details': photo_results['errors']
                 }
             
-            # Salvar referências das fotos no banco
-            for photo_result in photo_results['files']:
-                avatar_photo = AvatarPhoto(
-                    avatar_id=avatar.id,
-                    filename=photo_result['filename'],
-                    file_path=photo_result['file_path'],
-                    file_size=photo_result['size'],
-                    mime_type=photo_result['mime_type'],
-                    is_valid=True
-                )
-                db.session.add(avatar_photo)
+            # Salvar referências das fotos no banco; a validação roda no processamento
+            saved = iter(photo_results['files'])
+            rows = []
+            for entry in plan:
+                row = None
+                if entry['duplicate_of'] is not None and duplicates != 'keep':
+                    if duplicates == 'link':
+                        row = self._link_photo(avatar.id, entry['duplicate_of'])
+                elif entry['batch_duplicate_of'] is not None and duplicates != 'keep':
+                    original = rows[entry['batch_duplicate_of']]
+                    if duplicates == 'link' and original is not None:
+                        row = self._link_photo(avatar.id, original)
+                else:
+                    photo_result = next(saved)
+                    row = AvatarPhoto(
+                        avatar_id=avatar.id,
+                        filename=photo_result['filename'],
+                        file_path=blob_store.put(photo_result['file_path'], move=True),
+                        file_size=photo_result['size'],
+                        mime_type=photo_result['mime_type'],
+                        is_valid=False
+                    )
+                
+                if row is not None:
+                    for field, value in photo_index.index_fields(entry['phash']).items():
+                        setattr(row, field, value)
+                    db.session.add(row)
+                rows.append(row)
             
             db.session.commit()
             
-            # Processar com HeyGen em background
-            self._process_with_heygen(avatar.id, photo_results['files'])
+            # Processar fotos e HeyGen em background
+            self._schedule_processing(avatar)
             
             return {
                 'success': True,
                 'avatar_id': avatar.id,
+                'status': avatar.status,
+                'duplicates': duplicate_report,
                 'message': 'Avatar criado com sucesso. Processamento em andamento.'
             }
             
         except Exception as e:
             db.session.rollback()
+            if avatar_id:
+                self._mark_failed(avatar_id, f'Erro ao criar avatar: {e}')
             return {
                 'success': False,
                 'error': str(e)
             }
     
-    def _process_with_heygen(self, avatar_id: int, photo_files: List[Dict[str, Any]]):
-        """Processar avatar com HeyGen"""
+    def _mark_failed(self, avatar_id: int, message: str):
+        """Marcar como falho um avatar cuja criação não chegou ao processamento"""
+        try:
+            Avatar.query.filter_by(id=avatar_id, status='processing').update(
+                {'status': 'failed', 'status_message': message},
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+    
+    def _link_photo(self, avatar_id: int, source: AvatarPhoto) -> AvatarPhoto:
+        """Nova foto apontando para o arquivo de uma foto existente, sem armazená-lo de novo"""
+        return AvatarPhoto(
+            avatar_id=avatar_id,
+            filename=source.filename,
+            file_path=source.file_path,
+            file_size=source.file_size,
+            mime_type=source.mime_type,
+            is_valid=source.is_valid,
+            validation_message=source.validation_message
+        )
+    
+    def _duplicate_report(self, photos: List, plan: List[Dict[str, Any]], duplicates: str) -> List[Dict[str, Any]]:
+        """Descrever as duplicatas encontradas e o que foi feito com cada uma"""
+        report = []
+        for photo, entry in zip(photos, plan):
+            if entry['duplicate_of'] is not None:
+                report.append({
+                    'filename': photo.filename,
+                    'duplicate_of_photo': entry['duplicate_of'].id,
+                    'distance': entry['distance'],
+                    'action': duplicates
+                })
+            elif entry['batch_duplicate_of'] is not None:
+                report.append({
+                    'filename': photo.filename,
+                    'duplicate_of_upload': photos[entry['batch_duplicate_of']].filename,
+                    'distance': entry['distance'],
+                    'action': duplicates
+                })
+        return report
+    
+    def retry_avatar(self, avatar_id: int) -> Dict[str, Any]:
+        """Reprocessar avatar que falhou"""
         try:
             avatar = Avatar.query.get(avatar_id)
             if not avatar:
-                return
+                return {
+                    'success': False,
+                    'error': 'Avatar não encontrado'
+                }
             
-            # Preparar dados para HeyGen
-            photo_urls = []
-            for photo_file in photo_files:
-                # Em produção, você faria upload para um CDN
-                # Por enquanto, usamos caminhos locais
-                photo_urls.append(photo_file['file_path'])
+            self.check_stalled(avatar)
+            if avatar.status != 'failed':
+                return {
+                    'success': False,
+                    'error': f'Avatar não pode ser reprocessado no status {avatar.status}'
+                }
             
-            # Chamada para API HeyGen
-            headers = {
-                'X-Api-Key': self.heygen_api_key,
-                'Content-Type': 'application/json'
-            }
+            self._schedule_processing(avatar)
             
-            payload = {
-                'name': avatar.name,
-                'description': avatar.description or '',
-                'photo_urls': photo_urls,
-                'quality': self.quality
+            return {
+                'success': True,
+                'avatar_id': avatar.id,
+                'status': avatar.status,
+                'message': 'Reprocessamento iniciado'
             }
             
-            response = requests.post(
-                f"{self.heygen_base_url}/avatar/create",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                avatar.heygen_id = data.get('avatar_id')
-                avatar.status = 'completed'
-            else:
-                avatar.status = 'failed'
-                print(f"Erro HeyGen: {response.text}")
-            
-            db.session.commit()
-            
         except Exception as e:
-            print(f"Erro ao processar avatar com HeyGen: {e}")
-            avatar = Avatar.query.get(avatar_id)
-            if avatar:
-                avatar.status = 'failed'
-                db.session.commit()
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def check_stalled(self, avatar: Avatar) -> bool:
+        """Marcar como falho um processamento que excedeu o tempo limite (ex.: worker reiniciado)"""
+        if avatar.status != 'processing' or not avatar.processing_started_at:
+            return False
+        if datetime.utcnow() - avatar.processing_started_at < timedelta(seconds=self.processing_timeout):
+            return False
+        
+        avatar.status = 'failed'
+        avatar.status_message = 'Tempo limite de processamento excedido'
+        db.session.commit()
+        return True
+    
+    def _schedule_processing(self, avatar: Avatar):
+        """Marcar avatar em processamento e agendar o pipeline"""
+        avatar.status = 'processing'
+        avatar.status_message = 'Aguardando processamento'
+        avatar.attempts = (avatar.attempts or 0) + 1
+        avatar.processing_started_at = datetime.utcnow()
+        avatar.completed_at = None
+        db.session.commit()
+        
+        job_runner.submit(self._run_processing, avatar.id)
+    
+    def _run_processing(self, avatar_id: int):
+        """Pipeline do avatar: validar fotos e criar no HeyGen com novas tentativas"""
+        pipeline = Pipeline(f'avatar_{avatar_id}', app=current_app._get_current_object(), max_workers=1)
+        pipeline.add_node('photos', lambda inputs: self._process_photos(avatar_id))
+        pipeline.add_node(
+            'heygen',
+            lambda inputs: self._create_on_heygen(avatar_id, inputs['photos']),
+            deps=['photos'],
+            max_retries=self.max_retries
+        )
+        
+        result = pipeline.run()
+        
+        avatar = Avatar.query.get(avatar_id)
+        if not avatar:
+            return
+        
+        if result['status'] == 'completed':
+            avatar.heygen_id = pipeline.nodes['heygen'].output
+            avatar.status = 'completed'
+            avatar.status_message = None
+            avatar.completed_at = datetime.utcnow()
+            catalog_cache.invalidate(self._catalog_key())
+        else:
+            failed = next(node for node in pipeline.nodes.values() if node.status == 'failed')
+            avatar.status = 'failed'
+            avatar.status_message = failed.error
+            print(f"Erro ao processar avatar {avatar_id} ({failed.name}): {failed.error}")
+        
+        db.session.commit()
+    
+    def _update_progress(self, avatar_id: int, message: str):
+        avatar = Avatar.query.get(avatar_id)
+        if avatar:
+            avatar.status_message = message
+            db.session.commit()
+    
+    def _process_photos(self, avatar_id: int) -> List[str]:
+        """Pré-processar fotos do avatar; retorna os caminhos das válidas"""
+        self._update_progress(avatar_id, 'Processando fotos')
+        
+        avatar = Avatar.query.get(avatar_id)
+        if not avatar:
+            raise RuntimeError('Avatar não encontrado')
+        
+        photos = list(avatar.photos)
+        # Fotos já processadas (tentativa anterior ou vinculadas a uma foto pronta) não são refeitas
+        pending = [photo for photo in photos if not photo.is_valid]
+        results = file_manager.preprocess_avatar_photos(
+            [photo.file_path for photo in pending],
+            target_size=self.photo_size,
+            min_face_ratio=self.min_face_ratio
+        )
+        
+        for photo, result in zip(pending, results):
+            photo.is_valid = result['valid']
+            photo.validation_message = result['message']
+            if not result['valid']:
+                continue
+            
+            # Enviar a versão recortada e reduzida no lugar do original
+            original_path = photo.file_path
+            photo.file_path = blob_store.put(result['output_path'], move=True, user_id=avatar.user_id)
+            photo.file_size = result['size']
+            photo.mime_type = 'image/jpeg'
+            if original_path != photo.file_path and not photo_index.is_shared(original_path):
+                blob_store.discard(original_path)
+        
+        db.session.commit()
+        
+        valid_paths = list(dict.fromkeys(photo.file_path for photo in photos if photo.is_valid))
+        
+        if not valid_paths:
+            raise RuntimeError('Nenhuma foto válida: ' + '; '.join(
+                sorted({photo.validation_message for photo in photos if photo.validation_message})
+            ))
+        return valid_paths
+    
+    def _create_on_heygen(self, avatar_id: int, photo_paths: List[str]) -> str:
+        """Criar avatar no HeyGen; retorna o ID do avatar criado"""
+        self._update_progress(avatar_id, 'Criando avatar no HeyGen')
+        
+        avatar = Avatar.query.get(avatar_id)
+        if not avatar:
+            raise RuntimeError('Avatar não encontrado')
+        
+        # Chamada para API HeyGen
+        headers = {
+            'X-Api-Key': self.heygen_api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        # Em produção, você faria upload para um CDN
+        # Por enquanto, usamos caminhos locais
+        payload = {
+            'name': avatar.name,
+            'description': avatar.description or '',
+            'photo_urls': photo_paths,
+            'quality': self.quality
+        }
+        
+        response = requests.post(
+            f"{self.heygen_base_url}/avatar/create",
+            headers=headers,
+            json=payload,
+            timeout=30
+        )
+        
+        if response.status_code != 200:
+            raise RuntimeError(f'Erro HeyGen {response.status_code}: {response.text}')
+        
+        heygen_id = response.json().get('avatar_id')
+        if not heygen_id:
+            raise RuntimeError('Resposta do HeyGen sem avatar_id')
+        return heygen_id
     
     def get_avatar_status(self, avatar_id: int) -> Dict[str, Any]:
         """Obter status do avatar"""
@@ -145,6 +374,8 @@ class AvatarProcessor:
                     'error': 'Avatar não encontrado'
                 }
             
+            self.check_stalled(avatar)
+            
             return {
                 'success': True,
                 'avatar': avatar.to_dict(),
@@ -157,14 +388,48 @@ class AvatarProcessor:
                 'error': str(e)
             }
     
-    def list_avatars(self) -> Dict[str, Any]:
-        """Listar todos os avatares"""
+    def list_avatars(self, status: str = None, cursor: str = None, limit: int = 20,
+                     detail: bool = False) -> Dict[str, Any]:
+        """Listar avatares com paginação por cursor; resumos, ou fotos completas com detail"""
         try:
-            avatars = Avatar.query.order_by(Avatar.created_at.desc()).all()
+            limit = max(1, min(int(limit or 20), self.max_page_size))
+            query = Avatar.query
+            
+            if status:
+                query = query.filter(Avatar.status == status)
+            
+            # Paginação por chave: continua após o último (created_at, id) da página anterior
+            if cursor:
+                try:
+                    created_at, avatar_id = self._decode_cursor(cursor)
+                except ValueError:
+                    return {
+                        'success': False,
+                        'error': 'Cursor inválido',
+                        'invalid_request': True
+                    }
+                query = query.filter(or_(
+                    Avatar.created_at < created_at,
+                    and_(Avatar.created_at == created_at, Avatar.id < avatar_id)
+                ))
+            
+            if detail:
+                # Fotos de todos os avatares da página em uma única consulta
+                query = query.options(selectinload(Avatar.photos))
+            
+            avatars = query.order_by(Avatar.created_at.desc(), Avatar.id.desc()).limit(limit + 1).all()
+            has_more = len(avatars) > limit
+            avatars = avatars[:limit]
+            
+            if detail:
+                items = [avatar.to_dict() for avatar in avatars]
+            else:
+                items = self._summaries(avatars)
             
             return {
                 'success': True,
-                'avatars': [avatar.to_dict() for avatar in avatars]
+                'avatars': items,
+                'next_cursor': self._encode_cursor(avatars[-1]) if has_more else None
             }
             
         except Exception as e:
@@ -173,6 +438,94 @@ class AvatarProcessor:
                 'error': str(e)
             }
     
+    def _summaries(self, avatars: List[Avatar]) -> List[Dict[str, Any]]:
+        """Resumos com contagem de fotos e capa, em duas consultas agregadas para a página toda"""
+        avatar_ids = [avatar.id for avatar in avatars]
+        if not avatar_ids:
+            return []
+        
+        stats = db.session.query(
+            AvatarPhoto.avatar_id,
+            func.count(AvatarPhoto.id),
+            func.min(case((AvatarPhoto.is_valid.is_(True), AvatarPhoto.id))),
+            func.min(AvatarPhoto.id)
+        ).filter(AvatarPhoto.avatar_id.in_(avatar_ids)).group_by(AvatarPhoto.avatar_id).all()
+        
+        counts = {}
+        cover_ids = {}
+        for avatar_id, count, first_valid_id, first_id in stats:
+            counts[avatar_id] = count
+            # Capa: primeira foto válida ou, se nenhuma for, a primeira enviada
+            cover_ids[avatar_id] = first_valid_id or first_id
+        
+        covers = {}
+        if cover_ids:
+            photos = AvatarPhoto.query.filter(AvatarPhoto.id.in_(list(cover_ids.values()))).all()
+            # Miniatura versionada em vez da foto original na listagem
+            covers = {
+                photo.avatar_id: image_derivatives.url_for(photo.file_path) or file_manager.get_url(photo.file_path)
+                for photo in photos
+            }
+        
+        return [
+            avatar.to_summary(counts.get(avatar.id, 0), covers.get(avatar.id))
+            for avatar in avatars
+        ]
+    
+    def _encode_cursor(self, avatar: Avatar) -> str:
+        payload = json.dumps([avatar.created_at.isoformat(), avatar.id])
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+    
+    def _decode_cursor(self, cursor: str):
+        try:
+            created_at, avatar_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(created_at), int(avatar_id)
+        except Exception as e:
+            raise ValueError('Cursor inválido') from e
+    
+    def list_heygen_avatars(self) -> Dict[str, Any]:
+        """Listar avatares disponíveis na conta HeyGen"""
+        if not self.is_configured():
+            return {
+                'success': False,
+                'error': 'HeyGen não está configurado'
+            }
+        
+        try:
+            headers = {
+                'X-Api-Key': self.heygen_api_key,
+                'Content-Type': 'application/json'
+            }
+            
+            result = catalog_cache.get(
+                self._catalog_key(),
+                f"{self.heygen_base_url}/avatar/list",
+                headers,
+                extract=lambda data: (data.get('data') or {}).get('avatars', [])
+            )
+            
+            if result['success']:
+                return {
+                    'success': True,
+                    'avatars': result['data'],
+                    'cached': result['cached']
+                }
+            else:
+                return {
+                    'success': False,
+                    'error': result['error']
+                }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _catalog_key(self) -> str:
+        """Chave do catálogo de avatares desta conta"""
+        return catalog_cache.key('heygen', self.heygen_api_key, 'avatars')
+    
     def delete_avatar(self, avatar_id: int) -> Dict[str, Any]:
         """Deletar avatar"""
         try:
@@ -183,9 +536,11 @@ class AvatarProcessor:
                     'error': 'Avatar não encontrado'
                 }
             
-            # Deletar arquivos
+            # Arquivos avulsos que nenhuma outra foto usa; blobs seguem a contagem de referências
+            photo_ids = [photo.id for photo in avatar.photos]
             for photo in avatar.photos:
-                file_manager.delete_file(photo.file_path)
+                if not blob_store.is_blob(photo.file_path) and not photo_index.is_shared(photo.file_path, photo_ids):
+                    blob_store.discard(photo.file_path)
             
             # Deletar do HeyGen se existir
             if avatar.heygen_id and self.is_configured():
@@ -223,6 +578,8 @@ class AvatarProcessor:
             
             if response.status_code != 200:
                 print(f"Erro ao deletar avatar do HeyGen: {response.text}")
+            else:
+                catalog_cache.invalidate(self._catalog_key())
                 
         except Exception as e:
             print(f"Erro ao deletar avatar do HeyGen: {e}")
@@ -0,0 +1,175 @@
+import json
+import hashlib
+import logging
+import threading
+import requests
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from src.models.catalog import ProviderCatalog
+from src.database.config import db
+from src.utils.config_manager import config_manager
+from src.services.workflow.job_runner import job_runner
+
+logger = logging.getLogger(__name__)
+
+class CatalogCache:
+    """Cache de catálogos dos provedores com TTL, atualização em background e ETag
+
+    As escritas vão para savepoints na transação atual; quem chama faz o commit.
+    """
+
+    def __init__(self):
+        self.ttl = config_manager.get('app.catalog_ttl', 600)
+        # Tempo máximo de uma atualização antes de outro worker poder assumi-la
+        self.refresh_timeout = 60
+        # Após falha, servir o conteúdo antigo por mais este tempo antes de tentar de novo
+        self.retry_after = 60
+        self.timeout = 10
+
+        self._locks = [threading.Lock() for _ in range(16)]
+
+    def key(self, provider: str, api_key: str, *parts: str) -> str:
+        """Montar chave do catálogo, separando contas diferentes do mesmo provedor"""
+        account = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:12]
+        return ':'.join([provider, account] + [str(part) for part in parts])
+
+    def get(self, key: str, url: str, headers: Dict[str, str],
+            extract: Callable[[Any], Any] = None, ttl: int = None) -> Dict[str, Any]:
+        """Obter catálogo; conteúdo expirado é servido enquanto um worker o atualiza"""
+        entry = self._get_entry(key)
+        if entry and entry.payload is not None:
+            stale = not entry.expires_at or entry.expires_at <= datetime.utcnow()
+            if stale and self._claim_refresh(key):
+                job_runner.submit(self._refresh_job, key, url, headers, extract, ttl)
+
+            return {
+                'success': True,
+                'data': entry.get_payload(),
+                'cached': True,
+                'stale': stale
+            }
+
+        # Sem conteúdo: buscar agora, uma única vez por processo
+        with self._locks[int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16) % len(self._locks)]:
+            entry = self._get_entry(key)
+            if entry and entry.payload is not None:
+                return {
+                    'success': True,
+                    'data': entry.get_payload(),
+                    'cached': True,
+                    'stale': False
+                }
+            return self.refresh(key, url, headers, extract, ttl)
+
+    def refresh(self, key: str, url: str, headers: Dict[str, str],
+                extract: Callable[[Any], Any] = None, ttl: int = None) -> Dict[str, Any]:
+        """Buscar catálogo no provedor, revalidando com If-None-Match quando há ETag"""
+        entry = self._get_entry(key)
+        request_headers = dict(headers)
+        if entry and entry.etag and entry.payload is not None:
+            request_headers['If-None-Match'] = entry.etag
+
+        try:
+            response = requests.get(url, headers=request_headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            return self._refresh_failed(key, str(e))
+
+        if response.status_code == 304 and entry and entry.payload is not None:
+            data = entry.get_payload()
+            etag = entry.etag
+        elif response.status_code == 200:
+            data = response.json()
+            if extract:
+                data = extract(data)
+            etag = response.headers.get('ETag')
+        else:
+            return self._refresh_failed(key, f'Erro da API: {response.status_code}')
+
+        self._store(key, data, etag, ttl or self.ttl)
+        return {
+            'success': True,
+            'data': data,
+            'cached': False,
+            'stale': False
+        }
+
+    def invalidate(self, *keys: str):
+        """Descartar catálogos para que a próxima leitura busque no provedor"""
+        with db.session.begin_nested():
+            ProviderCatalog.query.filter(ProviderCatalog.key.in_(keys)).delete(synchronize_session='fetch')
+
+    def invalidate_prefix(self, prefix: str):
+        """Descartar todos os catálogos cuja chave começa com o prefixo"""
+        with db.session.begin_nested():
+            ProviderCatalog.query.filter(ProviderCatalog.key.startswith(prefix)).delete(synchronize_session='fetch')
+
+    def _refresh_job(self, key: str, url: str, headers: Dict[str, str],
+                     extract: Callable[[Any], Any] = None, ttl: int = None):
+        # Tarefa em background: a transação é dela
+        try:
+            self.refresh(key, url, headers, extract, ttl)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _get_entry(self, key: str) -> Optional[ProviderCatalog]:
+        # populate_existing: ler o estado atual, que outro worker pode ter alterado
+        return ProviderCatalog.query.filter_by(key=key).populate_existing().first()
+
+    def _claim_refresh(self, key: str) -> bool:
+        """Reservar a atualização; apenas um worker busca no provedor"""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.refresh_timeout)
+        with db.session.begin_nested():
+            claimed = ProviderCatalog.query.filter(
+                ProviderCatalog.key == key,
+                or_(ProviderCatalog.refreshing_since.is_(None), ProviderCatalog.refreshing_since < cutoff)
+            ).update({'refreshing_since': now}, synchronize_session=False)
+        return claimed == 1
+
+    def _store(self, key: str, data: Any, etag: Optional[str], ttl: int):
+        now = datetime.utcnow()
+        values = {
+            'payload': json.dumps(data),
+            'etag': etag,
+            'fetched_at': now,
+            'expires_at': now + timedelta(seconds=ttl),
+            'refreshing_since': None,
+            'error': None
+        }
+
+        try:
+            with db.session.begin_nested():
+                entry = self._get_entry(key)
+                if not entry:
+                    entry = ProviderCatalog(key=key, provider=key.split(':')[0])
+                    db.session.add(entry)
+                for field, value in values.items():
+                    setattr(entry, field, value)
+        except IntegrityError:
+            # Outro worker inseriu a mesma chave: atualizar a linha dele
+            with db.session.begin_nested():
+                entry = self._get_entry(key)
+                for field, value in values.items():
+                    setattr(entry, field, value)
+
+    def _refresh_failed(self, key: str, error: str) -> Dict[str, Any]:
+        logger.warning("Falha ao atualizar catálogo %s: %s", key, error)
+        with db.session.begin_nested():
+            entry = self._get_entry(key)
+            if entry:
+                entry.error = error
+                entry.refreshing_since = None
+                if entry.payload is not None:
+                    entry.expires_at = datetime.utcnow() + timedelta(seconds=self.retry_after)
+
+        return {
+            'success': False,
+            'error': error
+        }
+
+# Instância global
+catalog_cache = CatalogCache()
@@ -1,8 +1,19 @@
 import requests
 import json
 import os
+import time
+import base64
+import shutil
+import tempfile
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 from src.utils.config_manager import config_manager
+from src.services.storage.file_manager import file_manager
+from src.services.video.tts_cache import audio_cache
+from src.services.video.catalog_cache import catalog_cache
+from src.utils.audio_utils import split_sentences, join_mp3, split_mp3, mp3_duration, transcode_audio
+from src.utils.multipart import MultipartStream
 
 class ElevenLabsService:
     """Serviço para integração com ElevenLabs"""
@@ -12,6 +23,23 @@ class ElevenLabsService:
         self.base_url = "https://api.elevenlabs.io/v1"
         self.default_voice_id = config_manager.get('video.elevenlabs.voice_id', '')
         self.stability = config_manager.get('video.elevenlabs.stability', 0.5)
+        self.model_id = config_manager.get('video.elevenlabs.model_id', 'eleven_monolingual_v1')
+        self.streaming_latency = config_manager.get('video.elevenlabs.streaming_latency', 3)  # 0-4, maior = menor latência
+        self.stream_chunk_size = 4096
+        
+        # Síntese de roteiros longos em blocos paralelos
+        self.chunk_max_chars = config_manager.get('video.elevenlabs.chunk_max_chars', 800)
+        self.max_concurrent_requests = config_manager.get('video.elevenlabs.max_concurrent_requests', 3)
+        self.chunk_retries = 2
+        
+        # Amostras de clonagem acima do limite são convertidas antes do envio
+        self.clone_max_sample_size = config_manager.get('video.elevenlabs.clone_max_sample_size', 10 * 1024 * 1024)  # 10MB
+        self.clone_bitrate = '128k'
+        self.max_transcode_workers = os.cpu_count() or 2
+        
+        # Narração em lote de cenas consecutivas com a mesma voz
+        self.batch_max_chars = config_manager.get('video.elevenlabs.batch_max_chars', 4500)
+        self.batch_separator = '\n\n'
     
     def is_configured(self) -> bool:
         """Verificar se o serviço está configurado"""
@@ -21,8 +49,182 @@ class ElevenLabsService:
         """Verificar se o serviço está habilitado"""
         return config_manager.is_service_enabled('video', 'elevenlabs')
     
-    def text_to_speech(self, text: str, voice_id: str = None, output_path: str = None) -> Dict[str, Any]:
-        """Converter texto em áudio"""
+    def text_to_speech(self, text: str, voice_id: str = None, output_path: str = None,
+                       model_id: str = None, voice_settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Converter texto em áudio, servindo do cache quando o mesmo áudio já foi gerado"""
+        if not self.is_configured() or not self.is_enabled():
+            return {
+                'success': False,
+                'error': 'ElevenLabs não está configurado ou habilitado'
+            }
+        
+        try:
+            voice_id = voice_id or self.default_voice_id
+            if not voice_id:
+                return {
+                    'success': False,
+                    'error': 'Voice ID não configurado'
+                }
+            
+            model_id = model_id or self.model_id
+            voice_settings = voice_settings or self.default_voice_settings()
+            
+            for attempt in range(2):
+                result = self._synthesize(text, voice_id, model_id, voice_settings)
+                if not result['success']:
+                    return result
+                
+                try:
+                    return self._deliver_audio(result['audio_path'], output_path, text, cached=result['cached'])
+                except FileNotFoundError:
+                    # Despejado do cache por outro worker após get(): na segunda volta é um miss
+                    continue
+            
+            return {
+                'success': False,
+                'error': 'Áudio removido do cache antes da entrega'
+            }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def synthesize_long_text(self, text: str, voice_id: str = None, output_path: str = None,
+                             model_id: str = None, voice_settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Sintetizar roteiros longos em blocos de frases paralelos, unidos em uma única faixa"""
+        if not self.is_configured() or not self.is_enabled():
+            return {
+                'success': False,
+                'error': 'ElevenLabs não está configurado ou habilitado'
+            }
+        
+        try:
+            voice_id = voice_id or self.default_voice_id
+            if not voice_id:
+                return {
+                    'success': False,
+                    'error': 'Voice ID não configurado'
+                }
+            
+            model_id = model_id or self.model_id
+            voice_settings = voice_settings or self.default_voice_settings()
+            
+            chunks = split_sentences(text, self.chunk_max_chars)
+            if len(chunks) <= 1:
+                return self.text_to_speech(text, voice_id, output_path, model_id, voice_settings)
+            
+            # Faixa completa já sintetizada
+            track_key = audio_cache.cache_key(text, voice_id, model_id, dict(voice_settings, chunked=True))
+            cached_path = audio_cache.get(track_key)
+            if cached_path:
+                try:
+                    result = self._deliver_audio(cached_path, output_path, text, cached=True)
+                    result['chunks'] = {'total': len(chunks), 'synthesized': 0, 'reused': len(chunks)}
+                    return result
+                except FileNotFoundError:
+                    # Despejado do cache após get(): seguir como miss
+                    pass
+            
+            # Blocos inalterados vêm do cache; só os editados vão ao provedor
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrent_requests, len(chunks))) as executor:
+                results = list(executor.map(
+                    lambda chunk: self._synthesize_chunk(chunk, voice_id, model_id, voice_settings),
+                    chunks
+                ))
+            
+            failed = [index for index, result in enumerate(results) if not result['success']]
+            if failed:
+                return {
+                    'success': False,
+                    'error': f'{len(failed)} de {len(chunks)} blocos falharam',
+                    'details': [results[index]['error'] for index in failed]
+                }
+            
+            parts = []
+            for result in results:
+                with open(result['audio_path'], 'rb') as f:
+                    parts.append(f.read())
+            
+            cached_path = audio_cache.put(track_key, join_mp3(parts))
+            result = self._deliver_audio(cached_path, output_path, text, cached=False)
+            result['chunks'] = {
+                'total': len(chunks),
+                'synthesized': sum(1 for r in results if not r['cached']),
+                'reused': sum(1 for r in results if r['cached'])
+            }
+            return result
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _synthesize_chunk(self, text: str, voice_id: str, model_id: str,
+                          voice_settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Sintetizar um bloco, repetindo apenas ele em caso de falha transitória"""
+        result = {'success': False, 'error': 'Bloco não sintetizado'}
+        for attempt in range(self.chunk_retries + 1):
+            try:
+                result = self._synthesize(text, voice_id, model_id, voice_settings)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            
+            if result['success'] or result.get('status_code') in (400, 401, 403, 422):
+                return result
+            time.sleep(min(2 ** attempt, 8))
+        return result
+    
+    def _synthesize(self, text: str, voice_id: str, model_id: str,
+                    voice_settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Obter áudio do cache ou da API; retorna o caminho no cache"""
+        cache_key = audio_cache.cache_key(text, voice_id, model_id, voice_settings)
+        
+        cached_path = audio_cache.get(cache_key)
+        if cached_path:
+            return {
+                'success': True,
+                'audio_path': cached_path,
+                'cached': True
+            }
+        
+        headers = {
+            'xi-api-key': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        payload = {
+            'text': text,
+            'model_id': model_id,
+            'voice_settings': voice_settings
+        }
+        
+        response = requests.post(
+            f"{self.base_url}/text-to-speech/{voice_id}",
+            headers=headers,
+            json=payload,
+            timeout=30
+        )
+        
+        if response.status_code == 200:
+            return {
+                'success': True,
+                'audio_path': audio_cache.put(cache_key, response.content),
+                'cached': False
+            }
+        else:
+            return {
+                'success': False,
+                'error': f'Erro da API: {response.status_code}',
+                'status_code': response.status_code,
+                'details': response.text
+            }
+    
+    def narrate_batch(self, texts: List[str], voice_id: str = None, output_paths: List[str] = None,
+                      model_id: str = None, voice_settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Narrar vários textos da mesma voz em uma única requisição e dividir o áudio por texto"""
         if not self.is_configured() or not self.is_enabled():
             return {
                 'success': False,
@@ -37,6 +239,142 @@ class ElevenLabsService:
                     'error': 'Voice ID não configurado'
                 }
             
+            model_id = model_id or self.model_id
+            voice_settings = voice_settings or self.default_voice_settings()
+            output_paths = output_paths or [None] * len(texts)
+            
+            # Segmentos dependem do lote inteiro: a prosódia muda com o texto vizinho
+            joined = self.batch_separator.join(texts)
+            batch_key = audio_cache.cache_key(joined, voice_id, model_id, dict(voice_settings, timestamps=True))
+            segment_keys = [
+                audio_cache.cache_key(text, voice_id, model_id, dict(voice_settings, batch=batch_key))
+                for text in texts
+            ]
+            
+            cached_paths = [audio_cache.get(key) for key in segment_keys]
+            cached = all(cached_paths)
+            
+            if not cached:
+                result = self._synthesize_with_timestamps(joined, voice_id, model_id, voice_settings)
+                if not result['success']:
+                    return result
+                
+                boundaries = self._batch_boundaries(texts, result['alignment'])
+                parts = split_mp3(result['audio'], boundaries)
+                cached_paths = [audio_cache.put(key, part) for key, part in zip(segment_keys, parts)]
+            
+            segments = []
+            for text, cached_path, output_path in zip(texts, cached_paths, output_paths):
+                segment = self._deliver_audio(cached_path, output_path, text, cached=cached)
+                with open(cached_path, 'rb') as f:
+                    segment['duration'] = mp3_duration(f.read())
+                segments.append(segment)
+            
+            return {
+                'success': True,
+                'segments': segments,
+                'cached': cached,
+                'requests': 0 if cached else 1
+            }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _synthesize_with_timestamps(self, text: str, voice_id: str, model_id: str,
+                                    voice_settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Sintetizar texto obtendo o tempo de cada caractere"""
+        headers = {
+            'xi-api-key': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        payload = {
+            'text': text,
+            'model_id': model_id,
+            'voice_settings': voice_settings
+        }
+        
+        response = requests.post(
+            f"{self.base_url}/text-to-speech/{voice_id}/with-timestamps",
+            headers=headers,
+            json=payload,
+            timeout=120
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                'success': True,
+                'audio': base64.b64decode(data['audio_base64']),
+                'alignment': data.get('alignment') or {}
+            }
+        else:
+            return {
+                'success': False,
+                'error': f'Erro da API: {response.status_code}',
+                'status_code': response.status_code,
+                'details': response.text
+            }
+    
+    def _batch_boundaries(self, texts: List[str], alignment: Dict[str, Any]) -> List[float]:
+        """Calcular tempos de corte entre textos consecutivos a partir do alinhamento"""
+        starts = alignment.get('character_start_times_seconds') or []
+        ends = alignment.get('character_end_times_seconds') or []
+        total_chars = sum(len(text) for text in texts) + len(self.batch_separator) * (len(texts) - 1)
+        
+        # O provedor pode normalizar o texto: mapear índices proporcionalmente
+        scale = len(starts) / total_chars if total_chars else 0
+        
+        boundaries = []
+        position = 0
+        for text in texts[:-1]:
+            last_char = position + len(text) - 1
+            position += len(text) + len(self.batch_separator)
+            
+            last_index = min(int(last_char * scale), len(ends) - 1)
+            next_index = min(int(position * scale), len(starts) - 1)
+            if last_index < 0 or next_index < 0:
+                raise ValueError('Alinhamento ausente na resposta do provedor')
+            
+            # Cortar no meio da pausa entre os textos
+            boundaries.append((ends[last_index] + starts[next_index]) / 2)
+        
+        return boundaries
+    
+    def stream_text_to_speech(self, text: str, voice_id: str = None, output_path: str = None,
+                              model_id: str = None, voice_settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Converter texto em áudio por streaming, gravando em disco enquanto os chunks chegam"""
+        if not self.is_configured() or not self.is_enabled():
+            return {
+                'success': False,
+                'error': 'ElevenLabs não está configurado ou habilitado'
+            }
+        
+        try:
+            voice_id = voice_id or self.default_voice_id
+            if not voice_id:
+                return {
+                    'success': False,
+                    'error': 'Voice ID não configurado'
+                }
+            
+            model_id = model_id or self.model_id
+            voice_settings = voice_settings or self.default_voice_settings()
+            cache_key = audio_cache.cache_key(text, voice_id, model_id, voice_settings)
+            
+            cached_path = audio_cache.get(cache_key)
+            if cached_path:
+                if output_path:
+                    file_manager.link_file(cached_path, output_path)
+                return {
+                    'success': True,
+                    'cached': True,
+                    'chunks': self._iter_file(cached_path)
+                }
+            
             headers = {
                 'xi-api-key': self.api_key,
                 'Content-Type': 'application/json'
@@ -44,43 +382,33 @@ class ElevenLabsService:
             
             payload = {
                 'text': text,
-                'model_id': 'eleven_monolingual_v1',
-                'voice_settings': {
-                    'stability': self.stability,
-                    'similarity_boost': 0.5
-                }
+                'model_id': model_id,
+                'voice_settings': voice_settings
             }
             
             response = requests.post(
-                f"{self.base_url}/text-to-speech/{voice_id}",
+                f"{self.base_url}/text-to-speech/{voice_id}/stream",
                 headers=headers,
                 json=payload,
+                params={'optimize_streaming_latency': self.streaming_latency},
+                stream=True,
                 timeout=30
             )
             
-            if response.status_code == 200:
-                # Salvar áudio
-                if not output_path:
-                    import uuid
-                    output_path = f"src/static/assets/audio/{uuid.uuid4()}.mp3"
-                
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                
-                with open(output_path, 'wb') as f:
-                    f.write(response.content)
-                
-                return {
-                    'success': True,
-                    'audio_path': output_path,
-                    'size': len(response.content),
-                    'duration': self._estimate_duration(text)
-                }
-            else:
+            if response.status_code != 200:
+                details = response.text
+                response.close()
                 return {
                     'success': False,
                     'error': f'Erro da API: {response.status_code}',
-                    'details': response.text
+                    'details': details
                 }
+            
+            return {
+                'success': True,
+                'cached': False,
+                'chunks': self._stream_to_cache(response, cache_key, output_path)
+            }
                 
         except Exception as e:
             return {
@@ -88,8 +416,62 @@ class ElevenLabsService:
                 'error': str(e)
             }
     
-    def get_voices(self) -> Dict[str, Any]:
-        """Listar vozes disponíveis"""
+    def _stream_to_cache(self, response, cache_key: str, output_path: str = None):
+        """Repassar chunks ao cliente gravando-os progressivamente no disco"""
+        import uuid
+        temp_path = f"{audio_cache.path_for(cache_key)}.{uuid.uuid4().hex}.part"
+        completed = False
+        
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.stream_chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        f.flush()
+                        yield chunk
+            completed = True
+        finally:
+            response.close()
+            if completed:
+                cached_path = audio_cache.put_file(cache_key, temp_path)
+                if output_path:
+                    file_manager.link_file(cached_path, output_path)
+            elif os.path.exists(temp_path):
+                # Stream interrompido: não deixar áudio parcial no cache
+                os.remove(temp_path)
+    
+    def _iter_file(self, file_path: str):
+        """Ler arquivo em chunks para streaming"""
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.stream_chunk_size), b''):
+                yield chunk
+    
+    def default_voice_settings(self) -> Dict[str, Any]:
+        """Configurações de voz padrão"""
+        return {
+            'stability': self.stability,
+            'similarity_boost': 0.5
+        }
+    
+    def _deliver_audio(self, cached_path: str, output_path: str, text: str, cached: bool) -> Dict[str, Any]:
+        """Vincular áudio do cache ao caminho de saída (hard link, sem cópia)"""
+        if not output_path:
+            import uuid
+            output_path = file_manager.shard_path(f"{file_manager.base_path}/audio", f"{uuid.uuid4()}.mp3")
+        
+        # O link sobrevive ao despejo do cache
+        file_manager.link_file(cached_path, output_path)
+        
+        return {
+            'success': True,
+            'audio_path': output_path,
+            'size': os.path.getsize(output_path),
+            'duration': self._estimate_duration(text),
+            'cached': cached
+        }
+    
+    def get_voices(self, refresh: bool = False) -> Dict[str, Any]:
+        """Listar vozes disponíveis; refresh=True consulta o provedor mesmo com o catálogo em cache"""
         if not self.is_configured():
             return {
                 'success': False,
@@ -102,22 +484,24 @@ class ElevenLabsService:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
+            fetch = catalog_cache.refresh if refresh else catalog_cache.get
+            result = fetch(
+                self._catalog_key('voices'),
                 f"{self.base_url}/voices",
-                headers=headers,
-                timeout=10
+                headers,
+                extract=lambda data: data.get('voices', [])
             )
             
-            if response.status_code == 200:
-                data = response.json()
+            if result['success']:
                 return {
                     'success': True,
-                    'voices': data.get('voices', [])
+                    'voices': result['data'],
+                    'cached': result['cached']
                 }
             else:
                 return {
                     'success': False,
-                    'error': f'Erro da API: {response.status_code}'
+                    'error': result['error']
                 }
                 
         except Exception as e:
@@ -140,22 +524,22 @@ class ElevenLabsService:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
+            result = catalog_cache.get(
+                self._catalog_key('voice', voice_id),
                 f"{self.base_url}/voices/{voice_id}",
-                headers=headers,
-                timeout=10
+                headers
             )
             
-            if response.status_code == 200:
-                data = response.json()
+            if result['success']:
                 return {
                     'success': True,
-                    'voice': data
+                    'voice': result['data'],
+                    'cached': result['cached']
                 }
             else:
                 return {
                     'success': False,
-                    'error': f'Erro da API: {response.status_code}'
+                    'error': result['error']
                 }
                 
         except Exception as e:
@@ -177,30 +561,38 @@ class ElevenLabsService:
                 'xi-api-key': self.api_key
             }
             
-            files = []
-            for i, audio_file in enumerate(audio_files):
-                if os.path.exists(audio_file):
-                    files.append(('files', (f'audio_{i}.mp3', open(audio_file, 'rb'), 'audio/mpeg')))
-            
-            data = {
-                'name': name,
-                'description': description
-            }
+            samples = [audio_file for audio_file in audio_files if os.path.exists(audio_file)]
+            temp_dir = tempfile.mkdtemp(prefix='clone_')
             
-            response = requests.post(
-                f"{self.base_url}/voices/add",
-                headers=headers,
-                data=data,
-                files=files,
-                timeout=60
-            )
-            
-            # Fechar arquivos
-            for _, file_tuple in files:
-                file_tuple[1].close()
+            try:
+                samples = self._prepare_samples(samples, temp_dir)
+                
+                # Corpo multipart lido do disco durante o envio
+                body = MultipartStream(
+                    {'name': name, 'description': description or ''},
+                    [
+                        ('files', os.path.basename(sample), sample,
+                         mimetypes.guess_type(sample)[0] or 'application/octet-stream')
+                        for sample in samples
+                    ]
+                )
+                headers['Content-Type'] = body.content_type
+                
+                try:
+                    response = requests.post(
+                        f"{self.base_url}/voices/add",
+                        headers=headers,
+                        data=body,
+                        timeout=60
+                    )
+                finally:
+                    body.close()
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
             
             if response.status_code == 200:
                 data = response.json()
+                catalog_cache.invalidate(self._catalog_key('voices'))
                 return {
                     'success': True,
                     'voice_id': data.get('voice_id'),
@@ -219,6 +611,31 @@ class ElevenLabsService:
                 'error': str(e)
             }
     
+    def _prepare_samples(self, samples: List[str], temp_dir: str) -> List[str]:
+        """Converter amostras acima do limite para MP3 mono em paralelo"""
+        oversized = [sample for sample in samples if os.path.getsize(sample) > self.clone_max_sample_size]
+        if not oversized:
+            return samples
+        
+        # O trabalho pesado roda em processos ffmpeg; threads só os coordenam
+        with ThreadPoolExecutor(max_workers=min(self.max_transcode_workers, len(oversized))) as executor:
+            futures = {
+                sample: executor.submit(
+                    transcode_audio, sample, os.path.join(temp_dir, f'sample_{i}.mp3'), self.clone_bitrate
+                )
+                for i, sample in enumerate(oversized)
+            }
+        
+        prepared = []
+        for sample in samples:
+            result = futures[sample].result() if sample in futures else None
+            # Sem ffmpeg ou com falha na conversão, enviar o original
+            if result and result['success'] and result['size'] < os.path.getsize(sample):
+                prepared.append(result['output_path'])
+            else:
+                prepared.append(sample)
+        return prepared
+    
     def delete_voice(self, voice_id: str) -> Dict[str, Any]:
         """Deletar voz"""
         if not self.is_configured():
@@ -240,6 +657,10 @@ class ElevenLabsService:
             )
             
             if response.status_code == 200:
+                catalog_cache.invalidate(
+                    self._catalog_key('voices'),
+                    self._catalog_key('voice', voice_id)
+                )
                 return {
                     'success': True,
                     'message': 'Voz deletada com sucesso'
@@ -256,6 +677,10 @@ class ElevenLabsService:
                 'error': str(e)
             }
     
+    def _catalog_key(self, *parts: str) -> str:
+        """Chave do catálogo desta conta"""
+        return catalog_cache.key('elevenlabs', self.api_key, *parts)
+    
     def get_usage(self) -> Dict[str, Any]:
         """Obter informações de uso"""
         if not self.is_configured():
@@ -320,8 +745,8 @@ class ElevenLabsService:
             import time
             start_time = time.time()
             
-            # Testar listagem de vozes
-            result = self.get_voices()
+            # Testar listagem de vozes direto no provedor: o cache responderia mesmo com a API fora do ar
+            result = self.get_voices(refresh=True)
             
             response_time = time.time() - start_time
             
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable
+from sqlalchemy.exc import IntegrityError
+from src.models.generation import VideoGeneration
+from src.database.config import db
+from src.services.storage.file_manager import file_manager
+
+class GenerationCache:
+    """Cache endereçado por conteúdo para gerações de vídeo pagas"""
+
+    def __init__(self):
+        self.clips_dir = f"{file_manager.base_path}/scenes/generations"
+        os.makedirs(self.clips_dir, exist_ok=True)
+
+        # Tempo máximo de uma reserva sem generation_id antes de ser assumida por outro worker
+        self.claim_timeout = 120
+        # Tempo máximo para considerar uma geração em andamento
+        self.processing_timeout = 3600
+        # Espera padrão por uma geração idêntica reservada por outro worker; tarefas em background podem esperar mais
+        self.request_wait = 5
+        self.wait_interval = 0.5
+
+        # Locks em faixas fixas para não crescer com o número de requisições
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def normalize_request(self, prompt: str, duration: int, resolution: str,
+                          model: str, quality: str) -> Dict[str, Any]:
+        """Normalizar parâmetros para que requisições equivalentes tenham o mesmo hash"""
+        return {
+            'prompt': re.sub(r'\s+', ' ', prompt or '').strip(),
+            'duration': int(duration),
+            'resolution': (resolution or '').lower().replace(' ', ''),
+            'model': (model or '').lower(),
+            'quality': (quality or '').lower()
+        }
+
+    def request_hash(self, request: Dict[str, Any]) -> str:
+        """Calcular hash da requisição normalizada"""
+        serialized = json.dumps(request, sort_keys=True)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def clip_path(self, request_hash: str) -> str:
+        """Caminho do clipe armazenado para a requisição"""
+        return f"{self.clips_dir}/{request_hash}.mp4"
+
+    def get_or_generate(self, request: Dict[str, Any], generate: Callable[[], Dict[str, Any]],
+                        max_wait: float = None) -> Dict[str, Any]:
+        """Servir do cache, anexar a uma geração em andamento ou iniciar uma nova
+
+        Se outro worker reservou a mesma requisição e ainda não tem o ID do provedor, espera
+        até max_wait segundos (padrão: request_wait) e então retorna status 'pending'.
+        """
+        request_hash = self.request_hash(request)
+
+        # O lock do processo cobre só as escritas da reserva; entre workers vale a reserva no banco
+        with self.lock_for(request_hash):
+            entry, claimed = self._claim(request_hash, request)
+
+        if not claimed:
+            # Espera fora do lock: outras requisições na mesma faixa não ficam bloqueadas
+            entry = self._wait_for_generation_id(entry, self.request_wait if max_wait is None else max_wait)
+            result = self._result_from_entry(entry)
+            if result:
+                entry.hit_count = (entry.hit_count or 0) + 1
+                db.session.commit()
+                return result
+
+            # Entrada falhou, expirou, perdeu o clipe ou teve a reserva abandonada: assumir a geração
+            with self.lock_for(request_hash):
+                taken = self._take_over(entry)
+            if not taken:
+                return {
+                    'success': False,
+                    'status': 'pending',
+                    'error': 'Geração idêntica em andamento; tente novamente em instantes',
+                    'request_hash': request_hash
+                }
+
+        # Chamada paga ao provedor fora do lock; a reserva garante que só este worker a faz
+        try:
+            result = generate()
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        with self.lock_for(request_hash):
+            if result.get('success'):
+                entry.generation_id = result.get('generation_id')
+                entry.status = 'processing'
+            else:
+                entry.status = 'failed'
+                entry.error = result.get('error')
+            db.session.commit()
+
+        return dict(result, cached=False, deduplicated=False, request_hash=request_hash)
+
+    def find_by_generation_id(self, generation_id: str) -> Optional[VideoGeneration]:
+        """Buscar entrada pelo ID da geração no provedor"""
+        if not generation_id:
+            return None
+        return VideoGeneration.query.filter_by(generation_id=generation_id).first()
+
+    def get_clip(self, generation_id: str) -> Optional[str]:
+        """Obter clipe já armazenado para a geração"""
+        entry = self.find_by_generation_id(generation_id)
+        if entry and entry.status == 'completed' and entry.file_path and os.path.exists(entry.file_path):
+            return entry.file_path
+        return None
+
+    def mark_completed(self, generation_id: str, file_path: str) -> Optional[str]:
+        """Registrar clipe concluído da geração"""
+        entry = self.find_by_generation_id(generation_id)
+        if not entry:
+            return None
+
+        entry.status = 'completed'
+        entry.file_path = file_path
+        entry.error = None
+        db.session.commit()
+        return file_path
+
+    def mark_failed(self, generation_id: str, error: str = None):
+        """Registrar falha para que a próxima requisição idêntica gere novamente"""
+        entry = self.find_by_generation_id(generation_id)
+        if entry:
+            entry.status = 'failed'
+            entry.error = error
+            db.session.commit()
+
+    def _claim(self, request_hash: str, request: Dict[str, Any]):
+        """Reservar a geração; retorna (entrada, reservada_por_nós)"""
+        entry = VideoGeneration.query.filter_by(request_hash=request_hash).first()
+        if entry:
+            return entry, False
+
+        entry = VideoGeneration(
+            request_hash=request_hash,
+            prompt=request['prompt'],
+            model=request['model'],
+            duration=request['duration'],
+            resolution=request['resolution'],
+            quality=request['quality'],
+            status='pending'
+        )
+        db.session.add(entry)
+        try:
+            db.session.commit()
+            return entry, True
+        except IntegrityError:
+            # Outro worker reservou a mesma requisição
+            db.session.rollback()
+            return VideoGeneration.query.filter_by(request_hash=request_hash).first(), False
+
+    def _wait_for_generation_id(self, entry: VideoGeneration, max_wait: float) -> VideoGeneration:
+        """Aguardar, por até max_wait segundos, o worker que reservou a geração obter o ID do provedor"""
+        deadline = min(
+            (entry.created_at or datetime.utcnow()) + timedelta(seconds=self.claim_timeout),
+            datetime.utcnow() + timedelta(seconds=max_wait)
+        )
+        while entry.status == 'pending' and datetime.utcnow() < deadline:
+            time.sleep(self.wait_interval)
+            db.session.refresh(entry)
+        return entry
+
+    def _take_over(self, entry: VideoGeneration) -> bool:
+        """Reservar de novo uma entrada não reaproveitável com UPDATE condicional; só um worker consegue"""
+        now = datetime.utcnow()
+        query = VideoGeneration.query.filter(
+            VideoGeneration.id == entry.id,
+            VideoGeneration.status == entry.status
+        )
+        if entry.status == 'pending':
+            # Reserva abandonada: o worker que a fez não obteve o ID a tempo
+            query = query.filter(VideoGeneration.created_at < now - timedelta(seconds=self.claim_timeout))
+        else:
+            # Mesma versão lida: ninguém alterou a entrada desde então
+            query = query.filter(VideoGeneration.updated_at == entry.updated_at)
+
+        taken = query.update({
+            'status': 'pending',
+            'generation_id': None,
+            'file_path': None,
+            'error': None,
+            'created_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if taken != 1:
+            return False
+        db.session.refresh(entry)
+        return True
+
+    def _result_from_entry(self, entry: VideoGeneration) -> Optional[Dict[str, Any]]:
+        """Montar resposta a partir de uma entrada reaproveitável"""
+        if entry.status == 'completed' and entry.file_path and os.path.exists(entry.file_path):
+            return {
+                'success': True,
+                'status': 'completed',
+                'generation_id': entry.generation_id,
+                'file_path': entry.file_path,
+                'estimated_time': 0,
+                'cached': True,
+                'deduplicated': False,
+                'request_hash': entry.request_hash
+            }
+
+        expires = (entry.updated_at or entry.created_at or datetime.utcnow()) + timedelta(seconds=self.processing_timeout)
+        if entry.status == 'processing' and entry.generation_id and datetime.utcnow() < expires:
+            return {
+                'success': True,
+                'status': 'processing',
+                'generation_id': entry.generation_id,
+                'estimated_time': 60,
+                'cached': False,
+                'deduplicated': True,
+                'request_hash': entry.request_hash
+            }
+
+        return None
+
+    def lock_for(self, request_hash: str) -> threading.Lock:
+        """Lock do processo para a requisição; gerações e downloads do mesmo hash não concorrem"""
+        return self._locks[int(request_hash[:8], 16) % len(self._locks)]
+
+# Instância global
+generation_cache = GenerationCache()
@@ -3,6 +3,9 @@ import json
 import time
 from typing import Dict, Any, Optional
 from src.utils.config_manager import config_manager
+from src.services.video.generation_cache import generation_cache
+from src.services.storage.download_manager import download_manager
+from src.services.video.catalog_cache import catalog_cache
 
 class RunwayService:
     """Serviço para integração com Runway ML"""
@@ -21,14 +24,24 @@ class RunwayService:
         """Verificar se o serviço está habilitado"""
         return config_manager.is_service_enabled('video', 'runway')
     
-    def generate_video(self, prompt: str, duration: int = 5, resolution: str = "1920x1080") -> Dict[str, Any]:
-        """Gerar vídeo com Runway ML"""
+    def generate_video(self, prompt: str, duration: int = 5, resolution: str = "1920x1080",
+                       max_wait: float = None) -> Dict[str, Any]:
+        """Gerar vídeo com Runway ML, reaproveitando gerações idênticas"""
         if not self.is_configured() or not self.is_enabled():
             return {
                 'success': False,
                 'error': 'Runway ML não está configurado ou habilitado'
             }
         
+        request = generation_cache.normalize_request(prompt, duration, resolution, self.model, self.quality)
+        return generation_cache.get_or_generate(
+            request,
+            lambda: self._request_generation(request['prompt'], request['duration'], resolution),
+            max_wait=max_wait
+        )
+    
+    def _request_generation(self, prompt: str, duration: int, resolution: str) -> Dict[str, Any]:
+        """Solicitar nova geração à API do Runway ML"""
         try:
             headers = {
                 'Authorization': f'Bearer {self.api_key}',
@@ -114,37 +127,53 @@ class RunwayService:
     
     def download_video(self, video_url: str, local_path: str) -> Dict[str, Any]:
         """Download do vídeo gerado"""
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}'
+        headers = {
+            'Authorization': f'Bearer {self.api_key}'
+        }
+        
+        result = download_manager.download(video_url, local_path, headers=headers)
+        if not result['success']:
+            result['error'] = f"Erro no download: {result['error']}"
+        return result
+    
+    def store_generation(self, generation_id: str, video_url: str) -> Dict[str, Any]:
+        """Armazenar clipe da geração no cache compartilhado"""
+        clip_path = generation_cache.get_clip(generation_id)
+        if clip_path:
+            return {
+                'success': True,
+                'local_path': clip_path,
+                'cached': True
             }
-            
-            response = requests.get(video_url, headers=headers, stream=True)
-            
-            if response.status_code == 200:
-                with open(local_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
+        
+        entry = generation_cache.find_by_generation_id(generation_id)
+        if entry:
+            local_path = generation_cache.clip_path(entry.request_hash)
+        else:
+            local_path = f"{generation_cache.clips_dir}/{generation_id}.mp4"
+        
+        # Cenas deduplicadas na mesma geração não baixam o clipe duas vezes neste processo
+        with generation_cache.lock_for(entry.request_hash if entry else generation_id):
+            clip_path = generation_cache.get_clip(generation_id)
+            if clip_path:
                 return {
                     'success': True,
-                    'local_path': local_path,
-                    'size': len(response.content)
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'Erro no download: {response.status_code}'
+                    'local_path': clip_path,
+                    'cached': True
                 }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+            
+            # Caminho fixo por request_hash: o download manager grava em .part e retoma o parcial de uma tentativa anterior
+            result = self.download_video(video_url, local_path)
+            if not result['success']:
+                return result
+            
+            generation_cache.mark_completed(generation_id, local_path)
+            result['local_path'] = local_path
+            result['cached'] = False
+            return result
     
-    def list_models(self) -> Dict[str, Any]:
-        """Listar modelos disponíveis"""
+    def list_models(self, refresh: bool = False) -> Dict[str, Any]:
+        """Listar modelos disponíveis; refresh=True consulta o provedor mesmo com o catálogo em cache"""
         if not self.is_configured():
             return {
                 'success': False,
@@ -157,22 +186,24 @@ class RunwayService:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
+            fetch = catalog_cache.refresh if refresh else catalog_cache.get
+            result = fetch(
+                catalog_cache.key('runway', self.api_key, 'models'),
                 f"{self.base_url}/models",
-                headers=headers,
-                timeout=10
+                headers,
+                extract=lambda data: data.get('models', [])
             )
             
-            if response.status_code == 200:
-                data = response.json()
+            if result['success']:
                 return {
                     'success': True,
-                    'models': data.get('models', [])
+                    'models': result['data'],
+                    'cached': result['cached']
                 }
             else:
                 return {
                     'success': False,
-                    'error': f'Erro da API: {response.status_code}'
+                    'error': result['error']
                 }
                 
         except Exception as e:
@@ -239,8 +270,8 @@ class RunwayService:
             import time
             start_time = time.time()
             
-            # Testar listagem de modelos
-            result = self.list_models()
+            # Testar listagem de modelos direto no provedor: o cache responderia mesmo com a API fora do ar
+            result = self.list_models(refresh=True)
             
             response_time = time.time() - start_time
             
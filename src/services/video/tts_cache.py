@@ -0,0 +1,80 @@
+import json
+import uuid
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+from src.utils.config_manager import config_manager
+from src.services.storage.file_manager import file_manager
+from src.services.storage.disk_cache_limit import DiskCacheLimit
+
+class AudioCache:
+    """Cache de áudio endereçado por conteúdo com limite de disco e despejo LRU pelo mtime, compartilhado entre workers"""
+
+    def __init__(self):
+        self.cache_dir = f"{file_manager.base_path}/audio/cache"
+        self.limit = DiskCacheLimit(
+            self.cache_dir,
+            config_manager.get('video.elevenlabs.cache_max_size', 1024 * 1024 * 1024),  # 1GB
+            ('.mp3',)
+        )
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, text: str, voice_id: str, model_id: str, voice_settings: Dict[str, Any]) -> str:
+        """Calcular chave do áudio a partir de tudo que altera a síntese"""
+        content = {
+            'text': text,
+            'voice_id': voice_id,
+            'model_id': model_id,
+            'voice_settings': voice_settings or {}
+        }
+        serialized = json.dumps(content, sort_keys=True)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        """Caminho do áudio no cache"""
+        return f"{self.cache_dir}/{key}.mp3"
+
+    def get(self, key: str) -> Optional[str]:
+        """Obter áudio em cache, marcando-o como usado recentemente"""
+        path = self.path_for(key)
+
+        # mtime é a recência compartilhada entre workers e protege o áudio do despejo por min_age
+        hit = self.limit.touch(path)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return path if hit else None
+
+    def put(self, key: str, data: bytes) -> str:
+        """Guardar áudio no cache com escrita atômica"""
+        path = self.path_for(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        return self.put_file(key, temp_path)
+
+    def put_file(self, key: str, source_path: str) -> str:
+        """Mover arquivo já escrito para o cache"""
+        path = self.path_for(key)
+        self.limit.add(source_path, path)
+        return path
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas do cache"""
+        entries = self.limit.scan()
+        with self._lock:
+            return {
+                'entries': len(entries),
+                'size': sum(size for _, _, size in entries),
+                'max_size': self.limit.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+# Instância global
+audio_cache = AudioCache()
@@ -0,0 +1,33 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable
+from flask import current_app
+from src.database.config import db
+from src.utils.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+class JobRunner:
+    """Executor de tarefas em background com contexto da aplicação"""
+
+    def __init__(self):
+        self.max_workers = config_manager.get('app.max_concurrent_jobs', 5)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Agendar função para rodar fora da requisição"""
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    logger.exception("Erro na tarefa em background %s", getattr(func, '__name__', func))
+                    db.session.rollback()
+                    raise
+
+        return self.executor.submit(run)
+
+# Instância global
+job_runner = JobRunner()
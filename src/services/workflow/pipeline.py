@@ -0,0 +1,217 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, Callable
+from src.database.config import db
+
+logger = logging.getLogger(__name__)
+
+class PipelineNode:
+    """Nó do grafo de execução"""
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: List[str] = None,
+                 cache_key: str = None, lookup: Callable[[Dict[str, Any]], Any] = None,
+                 max_retries: int = 0):
+        self.name = name
+        self.func = func
+        self.deps = list(deps or [])
+        self.cache_key = cache_key
+        self.lookup = lookup
+        self.max_retries = max_retries
+        self.reset()
+
+    def reset(self):
+        """Voltar o nó ao estado inicial"""
+        self.status = 'pending'  # pending, running, completed, cached, failed, skipped
+        self.output = None
+        self.error = None
+        self.attempts = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'cached')
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return round(self.finished_at - self.started_at, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converter para dicionário"""
+        return {
+            'name': self.name,
+            'deps': self.deps,
+            'status': self.status,
+            'attempts': self.attempts,
+            'duration': self.duration,
+            'error': self.error
+        }
+
+class PipelineCache:
+    """Cache LRU das saídas dos nós, indexado por chave de conteúdo"""
+
+    def __init__(self, max_entries: int = 1024, validate: Callable[[Any], bool] = None):
+        self.max_entries = max_entries
+        self.validate = validate
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Retorna (encontrado, valor); saídas invalidadas (ex.: arquivo removido) contam como ausentes"""
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            value = self._entries[key]
+            if self.validate and not self.validate(value):
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class Pipeline:
+    """Executor de grafo de dependências: ramos independentes rodam em paralelo"""
+
+    def __init__(self, name: str, app=None, max_workers: int = 4, cache: PipelineCache = None):
+        self.name = name
+        self.app = app
+        self.max_workers = max_workers
+        self.cache = cache
+        self.nodes = OrderedDict()
+        self.status = 'pending'  # pending, running, completed, failed
+        self.started_at = None
+        self.finished_at = None
+        self._run_lock = threading.Lock()
+
+    def add_node(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: List[str] = None,
+                 **options) -> PipelineNode:
+        """Adicionar nó; as dependências precisam existir, o que garante um grafo acíclico"""
+        if name in self.nodes:
+            raise ValueError(f'Nó duplicado: {name}')
+        for dep in deps or []:
+            if dep not in self.nodes:
+                raise ValueError(f'Dependência desconhecida para {name}: {dep}')
+
+        node = PipelineNode(name, func, deps, **options)
+        self.nodes[name] = node
+        return node
+
+    def run(self) -> Dict[str, Any]:
+        """Executar todos os nós pendentes"""
+        with self._run_lock:
+            self.status = 'running'
+            self.started_at = time.time()
+            self.finished_at = None
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                running = {}
+                while True:
+                    for node in self._ready_nodes():
+                        node.status = 'running'
+                        running[executor.submit(self._execute, node)] = node
+
+                    if not running:
+                        break
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        running.pop(future)
+
+            # Nós cujas dependências falharam não chegam a rodar
+            for node in self.nodes.values():
+                if node.status == 'pending':
+                    node.status = 'skipped'
+
+            self.finished_at = time.time()
+            self.status = 'completed' if all(node.done for node in self.nodes.values()) else 'failed'
+            return self.to_dict()
+
+    def retry(self) -> Dict[str, Any]:
+        """Reexecutar apenas nós falhos e os que dependem deles"""
+        for node in self.nodes.values():
+            if node.status in ('failed', 'skipped'):
+                node.reset()
+        return self.run()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converter para dicionário com tempos por nó"""
+        duration = None
+        if self.started_at is not None:
+            duration = round((self.finished_at or time.time()) - self.started_at, 3)
+
+        return {
+            'name': self.name,
+            'status': self.status,
+            'duration': duration,
+            'nodes': [node.to_dict() for node in self.nodes.values()]
+        }
+
+    def _ready_nodes(self) -> List[PipelineNode]:
+        return [
+            node for node in self.nodes.values()
+            if node.status == 'pending' and all(self.nodes[dep].done for dep in node.deps)
+        ]
+
+    def _execute(self, node: PipelineNode):
+        if self.app is not None:
+            with self.app.app_context():
+                # Cada nó tem sessão própria: gravar o que ele registrou (uso do storage, metadados)
+                try:
+                    self._execute_node(node)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+        else:
+            self._execute_node(node)
+
+    def _execute_node(self, node: PipelineNode):
+        node.started_at = time.time()
+        inputs = {dep: self.nodes[dep].output for dep in node.deps}
+
+        try:
+            if node.lookup:
+                output = node.lookup(inputs)
+                if output is not None:
+                    node.output = output
+                    node.status = 'cached'
+                    return
+
+            if node.cache_key and self.cache:
+                found, output = self.cache.get(node.cache_key)
+                if found:
+                    node.output = output
+                    node.status = 'cached'
+                    return
+
+            while True:
+                node.attempts += 1
+                try:
+                    node.output = node.func(inputs)
+                    break
+                except Exception:
+                    if node.attempts > node.max_retries:
+                        raise
+                    time.sleep(min(2 ** node.attempts, 30))
+
+            if node.cache_key and self.cache:
+                self.cache.set(node.cache_key, node.output)
+            node.status = 'completed'
+
+        except Exception as e:
+            logger.warning("Nó %s do pipeline %s falhou: %s", node.name, self.name, e)
+            node.error = str(e)
+            node.status = 'failed'
+        finally:
+            node.finished_at = time.time()
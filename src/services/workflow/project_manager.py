@@ -1,14 +1,26 @@
 import os
+import time
 import uuid
 import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import current_app
+from config import Config
 from src.models.scene import Project, Scene
 from src.models.avatar import Avatar
+from src.models.render import Render
 from src.database.config import db
 from src.services.video.runway_service import runway_service
+from src.services.video.generation_cache import generation_cache
 from src.services.video.elevenlabs_service import elevenlabs_service
 from src.services.storage.file_manager import file_manager
+from src.services.storage.blob_store import blob_store
+from src.services.workflow.render_cache import scene_render_cache
+from src.services.workflow.pipeline import Pipeline, PipelineCache
+from src.services.workflow.job_runner import job_runner
+from src.utils.config_manager import config_manager
 
 class ProjectManager:
     """Gerenciador de projetos de vídeo"""
@@ -16,6 +28,16 @@ class ProjectManager:
     def __init__(self):
         self.output_dir = 'src/static/assets/videos'
         os.makedirs(self.output_dir, exist_ok=True)
+        
+        # Estado das renderizações fica na tabela renders; aqui só os grafos executados neste processo
+        self.pipelines = OrderedDict()
+        self.max_pipelines = 100
+        # Renderização em execução há mais que isto é considerada interrompida (ex.: worker reiniciado)
+        self.render_timeout = 7200
+        self.render_workers = 4
+        self.render_cache = PipelineCache(
+            validate=lambda output: not isinstance(output, str) or os.path.exists(output)
+        )
     
     def create_project(self, title: str, description: str = "", template: str = "default") -> Dict[str, Any]:
         """Criar novo projeto"""
@@ -119,14 +141,10 @@ class ProjectManager:
                     'error': 'Projeto não encontrado'
                 }
             
-            # Deletar arquivos de vídeo
-            if project.final_video_path and os.path.exists(project.final_video_path):
-                os.remove(project.final_video_path)
-            
-            # Deletar cenas e seus arquivos
+            # Arquivos avulsos saem agora; blobs são coletados quando perdem a última referência
+            blob_store.discard(project.final_video_path)
             for scene in project.scenes:
-                if scene.file_path and os.path.exists(scene.file_path):
-                    os.remove(scene.file_path)
+                blob_store.discard(scene.file_path)
             
             # Deletar do banco
             db.session.delete(project)
@@ -209,7 +227,7 @@ class ProjectManager:
             # Atualizar campos permitidos
             allowed_fields = [
                 'title', 'description', 'duration', 'background', 'transition',
-                'avatar_id', 'voice_id', 'script', 'subtitle', 'ai_prompt', 'ai_model'
+                'avatar_id', 'voice_id', 'voice_settings', 'script', 'subtitle', 'ai_prompt', 'ai_model'
             ]
             
             for field in allowed_fields:
@@ -252,8 +270,7 @@ class ProjectManager:
             project = scene.project
             
             # Deletar arquivo de vídeo da cena
-            if scene.file_path and os.path.exists(scene.file_path):
-                os.remove(scene.file_path)
+            blob_store.discard(scene.file_path)
             
             # Atualizar duração total
             project.total_duration -= scene.duration
@@ -318,7 +335,7 @@ class ProjectManager:
                 'error': str(e)
             }
     
-    def generate_scene(self, scene_id: int) -> Dict[str, Any]:
+    def generate_scene(self, scene_id: int, force: bool = False) -> Dict[str, Any]:
         """Gerar vídeo para uma cena"""
         try:
             scene = Scene.query.get(scene_id)
@@ -328,8 +345,27 @@ class ProjectManager:
                     'error': 'Cena não encontrada'
                 }
             
+            content_hash = scene_render_cache.compute_scene_hash(scene)
+            
+            # Reaproveitar segmento já renderizado com o mesmo conteúdo
+            cached_segment = None if force else scene_render_cache.get_segment(content_hash)
+            if cached_segment:
+                output_path = blob_store.put(cached_segment, project_id=scene.project_id)
+                self._replace_scene_file(scene, output_path)
+                
+                scene.render_hash = content_hash
+                scene.status = 'completed'
+                db.session.commit()
+                
+                return {
+                    'success': True,
+                    'file_path': output_path,
+                    'reused': True
+                }
+            
             # Atualizar status
             scene.status = 'processing'
+            scene.render_hash = content_hash
             db.session.commit()
             
             # Gerar vídeo com Runway ML
@@ -340,6 +376,21 @@ class ProjectManager:
                     resolution=scene.project.resolution
                 )
                 
+                if result['success'] and result.get('file_path'):
+                    # Geração idêntica já armazenada: usar o clipe sem nova chamada paga
+                    output_path = blob_store.put(result['file_path'], project_id=scene.project_id)
+                    scene_render_cache.store_segment(content_hash, output_path)
+                    
+                    self._replace_scene_file(scene, output_path)
+                    scene.status = 'completed'
+                    db.session.commit()
+                    
+                    return {
+                        'success': True,
+                        'file_path': output_path,
+                        'reused': True
+                    }
+                
                 if result['success']:
                     # Salvar ID da geração
                     scene.file_path = result['generation_id']  # Temporário
@@ -348,8 +399,14 @@ class ProjectManager:
                     return {
                         'success': True,
                         'generation_id': result['generation_id'],
-                        'estimated_time': result['estimated_time']
+                        'estimated_time': result['estimated_time'],
+                        'deduplicated': result.get('deduplicated', False)
                     }
+                elif result.get('status') == 'pending':
+                    # Geração idêntica reservada por outro worker: a cena não falhou, só não começou
+                    scene.status = 'pending'
+                    db.session.commit()
+                    return result
                 else:
                     scene.status = 'failed'
                     db.session.commit()
@@ -360,17 +417,21 @@ class ProjectManager:
             time.sleep(2)  # Simular processamento
             
             # Gerar arquivo simulado
-            output_path = f"{self.output_dir}/scene_{scene_id}_{uuid.uuid4()}.mp4"
+            output_path = self._output_path(f"scene_{scene_id}_{uuid.uuid4()}.mp4")
             with open(output_path, 'w') as f:
                 f.write(f"Scene {scene_id} - {scene.title}")
+            output_path = blob_store.put(output_path, move=True, project_id=scene.project_id)
+            
+            scene_render_cache.store_segment(content_hash, output_path)
             
-            scene.file_path = output_path
+            self._replace_scene_file(scene, output_path)
             scene.status = 'completed'
             db.session.commit()
             
             return {
                 'success': True,
-                'file_path': output_path
+                'file_path': output_path,
+                'reused': False
             }
             
         except Exception as e:
@@ -381,6 +442,28 @@ class ProjectManager:
                 'error': str(e)
             }
     
+    def _output_path(self, filename: str) -> str:
+        """Caminho de saída de um vídeo, no subdiretório do hash do nome"""
+        path = file_manager.shard_path(self.output_dir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+    
+    def _replace_scene_file(self, scene: Scene, new_path: str):
+        """Substituir arquivo da cena; o blob anterior perde uma referência e o avulso é removido"""
+        old_path = scene.file_path
+        if old_path and old_path != new_path:
+            blob_store.discard(old_path)
+        scene.file_path = new_path
+    
+    def _is_scene_current(self, scene: Scene, content_hash: str) -> bool:
+        """Verificar se o vídeo atual da cena corresponde ao conteúdo"""
+        return (
+            scene.status == 'completed'
+            and scene.render_hash == content_hash
+            and bool(scene.file_path)
+            and os.path.exists(scene.file_path)
+        )
+    
     def get_scene_status(self, scene_id: int) -> Dict[str, Any]:
         """Obter status da geração da cena"""
         try:
@@ -397,15 +480,20 @@ class ProjectManager:
                     result = runway_service.get_generation_status(scene.file_path)
                     if result['success']:
                         if result['status'] == 'completed':
-                            # Download do vídeo
-                            download_result = runway_service.download_video(
-                                result['video_url'],
-                                f"{self.output_dir}/scene_{scene_id}.mp4"
+                            # Download único do clipe, compartilhado entre cenas idênticas
+                            download_result = runway_service.store_generation(
+                                scene.file_path,
+                                result['video_url']
                             )
                             if download_result['success']:
-                                scene.file_path = download_result['local_path']
+                                scene.file_path = blob_store.put(download_result['local_path'], project_id=scene.project_id)
                                 scene.status = 'completed'
+                                scene_render_cache.store_segment(scene.render_hash, scene.file_path)
                                 db.session.commit()
+                        elif result['status'] == 'failed':
+                            generation_cache.mark_failed(scene.file_path, result.get('error'))
+                            scene.status = 'failed'
+                            db.session.commit()
                         
                         return {
                             'success': True,
@@ -426,8 +514,8 @@ class ProjectManager:
                 'error': str(e)
             }
     
-    def generate_project_video(self, project_id: int) -> Dict[str, Any]:
-        """Gerar vídeo final do projeto"""
+    def generate_project_video(self, project_id: int, force: bool = False) -> Dict[str, Any]:
+        """Iniciar renderização do projeto em background, re-renderizando apenas cenas alteradas"""
         try:
             project = Project.query.get(project_id)
             if not project:
@@ -436,44 +524,541 @@ class ProjectManager:
                     'error': 'Projeto não encontrado'
                 }
             
-            # Verificar se todas as cenas estão prontas
-            pending_scenes = [s for s in project.scenes if s.status != 'completed']
-            if pending_scenes:
+            if not project.scenes:
                 return {
                     'success': False,
-                    'error': f'{len(pending_scenes)} cenas ainda não foram geradas'
+                    'error': 'Projeto não possui cenas'
                 }
             
             # Atualizar status
             project.status = 'processing'
+            
+            pipeline = self._build_render_pipeline(project, force)
             db.session.commit()
+            job_runner.submit(self._run_render, pipeline.name)
             
-            # Combinar vídeos das cenas
-            output_path = f"{self.output_dir}/project_{project_id}_{uuid.uuid4()}.mp4"
+            return {
+                'success': True,
+                'render_id': pipeline.name,
+                'status': 'processing',
+                'nodes': len(pipeline.nodes)
+            }
             
-            # Simular combinação de vídeos
-            import time
-            time.sleep(3)
+        except Exception as e:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def generate_narration(self, project_id: int) -> Dict[str, Any]:
+        """Gerar narração de todas as cenas, agrupando cenas consecutivas com a mesma voz"""
+        try:
+            project = Project.query.get(project_id)
+            if not project:
+                return {
+                    'success': False,
+                    'error': 'Projeto não encontrado'
+                }
             
-            with open(output_path, 'w') as f:
-                f.write(f"Project {project_id} - {project.title}")
+            snapshots = [
+                {
+                    'id': scene.id,
+                    'script': scene.script,
+                    'voice_id': scene.voice_id,
+                    'voice_settings': scene_render_cache.normalize_settings(scene.voice_settings)
+                }
+                for scene in sorted(project.scenes, key=lambda s: s.order)
+            ]
+            groups = self._narration_groups(snapshots)
             
-            project.final_video_path = output_path
-            project.status = 'completed'
-            db.session.commit()
+            def narrate(group):
+                voice_settings = group[0]['voice_settings'] or None
+                if len(group) == 1:
+                    result = elevenlabs_service.synthesize_long_text(
+                        group[0]['script'], group[0]['voice_id'], voice_settings=voice_settings
+                    )
+                    if not result['success']:
+                        return result
+                    return {
+                        'success': True,
+                        'segments': [result],
+                        'requests': 0 if result['cached'] else 1
+                    }
+                return elevenlabs_service.narrate_batch(
+                    [snapshot['script'] for snapshot in group],
+                    group[0]['voice_id'],
+                    voice_settings=voice_settings
+                )
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(elevenlabs_service.max_concurrent_requests, len(groups)))) as executor:
+                results = list(executor.map(narrate, groups))
+            
+            narration = []
+            errors = []
+            for group, result in zip(groups, results):
+                if not result['success']:
+                    errors.append({
+                        'scenes': [snapshot['id'] for snapshot in group],
+                        'error': result['error']
+                    })
+                    continue
+                for snapshot, segment in zip(group, result['segments']):
+                    narration.append({
+                        'scene_id': snapshot['id'],
+                        'audio_path': segment['audio_path'],
+                        'duration': segment['duration'],
+                        'cached': segment['cached']
+                    })
             
             return {
-                'success': True,
-                'file_path': output_path
+                'success': not errors,
+                'narration': narration,
+                'groups': len(groups),
+                'requests': sum(result.get('requests', 0) for result in results if result['success']),
+                'errors': errors,
+                'error': f'{len(errors)} grupos de narração falharam' if errors else None
             }
             
         except Exception as e:
-            project.status = 'failed'
-            db.session.commit()
             return {
                 'success': False,
                 'error': str(e)
             }
+    
+    def get_render(self, render_id: str) -> Dict[str, Any]:
+        """Obter andamento e tempos por nó de uma renderização"""
+        render = Render.query.get(render_id)
+        if not render:
+            return {
+                'success': False,
+                'error': 'Renderização não encontrada'
+            }
+        
+        self._check_stalled(render)
+        pipeline = self.pipelines.get(render_id)
+        if pipeline and pipeline.status == 'running':
+            # Em execução neste processo: andamento ao vivo
+            report = self._render_report(render, pipeline)
+        else:
+            report = render.get_report() or {
+                'render_id': render.id,
+                'project_id': render.project_id,
+                'status': render.status,
+                'nodes': []
+            }
+        
+        return {
+            'success': True,
+            'render': dict(report, **render.to_dict(), render_id=render.id)
+        }
+    
+    def retry_render(self, render_id: str) -> Dict[str, Any]:
+        """Reexecutar nós falhos sem refazer os que já concluíram"""
+        render = Render.query.get(render_id)
+        if not render:
+            return {
+                'success': False,
+                'error': 'Renderização não encontrada'
+            }
+        
+        self._check_stalled(render)
+        # Reserva condicional: só uma requisição reinicia a renderização
+        claimed = Render.query.filter(
+            Render.id == render_id,
+            Render.status.in_(['completed', 'failed'])
+        ).update({'status': 'pending'}, synchronize_session=False)
+        if claimed != 1:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': 'Renderização ainda em andamento'
+            }
+        
+        project = Project.query.get(render.project_id)
+        if project:
+            project.status = 'processing'
+        db.session.commit()
+        
+        job_runner.submit(self._run_render, render_id, True)
+        
+        return {
+            'success': True,
+            'render_id': render_id,
+            'status': 'processing'
+        }
+    
+    def _register_render(self, pipeline: Pipeline, project_id: int, scenes: List[Dict[str, Any]],
+                         project_hash: str, force: bool):
+        """Gravar a renderização na tabela (na transação de quem chama) e guardar o grafo deste processo"""
+        render = Render.query.get(pipeline.name)
+        if not render:
+            render = Render(id=pipeline.name, project_id=project_id, status='pending', attempts=0)
+            db.session.add(render)
+        render.scenes = json.dumps(scenes)
+        render.project_hash = project_hash
+        render.force = force
+        
+        self.pipelines[pipeline.name] = pipeline
+        self.pipelines.move_to_end(pipeline.name)
+        while len(self.pipelines) > self.max_pipelines:
+            self.pipelines.popitem(last=False)
+    
+    def _check_stalled(self, render: Render) -> bool:
+        """Marcar como falha uma renderização que excedeu o tempo limite"""
+        if render.status != 'running' or not render.started_at:
+            return False
+        if datetime.utcnow() - render.started_at < timedelta(seconds=self.render_timeout):
+            return False
+        
+        render.status = 'failed'
+        render.error = 'Tempo limite de renderização excedido'
+        db.session.commit()
+        return True
+    
+    def _build_render_pipeline(self, project: Project, force: bool = False, name: str = None) -> Pipeline:
+        """Montar grafo: TTS e vídeo em paralelo, avatar, mux por cena e concatenação final"""
+        pipeline = Pipeline(
+            name or f"render_{project.id}_{uuid.uuid4().hex[:12]}",
+            app=current_app._get_current_object(),
+            max_workers=self.render_workers,
+            cache=self.render_cache
+        )
+        
+        scenes = sorted(project.scenes, key=lambda s: s.order)
+        scene_hashes = {}
+        snapshots = []
+        pending = []  # Cenas a produzir, em ordem; None separa cenas não adjacentes
+        
+        for scene in scenes:
+            content_hash = scene_render_cache.compute_scene_hash(scene)
+            scene_hashes[scene.id] = content_hash
+            
+            # Vídeo atual da cena já corresponde ao conteúdo: disponibilizar como segmento
+            if self._is_scene_current(scene, content_hash):
+                scene_render_cache.store_segment(content_hash, scene.file_path)
+            
+            snapshot = {
+                'id': scene.id,
+                'title': scene.title,
+                'hash': content_hash,
+                'script': scene.script,
+                'voice_id': scene.voice_id,
+                'voice_settings': scene_render_cache.normalize_settings(scene.voice_settings),
+                'prompt': scene.ai_prompt or scene.script,
+                'ai_model': scene.ai_model,
+                'background': scene.background,
+                'duration': int(scene.duration or 0),
+                'avatar_id': scene.avatar_id,
+                'resolution': project.resolution
+            }
+            snapshots.append(snapshot)
+            
+            # Segmento em cache: a cena entra no grafo só como mux reaproveitado
+            cached_segment = None if force else scene_render_cache.get_segment(content_hash)
+            if cached_segment:
+                pipeline.add_node(f'mux:{scene.id}', lambda inputs: None,
+                                  lookup=lambda inputs, path=cached_segment: path)
+                pending.append(None)
+            else:
+                pending.append(snapshot)
+        
+        narration_nodes = self._add_narration_nodes(pipeline, pending)
+        for snapshot in pending:
+            if snapshot:
+                self._add_scene_nodes(pipeline, snapshot, narration_nodes.get(snapshot['id']))
+        
+        project_id = project.id
+        project_title = project.title
+        project_hash = scene_render_cache.compute_project_hash(scenes, scene_hashes)
+        previous_hash = project.render_hash
+        final_path = project.final_video_path
+        
+        def lookup_final(inputs):
+            if force or project_hash != previous_hash:
+                return None
+            return final_path if final_path and os.path.exists(final_path) else None
+        
+        def concat(inputs):
+            output_path = self._output_path(f"project_{project_id}_{uuid.uuid4()}.mp4")
+            
+            # Simular combinação dos segmentos
+            with open(output_path, 'w') as f:
+                f.write(f"Project {project_id} - {project_title}\n")
+                for snapshot in snapshots:
+                    segment = inputs[f"mux:{snapshot['id']}"]
+                    f.write(f"{segment}\n")
+            return output_path
+        
+        pipeline.add_node(
+            'concat',
+            concat,
+            deps=[f"mux:{snapshot['id']}" for snapshot in snapshots],
+            lookup=lookup_final
+        )
+        
+        self._register_render(pipeline, project_id, snapshots, project_hash, force)
+        return pipeline
+    
+    def _narration_groups(self, snapshots: List[Optional[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        """Agrupar cenas consecutivas com a mesma voz, até o limite de caracteres por requisição"""
+        separator = len(elevenlabs_service.batch_separator)
+        groups = []
+        current = []
+        current_key = None
+        size = 0
+        
+        for snapshot in snapshots:
+            if not snapshot or not snapshot['script']:
+                if current:
+                    groups.append(current)
+                    current = []
+                continue
+            
+            key = (snapshot['voice_id'], json.dumps(snapshot['voice_settings'], sort_keys=True))
+            new_size = size + separator + len(snapshot['script']) if current else len(snapshot['script'])
+            if current and (key != current_key or new_size > elevenlabs_service.batch_max_chars):
+                groups.append(current)
+                current = []
+                new_size = len(snapshot['script'])
+            
+            current.append(snapshot)
+            current_key = key
+            size = new_size
+        
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _add_narration_nodes(self, pipeline: Pipeline, snapshots: List[Optional[Dict[str, Any]]]) -> Dict[int, str]:
+        """Adicionar um nó de narração por grupo de cenas; retorna o nó de cada cena"""
+        if not (elevenlabs_service.is_configured() and elevenlabs_service.is_enabled()):
+            return {}
+        if not config_manager.get('video.elevenlabs.batch_narration', True):
+            return {}
+        
+        nodes = {}
+        for group in self._narration_groups(snapshots):
+            if len(group) < 2:
+                continue
+            
+            def narrate(inputs, group=group):
+                result = elevenlabs_service.narrate_batch(
+                    [snapshot['script'] for snapshot in group],
+                    group[0]['voice_id'],
+                    voice_settings=group[0]['voice_settings'] or None
+                )
+                if not result['success']:
+                    raise RuntimeError(result['error'])
+                return {
+                    snapshot['id']: segment['audio_path']
+                    for snapshot, segment in zip(group, result['segments'])
+                }
+            
+            name = f"narration:{group[0]['id']}"
+            pipeline.add_node(name, narrate, max_retries=2)
+            for snapshot in group:
+                nodes[snapshot['id']] = name
+        
+        return nodes
+    
+    def _add_scene_nodes(self, pipeline: Pipeline, scene: Dict[str, Any], narration: str = None):
+        """Adicionar nós de produção de uma cena: TTS e vídeo em paralelo, avatar e mux"""
+        scene_id = scene['id']
+        
+        def tts(inputs):
+            if narration:
+                # Trecho da narração em lote do grupo da cena
+                return inputs[narration][scene_id]
+            if not scene['script'] or not (elevenlabs_service.is_configured() and elevenlabs_service.is_enabled()):
+                return None
+            result = elevenlabs_service.synthesize_long_text(
+                scene['script'],
+                scene['voice_id'],
+                voice_settings=scene['voice_settings'] or None
+            )
+            if not result['success']:
+                raise RuntimeError(result['error'])
+            return result['audio_path']
+        
+        def video(inputs):
+            if runway_service.is_configured() and runway_service.is_enabled():
+                return self._generate_clip(scene)
+            
+            # Fallback: simular geração
+            output_path = self._output_path(f"scene_{scene_id}_{uuid.uuid4()}.mp4")
+            with open(output_path, 'w') as f:
+                f.write(f"Scene {scene_id} - {scene['title']}")
+            return output_path
+        
+        def avatar(inputs):
+            # Camada do avatar sincronizada com a narração
+            avatar_record = Avatar.query.get(scene['avatar_id'])
+            if not avatar_record or avatar_record.status != 'completed':
+                raise RuntimeError(f"Avatar {scene['avatar_id']} não está pronto")
+            return {
+                'avatar_id': avatar_record.id,
+                'heygen_id': avatar_record.heygen_id,
+                'audio_path': inputs[f'tts:{scene_id}']
+            }
+        
+        def mux(inputs):
+            clip_path = inputs[f'video:{scene_id}']
+            
+            # Simular mux de vídeo, narração e avatar no segmento da cena
+            return scene_render_cache.store_segment(scene['hash'], clip_path)
+        
+        voice_key = scene_render_cache.hash_content([scene['script'], scene['voice_id'], scene['voice_settings']])
+        clip_key = scene_render_cache.hash_content([
+            scene['prompt'], scene['ai_model'], scene['background'], scene['duration'], scene['resolution']
+        ])
+        
+        if narration:
+            pipeline.add_node(f'tts:{scene_id}', tts, deps=[narration])
+        else:
+            pipeline.add_node(f'tts:{scene_id}', tts, cache_key=f'tts:{voice_key}', max_retries=2)
+        pipeline.add_node(f'video:{scene_id}', video, cache_key=f'video:{clip_key}', max_retries=2)
+        mux_deps = [f'tts:{scene_id}', f'video:{scene_id}']
+        
+        if scene['avatar_id']:
+            pipeline.add_node(f'avatar:{scene_id}', avatar, deps=[f'tts:{scene_id}'], max_retries=1)
+            mux_deps.append(f'avatar:{scene_id}')
+        
+        pipeline.add_node(f'mux:{scene_id}', mux, deps=mux_deps)
+    
+    def _generate_clip(self, scene: Dict[str, Any]) -> str:
+        """Gerar clipe no Runway ML e aguardar o download"""
+        # Em background: pode aguardar a reserva de outro worker até ela expirar
+        result = runway_service.generate_video(
+            prompt=scene['prompt'],
+            duration=scene['duration'],
+            resolution=scene['resolution'],
+            max_wait=generation_cache.claim_timeout
+        )
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        if result.get('file_path'):
+            return result['file_path']
+        
+        generation_id = result['generation_id']
+        for _ in range(Config.MAX_POLLING_ATTEMPTS):
+            status = runway_service.get_generation_status(generation_id)
+            if status['success'] and status['status'] == 'completed':
+                download_result = runway_service.store_generation(generation_id, status['video_url'])
+                if not download_result['success']:
+                    raise RuntimeError(download_result['error'])
+                return download_result['local_path']
+            if status['success'] and status['status'] == 'failed':
+                generation_cache.mark_failed(generation_id, status.get('error'))
+                raise RuntimeError(status.get('error') or 'Geração falhou no Runway ML')
+            time.sleep(Config.POLLING_INTERVAL)
+        
+        raise TimeoutError(f'Geração {generation_id} não concluiu a tempo')
+    
+    def _run_render(self, render_id: str, retry: bool = False) -> Dict[str, Any]:
+        """Executar o grafo e persistir os resultados nas cenas, no projeto e na renderização"""
+        render = Render.query.get(render_id)
+        if not render:
+            return None
+        
+        pipeline = self.pipelines.get(render_id)
+        if pipeline is None:
+            # Grafo de outro processo (ou de antes de um reinício): remontar a partir do projeto;
+            # nós já concluídos são reaproveitados pelos segmentos em cache
+            project = Project.query.get(render.project_id)
+            if not project:
+                render.status = 'failed'
+                render.error = 'Projeto não encontrado'
+                db.session.commit()
+                return None
+            pipeline = self._build_render_pipeline(project, render.force, name=render_id)
+            retry = False
+        
+        render.status = 'running'
+        render.attempts = (render.attempts or 0) + 1
+        render.started_at = datetime.utcnow()
+        render.finished_at = None
+        render.error = None
+        db.session.commit()
+        
+        try:
+            if retry:
+                pipeline.retry()
+            else:
+                pipeline.run()
+        except Exception as e:
+            db.session.rollback()
+            render = Render.query.get(render_id)
+            render.status = 'failed'
+            render.error = str(e)
+            render.finished_at = datetime.utcnow()
+            db.session.commit()
+            raise
+        
+        render = Render.query.get(render_id)
+        snapshots = render.get_scenes()
+        for snapshot in snapshots:
+            scene = Scene.query.get(snapshot['id'])
+            node = pipeline.nodes[f"mux:{snapshot['id']}"]
+            if not scene:
+                continue
+            
+            if node.done:
+                if not self._is_scene_current(scene, snapshot['hash']):
+                    self._replace_scene_file(scene, blob_store.put(node.output, project_id=scene.project_id))
+                    scene.render_hash = snapshot['hash']
+                scene.status = 'completed'
+            else:
+                scene.status = 'failed'
+        
+        project = Project.query.get(render.project_id)
+        concat = pipeline.nodes['concat']
+        if project:
+            if concat.done:
+                if project.final_video_path != concat.output:
+                    # A concatenação grava um arquivo novo; guardá-lo como blob no lugar do anterior
+                    final_path = blob_store.put(concat.output, move=True, project_id=project.id)
+                    if project.final_video_path != final_path:
+                        blob_store.discard(project.final_video_path)
+                        project.final_video_path = final_path
+                    concat.output = final_path
+                project.render_hash = render.project_hash
+                project.status = 'completed'
+            else:
+                project.status = 'failed'
+        
+        report = self._render_report(render, pipeline)
+        render.status = pipeline.status
+        render.report = json.dumps(report)
+        render.error = next((node.error for node in pipeline.nodes.values() if node.error), None)
+        render.finished_at = datetime.utcnow()
+        db.session.commit()
+        return report
+    
+    def _render_report(self, render: Render, pipeline: Pipeline) -> Dict[str, Any]:
+        """Relatório de cenas reaproveitadas x re-renderizadas e tempos por nó"""
+        reused, rebuilt, failed = [], [], []
+        
+        for snapshot in render.get_scenes():
+            node = pipeline.nodes[f"mux:{snapshot['id']}"]
+            if node.status == 'cached':
+                reused.append(snapshot['id'])
+            elif node.status == 'completed':
+                rebuilt.append(snapshot['id'])
+            elif node.status in ('failed', 'skipped'):
+                failed.append(snapshot['id'])
+        
+        concat = pipeline.nodes['concat']
+        return {
+            'render_id': pipeline.name,
+            'project_id': render.project_id,
+            'reused': reused,
+            'rebuilt': rebuilt,
+            'failed': failed,
+            'final_reused': concat.status == 'cached',
+            'file_path': concat.output if concat.done else None,
+            **pipeline.to_dict()
+        }
 
 # Instância global
 project_manager = ProjectManager()
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+from typing import Dict, Any, List, Optional
+from src.services.storage.file_manager import file_manager
+
+class SceneRenderCache:
+    """Cache de segmentos renderizados indexado pelo hash do conteúdo da cena"""
+
+    # Campos da cena que alteram o segmento renderizado
+    SCENE_FIELDS = [
+        'ai_prompt', 'script', 'subtitle', 'voice_id', 'voice_settings',
+        'duration', 'background', 'ai_model', 'avatar_id'
+    ]
+
+    # Campos do projeto que alteram todos os segmentos
+    PROJECT_FIELDS = ['resolution', 'fps']
+
+    def __init__(self):
+        self.segments_dir = f"{file_manager.base_path}/scenes/segments"
+        os.makedirs(self.segments_dir, exist_ok=True)
+
+    def compute_scene_hash(self, scene) -> str:
+        """Calcular hash dos campos que afetam o segmento da cena"""
+        content = {field: getattr(scene, field) for field in self.SCENE_FIELDS}
+        content['voice_settings'] = self.normalize_settings(scene.voice_settings)
+        content['duration'] = float(scene.duration or 0)
+
+        project = scene.project
+        for field in self.PROJECT_FIELDS:
+            content[f'project_{field}'] = getattr(project, field) if project else None
+
+        return self.hash_content(content)
+
+    def compute_project_hash(self, scenes: List, scene_hashes: Dict[int, str]) -> str:
+        """Calcular hash do vídeo final a partir dos segmentos e transições"""
+        content = [
+            {'hash': scene_hashes[scene.id], 'transition': scene.transition}
+            for scene in scenes
+        ]
+        return self.hash_content(content)
+
+    def segment_path(self, content_hash: str) -> str:
+        """Caminho do segmento no cache"""
+        return f"{self.segments_dir}/{content_hash}.mp4"
+
+    def get_segment(self, content_hash: str) -> Optional[str]:
+        """Obter segmento em cache, se existir"""
+        path = self.segment_path(content_hash)
+        return path if os.path.exists(path) else None
+
+    def store_segment(self, content_hash: str, source_path: str) -> Optional[str]:
+        """Guardar segmento renderizado no cache"""
+        if not content_hash or not source_path or not os.path.exists(source_path):
+            return None
+
+        path = self.segment_path(content_hash)
+        if not os.path.exists(path):
+            file_manager.link_file(source_path, path)
+        return path
+
+    def normalize_settings(self, voice_settings: Any) -> Any:
+        """Normalizar JSON de voz para que a ordem das chaves não altere o hash"""
+        if isinstance(voice_settings, str):
+            try:
+                return json.loads(voice_settings) if voice_settings else {}
+            except ValueError:
+                return voice_settings
+        return voice_settings or {}
+
+    def hash_content(self, content: Any) -> str:
+        """Calcular hash estável de um conteúdo serializável em JSON"""
+        serialized = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+# Instância global
+scene_render_cache = SceneRenderCache()
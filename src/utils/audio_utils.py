@@ -0,0 +1,196 @@
+import os
+import re
+import shutil
+import subprocess
+from typing import Dict, Any, List, Iterator, Tuple, Optional
+
+# Tabelas de bitrate (kbps) por (versão MPEG 1 ou 2, layer)
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG 1
+    2: [22050, 24000, 16000],  # MPEG 2
+    0: [11025, 12000, 8000],   # MPEG 2.5
+}
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])["\')\]]*\s+')
+
+def split_sentences(text: str, max_chars: int = 800) -> List[str]:
+    """Dividir texto em blocos de frases inteiras com até max_chars caracteres"""
+    sentences = [s.strip() for s in _SENTENCE_END.split(text.strip()) if s.strip()]
+    chunks = []
+    current = ''
+
+    for sentence in sentences:
+        # Frase maior que o limite: quebrar em vírgulas e, em último caso, em espaços
+        pieces = [sentence] if len(sentence) <= max_chars else _split_long_sentence(sentence, max_chars)
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _split_long_sentence(sentence: str, max_chars: int) -> List[str]:
+    pieces = []
+    current = ''
+    for word in re.split(r'(?<=[,;:])\s+|\s+', sentence):
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def strip_id3(data: bytes) -> bytes:
+    """Remover tags ID3v2 (início) e ID3v1 (fim) de um MP3"""
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b'TAG':
+        data = data[:-128]
+    return data
+
+def parse_frame_header(data: bytes, offset: int) -> Optional[Tuple[int, float]]:
+    """Ler cabeçalho de frame MP3; retorna (tamanho em bytes, duração em segundos)"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (data[offset + 1] >> 3) & 0x03
+    layer_bits = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = 1 if version_bits == 3 else 2
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+
+    return length, samples / sample_rate
+
+def iter_mp3_frames(data: bytes) -> Iterator[Tuple[int, int, float]]:
+    """Percorrer frames MP3 retornando (offset, tamanho, duração)"""
+    offset = 0
+    while offset < len(data) - 4:
+        header = parse_frame_header(data, offset)
+        if not header or offset + header[0] > len(data):
+            # Ressincronizar no próximo byte de sync
+            next_sync = data.find(b'\xff', offset + 1)
+            if next_sync == -1:
+                break
+            offset = next_sync
+            continue
+
+        length, duration = header
+        yield offset, length, duration
+        offset += length
+
+def is_info_frame(data: bytes, offset: int, length: int) -> bool:
+    """Frame Xing/Info/VBRI: metadados do encoder, sem áudio"""
+    frame = data[offset:offset + min(length, 64)]
+    return b'Xing' in frame or b'Info' in frame or b'VBRI' in frame
+
+def audio_frames(data: bytes) -> List[Tuple[int, int, float]]:
+    """Frames de áudio de um MP3, ignorando tags e frame de metadados"""
+    frames = list(iter_mp3_frames(data))
+    if frames and is_info_frame(data, frames[0][0], frames[0][1]):
+        frames = frames[1:]
+    return frames
+
+def join_mp3(parts: List[bytes]) -> bytes:
+    """Concatenar MP3s frame a frame, sem tags nem frames de metadados entre as partes"""
+    output = bytearray()
+    for part in parts:
+        data = strip_id3(part)
+        for offset, length, _ in audio_frames(data):
+            output += data[offset:offset + length]
+    return bytes(output)
+
+def split_mp3(data: bytes, boundaries: List[float]) -> List[bytes]:
+    """Dividir MP3 nos tempos indicados (segundos), cortando no início de frame mais próximo"""
+    data = strip_id3(data)
+    frames = audio_frames(data)
+    segments = []
+    remaining = sorted(boundaries)
+    start_index = 0
+    elapsed = 0.0
+
+    for index, (_, _, duration) in enumerate(frames):
+        # Corta antes deste frame se o fim dele ficaria mais longe da fronteira que o início
+        while remaining and elapsed + duration / 2 > remaining[0]:
+            segments.append(frames[start_index:index])
+            start_index = index
+            remaining.pop(0)
+        elapsed += duration
+
+    segments.append(frames[start_index:])
+    segments.extend([] for _ in remaining)
+
+    return [
+        b''.join(data[offset:offset + length] for offset, length, _ in segment)
+        for segment in segments
+    ]
+
+def mp3_duration(data: bytes) -> float:
+    """Duração de um MP3 somando a duração dos frames"""
+    return sum(duration for _, _, duration in audio_frames(strip_id3(data)))
+
+def transcode_audio(source_path: str, output_path: str, bitrate: str = '128k',
+                    sample_rate: int = 44100, channels: int = 1, timeout: int = 300) -> Dict[str, Any]:
+    """Converter áudio para MP3 com ffmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return {
+            'success': False,
+            'error': 'ffmpeg não encontrado'
+        }
+
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-y', '-v', 'error', '-i', source_path, '-vn',
+             '-ac', str(channels), '-ar', str(sample_rate), '-b:a', bitrate, output_path],
+            capture_output=True,
+            timeout=timeout
+        )
+        if result.returncode != 0:
+            return {
+                'success': False,
+                'error': result.stderr.decode('utf-8', 'replace').strip()
+            }
+
+        return {
+            'success': True,
+            'output_path': output_path,
+            'size': os.path.getsize(output_path)
+        }
+
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
@@ -77,6 +77,18 @@ class AuthManager:
         
         return decorated_function
     
+    def get_request_user(self) -> Optional[str]:
+        """Obter usuário autenticado da requisição, se houver token válido"""
+        token = None
+        if 'Authorization' in request.headers:
+            parts = request.headers['Authorization'].split(" ")
+            token = parts[1] if len(parts) > 1 else None
+        elif 'token' in session:
+            token = session['token']
+        
+        payload = self.verify_token(token) if token else None
+        return payload['user_id'] if payload else None
+    
     def admin_required(self, f):
         """Decorator para rotas que requerem privilégios de admin"""
         @wraps(f)
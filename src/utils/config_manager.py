@@ -40,24 +40,66 @@ class ConfigManager:
                     'enabled': False,
                     'api_key': '',
                     'avatar_quality': 'high',
-                    'voice_cloning': True
+                    'voice_cloning': True,
+                    'photo_size': 1024,
+                    'min_face_ratio': 0.1
                 },
                 'elevenlabs': {
                     'enabled': False,
                     'api_key': '',
                     'voice_id': '',
-                    'stability': 0.5
+                    'model_id': 'eleven_monolingual_v1',
+                    'stability': 0.5,
+                    'cache_max_size': 1024 * 1024 * 1024,  # 1GB
+                    'streaming_latency': 3,
+                    'chunk_max_chars': 800,
+                    'max_concurrent_requests': 3,
+                    'clone_max_sample_size': 10 * 1024 * 1024,  # 10MB
+                    'batch_narration': True,
+                    'batch_max_chars': 4500
                 }
             },
             'storage': {
                 'provider': 'local',  # local, s3, cloudinary
                 'local_path': 'src/static/assets',
                 'max_file_size': 100 * 1024 * 1024,  # 100MB
-                'allowed_extensions': ['jpg', 'jpeg', 'png', 'mp4', 'mov', 'avi']
+                'allowed_extensions': ['jpg', 'jpeg', 'png', 'mp4', 'mov', 'avi'],
+                'duplicate_threshold': 6,  # Bits de diferença no hash perceptual
+                'derivative_cache_max_size': 512 * 1024 * 1024,  # Miniaturas em derivatives/, com despejo LRU
+                'shard_levels': 2,  # Subdiretórios por hash do nome (ab/cd/arquivo); 0 = diretório único
+                'blob_grace_period': 3600,  # Segundos sem referências antes de apagar um blob
+                'blob_gc_batch_size': 100,
+                'blob_gc_interval': 300,
+                'user_quota': 0,  # Bytes por usuário; 0 = sem limite
+                'max_resumable_size': 2 * 1024 * 1024 * 1024,  # 2GB por upload retomável
+                'upload_session_ttl': 86400,  # 24 horas para concluir um upload retomável
+                'janitor': {
+                    'enabled': True,  # A thread só sobe no processo com STORAGE_JANITOR=true
+                    'interval': 3600,  # Uma rodada por hora
+                    'lease_timeout': 7200,  # Reserva entre processos; vencida, outro processo assume
+                    'grace_period': 86400,  # Arquivo sem referência há mais de 24 horas é apagado
+                    'temp_max_age': 86400,
+                    'batch_size': 500,  # Arquivos conferidos no banco por consulta
+                    'directories': ['videos', 'scenes', 'audio', 'avatars'],
+                    'excluded': ['audio/cache', 'scenes/segments']  # Caches com despejo próprio
+                },
+                's3': {
+                    'bucket': '',
+                    'region': '',
+                    'endpoint_url': '',  # MinIO ou outro serviço compatível
+                    'access_key_id': '',
+                    'api_key': '',  # Secret access key, criptografada
+                    'prefix': '',
+                    'public_url': '',  # Bucket público ou CDN; vazio usa URLs assinadas
+                    'presign_expiration': 3600,  # 1 hora
+                    'multipart_threshold': 64 * 1024 * 1024,  # 64MB
+                    'part_size': 16 * 1024 * 1024  # 16MB
+                }
             },
             'app': {
                 'debug': False,
                 'max_concurrent_jobs': 5,
+                'catalog_ttl': 600,  # 10 minutos
                 'session_timeout': 3600,  # 1 hora
                 'rate_limit': {
                     'requests_per_minute': 60,
@@ -191,6 +233,8 @@ class ConfigManager:
         storage_provider = self.get('storage.provider')
         if storage_provider not in ['local', 's3', 'cloudinary']:
             errors.append(f"Provedor de storage inválido: {storage_provider}")
+        elif storage_provider == 's3' and not self.get('storage.s3.bucket'):
+            errors.append("Bucket não configurado para storage.s3")
         
         # Verificar limites
         max_file_size = self.get('storage.max_file_size')
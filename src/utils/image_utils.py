@@ -0,0 +1,190 @@
+import os
+import time
+from typing import Dict, Any, Optional
+from PIL import Image, ImageOps
+import cv2
+import numpy as np
+
+# Classificador carregado uma vez por processo do pool
+_face_cascade = None
+
+def _get_face_cascade():
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(
+            os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        )
+    return _face_cascade
+
+def detect_faces(img: Image.Image, max_side: int = 640):
+    """Detectar rostos em uma cópia reduzida; retorna caixas (x, y, w, h) na escala original"""
+    scale = min(1.0, max_side / max(img.size))
+    small = img if scale == 1.0 else img.resize(
+        (max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.Resampling.BILINEAR
+    )
+
+    gray = cv2.equalizeHist(np.asarray(small.convert('L')))
+    faces = _get_face_cascade().detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40))
+
+    return [tuple(int(value / scale) for value in face) for face in faces]
+
+def preprocess_face_photo(source_path: str, output_path: str, target_size: int = 1024,
+                          min_face_ratio: float = 0.1, crop_factor: float = 2.5,
+                          quality: int = 90) -> Dict[str, Any]:
+    """Corrigir orientação EXIF, validar rosto único, recortar e reduzir foto de avatar"""
+    try:
+        original_size = os.path.getsize(source_path)
+
+        with Image.open(source_path) as img:
+            # JPEG: decodificar já reduzido quando a foto é muito maior que o alvo
+            img.draft('RGB', (target_size * 2, target_size * 2))
+            img = ImageOps.exif_transpose(img).convert('RGB')
+
+        faces = detect_faces(img)
+        message = _validate_faces(faces, img.size, min_face_ratio)
+        if message:
+            return {
+                'success': True,
+                'valid': False,
+                'message': message,
+                'faces': len(faces),
+                'original_size': original_size
+            }
+
+        # Recorte quadrado de cabeça e ombros centrado no rosto
+        x, y, w, h = faces[0]
+        side = min(int(max(w, h) * crop_factor), img.width, img.height)
+        center_x, center_y = x + w // 2, y + h // 2
+        left = min(max(center_x - side // 2, 0), img.width - side)
+        top = min(max(center_y - side // 2, 0), img.height - side)
+        img = img.crop((left, top, left + side, top + side))
+
+        if side > target_size:
+            img = img.resize((target_size, target_size), Image.Resampling.LANCZOS)
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        img.save(output_path, format='JPEG', quality=quality, optimize=True)
+
+        return {
+            'success': True,
+            'valid': True,
+            'message': None,
+            'faces': 1,
+            'output_path': output_path,
+            'width': img.width,
+            'height': img.height,
+            'size': os.path.getsize(output_path),
+            'original_size': original_size
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'valid': False,
+            'message': f'Erro ao processar imagem: {e}',
+            'error': str(e)
+        }
+
+def process_image_file(source_path: str, output_path: str, operations: Dict[str, Any]) -> Dict[str, Any]:
+    """Redimensionar e recomprimir uma imagem, decodificando JPEG já reduzido quando o alvo é bem menor"""
+    started = time.perf_counter()
+    try:
+        original_size = os.path.getsize(source_path)
+        resize = operations.get('resize')
+        image_format = operations.get('format', 'JPEG').upper()
+
+        with Image.open(source_path) as img:
+            original_dimensions = img.size
+            if resize and 'width' in resize and 'height' in resize:
+                # draft escolhe a maior redução DCT (1/2, 1/4, 1/8) que ainda cobre o alvo;
+                # caixa quadrada porque a orientação EXIF pode trocar largura e altura
+                side = max(resize['width'], resize['height'])
+                img.draft('RGB', (side, side))
+            img = ImageOps.exif_transpose(img)
+
+            if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            elif img.mode == 'P':
+                img = img.convert('RGBA')
+
+            if resize:
+                img = _resize(img, resize)
+
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            img.save(output_path, format=image_format, quality=operations.get('quality', 85), optimize=True)
+
+        processed_size = os.path.getsize(output_path)
+        return {
+            'success': True,
+            'original_path': source_path,
+            'processed_path': output_path,
+            'original_size': original_size,
+            'processed_size': processed_size,
+            'saved_bytes': original_size - processed_size,
+            'original_dimensions': {'width': original_dimensions[0], 'height': original_dimensions[1]},
+            'dimensions': {'width': img.width, 'height': img.height},
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'original_path': source_path,
+            'error': str(e),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+def _resize(img: Image.Image, resize: Dict[str, Any]) -> Image.Image:
+    """Aplicar o redimensionamento; reducing_gap reduz por blocos inteiros antes do filtro LANCZOS"""
+    fit = resize.get('fit', 'contain')
+
+    if 'width' in resize and 'height' in resize:
+        width, height = resize['width'], resize['height']
+        if fit == 'contain':
+            # Caber na caixa mantendo a proporção, sem ampliar
+            img.thumbnail((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            return img
+        if fit == 'cover':
+            # Preencher a caixa mantendo a proporção, recortando o excesso ao centro
+            scale = max(width / img.width, height / img.height)
+            crop_width, crop_height = width / scale, height / scale
+            left, top = (img.width - crop_width) / 2, (img.height - crop_height) / 2
+            return img.resize((width, height), Image.Resampling.LANCZOS,
+                              box=(left, top, left + crop_width, top + crop_height), reducing_gap=3.0)
+        # fill: dimensões exatas, distorcendo a proporção
+        return img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    if 'width' in resize:
+        size = (resize['width'], max(1, round(img.height * resize['width'] / img.width)))
+    elif 'height' in resize:
+        size = (max(1, round(img.width * resize['height'] / img.height)), resize['height'])
+    else:
+        return img
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+def _validate_faces(faces, image_size, min_face_ratio: float) -> Optional[str]:
+    if not faces:
+        return 'Nenhum rosto detectado'
+    if len(faces) > 1:
+        return f'{len(faces)} rostos detectados; use fotos com apenas uma pessoa'
+
+    _, _, w, h = faces[0]
+    if max(w, h) < min(image_size) * min_face_ratio:
+        return 'Rosto muito pequeno na foto'
+    return None
+
+def dhash(img: Image.Image, hash_size: int = 8) -> str:
+    """Hash perceptual por diferença (dHash) em hexadecimal; imagens parecidas têm poucos bits diferentes"""
+    img.draft('L', (hash_size * 8, hash_size * 8))
+    img = ImageOps.exif_transpose(img).convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(img, dtype=np.int16)
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return f'{value:0{hash_size * hash_size // 4}x}'
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Número de bits diferentes entre dois hashes hexadecimais"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
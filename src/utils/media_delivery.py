@@ -0,0 +1,60 @@
+import os
+import mimetypes
+from typing import Optional
+from flask import send_file, current_app, redirect
+from werkzeug.security import safe_join
+from src.services.storage.file_manager import file_manager
+
+def send_media(file_path: str, as_attachment: bool = False, download_name: Optional[str] = None,
+               max_age: Optional[int] = None, immutable: bool = False):
+    """Enviar mídia com suporte a Range (206), ETag/Last-Modified (304) e sendfile"""
+    if not os.path.isfile(file_path):
+        # Gravado por outro nó: com backend remoto, redirecionar para o bucket
+        key = remote_media_key(file_path)
+        if key:
+            return redirect(file_manager.backend.url(key, download_name=download_name if as_attachment else None), code=302)
+
+    path = os.path.abspath(file_path)
+    mime_type, _ = mimetypes.guess_type(download_name or path)
+
+    if max_age is None:
+        max_age = current_app.config.get('MEDIA_CACHE_MAX_AGE', 3600)
+
+    # conditional=True faz o werkzeug responder Range/If-Range com 206 e validadores com 304.
+    # Com USE_X_SENDFILE o proxy entrega o arquivo; sem ele, respostas completas usam
+    # wsgi.file_wrapper, que o gunicorn implementa com sendfile().
+    response = send_file(
+        path,
+        mimetype=mime_type or 'application/octet-stream',
+        as_attachment=as_attachment,
+        download_name=download_name or os.path.basename(path),
+        conditional=True,
+        etag=True,
+        last_modified=os.path.getmtime(path),
+        max_age=max_age
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    if immutable:
+        # URL versionada: o conteúdo nunca muda, dispensa revalidação
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+def resolve_media_path(directory: str, filename: str, remote: bool = False) -> Optional[str]:
+    """Resolver arquivo dentro de um diretório de mídia, sem sair dele; remote=True aceita arquivos só no bucket"""
+    path = safe_join(os.path.abspath(directory), filename)
+    if path and (os.path.isfile(path) or (remote and remote_media_key(path))):
+        return path
+    return None
+
+def media_exists(file_path: Optional[str]) -> bool:
+    """Mídia disponível no disco deste nó ou no storage remoto"""
+    return bool(file_path) and (os.path.isfile(file_path) or remote_media_key(file_path) is not None)
+
+def remote_media_key(file_path: str) -> Optional[str]:
+    """Chave do arquivo no backend remoto, se ele estiver lá"""
+    backend = file_manager.backend
+    if not backend.remote:
+        return None
+    key = file_manager.storage_key(file_path)
+    return key if key and backend.exists(key) else None
@@ -0,0 +1,71 @@
+import io
+import os
+import uuid
+from typing import Dict, List, Tuple
+
+class MultipartStream:
+    """Corpo multipart/form-data lido dos arquivos sob demanda, sem montar tudo em memória"""
+
+    def __init__(self, fields: Dict[str, str], files: List[Tuple[str, str, str, str]],
+                 chunk_size: int = 64 * 1024):
+        """files: lista de (campo, nome do arquivo, caminho, content type)"""
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self._parts = []  # bytes ou (caminho, tamanho)
+
+        for name, value in fields.items():
+            self._parts.append(
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n'.encode('utf-8')
+            )
+
+        for name, filename, path, content_type in files:
+            self._parts.append(
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8')
+            )
+            self._parts.append((path, os.path.getsize(path)))
+            self._parts.append(b'\r\n')
+
+        self._parts.append(f'--{self.boundary}--\r\n'.encode('utf-8'))
+
+        self._length = sum(len(part) if isinstance(part, bytes) else part[1] for part in self._parts)
+        self._index = 0
+        self._current = None
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        # Permite ao requests enviar Content-Length em vez de chunked
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        """Ler o próximo trecho do corpo, abrindo cada arquivo só quando chega a vez dele"""
+        output = bytearray()
+        while (size < 0 or len(output) < size) and self._index < len(self._parts):
+            if self._current is None:
+                part = self._parts[self._index]
+                self._current = io.BytesIO(part) if isinstance(part, bytes) else open(part[0], 'rb')
+
+            chunk = self._current.read(-1 if size < 0 else size - len(output))
+            if not chunk:
+                self._current.close()
+                self._current = None
+                self._index += 1
+                continue
+            output += chunk
+        return bytes(output)
+
+    def __iter__(self):
+        for chunk in iter(lambda: self.read(self.chunk_size), b''):
+            yield chunk
+
+    def close(self):
+        """Fechar arquivo em leitura"""
+        if self._current is not None:
+            self._current.close()
+            self._current = None